@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Repeatable benchmarks for the KLV / video hot paths, on synthetic data
+from klv_synth.py (no recordings needed).
+
+    python bench.py -o before.json                  # micro-benchmarks
+    python bench.py --e2e -o before.json            # + MPEG-TS throughput runs
+    python bench.py -o after.json --compare before.json
+
+Each benchmark is timed in repeats of enough loops to last --min-time
+seconds; the median per-operation time is what --compare uses. Results go
+to JSON with the interpreter, platform and git revision, so runs from
+different checkouts can be compared. Benchmarks whose dependencies are
+missing (GStreamer for server.py and the muxing path) are recorded as
+skipped rather than failing the run.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import misc
+import misb0601
+import klv_synth
+
+BENCHMARKS = []  # (name, group, setup); setup(args) -> (fn, items per call, bytes per call)
+
+
+def benchmark(name, group="micro"):
+    def register(setup):
+        BENCHMARKS.append((name, group, setup))
+        return setup
+    return register
+
+
+class Skip(Exception):
+    pass
+
+
+def _packets(args, mix=None, **kwargs):
+    generator = klv_synth.Generator(mix or args.mix, seed=args.seed, nested=args.nested, **kwargs)
+    return generator.packets(args.packets)
+
+
+# ---------------------------
+# Micro-benchmarks
+# ---------------------------
+@benchmark("klv.parse_klv_local_sets")
+def _parse(args):
+    packets = _packets(args)
+    size = sum(map(len, packets))
+
+    def run():
+        for raw in packets:
+            misc.parse_klv_local_sets(raw)
+    return run, len(packets), size
+
+
+@benchmark("klv.index_klv_local_sets")
+def _index(args):
+    packets = _packets(args)
+    size = sum(map(len, packets))
+
+    def run():
+        for raw in packets:
+            misc.index_klv_local_sets(raw)
+    return run, len(packets), size
+
+
+@benchmark("klv.decode_klv")
+def _decode(args):
+    packets = _packets(args)
+    size = sum(map(len, packets))
+
+    def run():
+        for raw in packets:
+            misb0601.decode_klv(raw)
+    return run, len(packets), size
+
+
+@benchmark("klv.source_decode_loop")
+def _decode_cached(args):
+    # what Source.on_klv_sample runs per buffer: a LocalSetDecoder over a live stream
+    packets = _packets(args)
+    size = sum(map(len, packets))
+
+    def run():
+        decoder = misb0601.LocalSetDecoder()
+        for raw in packets:
+            decoder.decode_klv(raw)
+    return run, len(packets), size
+
+
+@benchmark("klv.source_decode_subscribed")
+def _decode_subscribed(args):
+    # the same loop when every viewer subscribed to the map view's geometry tags only;
+    # compare with klv.source_decode_loop (the gap widens with --mix full)
+    packets = _packets(args)
+    size = sum(map(len, packets))
+    tags = frozenset((2, 5, 6, 7, 13, 14, 15, 16, 17, 18, 19, 20, 23, 24, 25))
+
+    def run():
+        decoder = misb0601.LocalSetDecoder()
+        for raw in packets:
+            decoder.decode_klv(raw, tags=tags)
+    return run, len(packets), size
+
+
+@benchmark("klv.verify_checksum")
+def _verify(args):
+    sets = [s for raw in _packets(args) for s in misc.index_klv_local_sets(raw)]
+    size = sum(s.end - s.key_offset for s in sets)
+
+    def run():
+        for local_set in sets:
+            misb0601.verify_checksum(local_set)
+    return run, len(sets), size
+
+
+@benchmark("klv.interpolate")
+def _interpolate(args):
+    decoded = [misb0601.decode_klv(raw)[0] for raw in _packets(args)]
+    pairs = list(zip(decoded, decoded[1:]))
+
+    def run():
+        for before, after in pairs:
+            misb0601.interpolate(before, after, 0.5)
+    return run, len(pairs), None
+
+
+@benchmark("json.json_safe_serialize")
+def _serialize(args):
+    decoded = [misb0601.decode_klv(raw)[0] for raw in _packets(args)]
+
+    def run():
+        for local_set in decoded:
+            misc.json_safe_serialize(local_set)
+    return run, len(decoded), None
+
+
+@benchmark("json.two_pass_dumps")
+def _two_pass(args):
+    # what the DataChannel send path did before json_safe_dumps; the baseline for it
+    decoded = [misb0601.decode_klv(raw)[0] for raw in _packets(args)]
+
+    def run():
+        for local_set in decoded:
+            json.dumps(misc.json_safe_serialize({"rtp": 0, "klv": local_set, "full": True}))
+    return run, len(decoded), None
+
+
+@benchmark("json.json_safe_dumps")
+def _dumps(args):
+    decoded = [misb0601.decode_klv(raw)[0] for raw in _packets(args)]
+
+    def run():
+        for local_set in decoded:
+            misc.json_safe_dumps({"rtp": 0, "klv": local_set, "full": True})
+    return run, len(decoded), None
+
+
+@benchmark("rtp.raw_encoder_packetize")
+def _packetize(args):
+    try:
+        import server
+    except (ImportError, ValueError) as e:  # no gi, or no Gst typelib (ValueError)
+        raise Skip(f"server.py not importable: {e}")
+    rng = random.Random(args.seed)
+    frames = [rng.randbytes(size) for size in (4_000, 12_000, 30_000, 90_000)]
+    size = sum(map(len, frames))
+
+    def run():
+        for picture_id, frame in enumerate(frames):
+            server.RawEncoder._packetize(frame, picture_id)
+    return run, len(frames), size
+
+
+# ---------------------------
+# End-to-end (--e2e)
+# ---------------------------
+def _synthetic_ts(args, video):
+    """Path of a synthetic recording in the temp dir, written on first use."""
+    kind = "h264" if video else "klv"
+    path = os.path.join(tempfile.gettempdir(),
+                        f"bench_{kind}_{args.mix}_{args.seed}_{args.e2e_packets}{'_n' if args.nested else ''}.ts")
+    if not os.path.exists(path):
+        generator = klv_synth.Generator(args.mix, seed=args.seed, nested=args.nested)
+        if video:
+            try:
+                klv_synth.mux_gstreamer(path, generator, args.e2e_packets)
+            except (ImportError, ValueError) as e:
+                raise Skip(f"GStreamer not available: {e}")
+        else:
+            klv_synth.write_ts(path, generator.packets(args.e2e_packets))
+    return path
+
+
+@benchmark("e2e.ts_demux_extract", group="e2e")
+def _ts_demux(args):
+    import ts_demux
+
+    path = _synthetic_ts(args, video=False)
+    return (lambda: ts_demux.extract_klv(path, workers=1)), args.e2e_packets, os.path.getsize(path)
+
+
+@benchmark("e2e.klv_store_build", group="e2e")
+def _klv_store(args):
+    import klv_store
+
+    path = _synthetic_ts(args, video=False)
+    out = tempfile.mkdtemp(prefix="bench_store_")
+
+    def run():
+        writer = klv_store.KLVStoreWriter()
+        klv_store.extract_ts(path, writer, workers=1)
+        writer.write(out)
+    return run, args.e2e_packets, os.path.getsize(path)
+
+
+@benchmark("e2e.gstreamer_klv_decode", group="e2e")
+def _gstreamer(args):
+    """videotestsrc + KLV appsrc recording played unsynced: tsdemux -> h264parse / KLV appsink -> decode."""
+    try:
+        import gi
+        gi.require_version("Gst", "1.0")
+        from gi.repository import Gst
+    except (ImportError, ValueError) as e:
+        raise Skip(f"GStreamer not available: {e}")
+    Gst.init(None)
+    path = _synthetic_ts(args, video=True)
+
+    def run():
+        pipeline = Gst.parse_launch(
+            f'filesrc location="{path}" ! tsdemux name=demux '
+            "demux. ! queue ! h264parse ! fakesink sync=false "
+            "demux. ! queue ! meta/x-klv ! appsink name=klv sync=false emit-signals=true"
+        )
+        decoder = misb0601.LocalSetDecoder()
+
+        def on_sample(sink):
+            buf = sink.emit("pull-sample").get_buffer()
+            ok, info = buf.map(Gst.MapFlags.READ)
+            if ok:
+                try:
+                    decoder.decode_klv(info.data)
+                finally:
+                    buf.unmap(info)
+            return Gst.FlowReturn.OK
+
+        pipeline.get_by_name("klv").connect("new-sample", on_sample)
+        pipeline.set_state(Gst.State.PLAYING)
+        pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipeline.set_state(Gst.State.NULL)
+    return run, args.e2e_packets, os.path.getsize(path)
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+def measure(fn, min_time, repeats):
+    """Per-call times (seconds) of `repeats` runs, each looping `fn` for at least `min_time`."""
+    fn()  # warm caches and lazy imports
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+    times = [elapsed / loops]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        times.append((time.perf_counter() - start) / loops)
+    return times
+
+
+def run_benchmarks(args):
+    results = {}
+    for name, group, setup in BENCHMARKS:
+        if group == "e2e" and not args.e2e:
+            continue
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        try:
+            fn, items, size = setup(args)
+        except Skip as e:
+            print(f"⏭️  {name}: skipped ({e})")
+            results[name] = {"skipped": str(e)}
+            continue
+        times = measure(fn, args.min_time if group == "micro" else 0.0,
+                        args.repeats if group == "micro" else max(1, args.repeats // 2))
+        median = statistics.median(times)
+        result = {
+            "group": group,
+            "items": items,
+            "median_s": median,
+            "min_s": min(times),
+            "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "per_item_us": median / items * 1e6,
+            "items_per_s": items / median,
+        }
+        if size:
+            result["mb_per_s"] = size / median / 1e6
+        results[name] = result
+        rate = f", {result['mb_per_s']:.1f} MB/s" if size else ""
+        print(f"⏱️  {name}: {result['per_item_us']:.2f} µs/item, {result['items_per_s']:,.0f} items/s{rate}")
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print per-benchmark change against `baseline`; returns the names that got slower than `threshold`."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "median_s" not in base or "median_s" not in result:
+            continue
+        change = result["median_s"] / base["median_s"] - 1.0
+        marker = "🔴" if change > threshold else "🟢" if change < -threshold else "⚪"
+        print(f"{marker} {name}: {base['per_item_us']:.2f} -> {result['per_item_us']:.2f} µs/item ({change:+.1%})")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark KLV parsing, serialization and packetization")
+    parser.add_argument("-o", "--output", default=None, help="Write results to this JSON file")
+    parser.add_argument("--compare", default=None, metavar="BASELINE.json",
+                        help="Compare against a previous run; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown counted as a regression by --compare. Default 0.10.")
+    parser.add_argument("-k", "--filter", action="append", default=[],
+                        help="Only run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--e2e", action="store_true", help="Also run the MPEG-TS end-to-end benchmarks")
+    parser.add_argument("--mix", default="typical", choices=sorted(klv_synth.MIXES),
+                        help="Tag mix of the synthetic packets")
+    parser.add_argument("--nested", action="store_true", help="Include Security and VMTI nested sets")
+    parser.add_argument("--packets", type=int, default=300, help="Packets per micro-benchmark call")
+    parser.add_argument("--e2e-packets", dest="e2e_packets", type=int, default=9000,
+                        help="Packets (frames) in the end-to-end recordings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-time", dest="min_time", type=float, default=0.2,
+                        help="Seconds per timing repeat")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+    report = {
+        "meta": {
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git": _git_revision(),
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results -> {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
@@ -421,7 +421,18 @@ class Footprint {
 
         const grid = [];
 
-        for (let row = 0; row < N; row++) {
+        // Server-computed grid (footprint.py, server started with --footprint):
+        // [lon, lat, height] per ray, row-major, top row first
+        const serverGrid = metadata.footprint?.grid;
+        if (serverGrid && serverGrid.length === N * N) {
+            for (const [lon, lat, height] of serverGrid) {
+                grid.push(Cesium.Cartesian3.fromDegrees(lon, lat, height));
+            }
+        }
+
+        const haveServerGrid = grid.length > 0;
+
+        for (let row = 0; row < N && !haveServerGrid; row++) {
             for (let col = 0; col < N; col++) {
                 // Normalised pixel position: row 0 = top (positive vFov),
                 // col 0 = left (negative hFov)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Sensor ground footprint from ST 0601 metadata, vectorized over packets.
+
+Same model as footprint.js: an N x N grid of rays across the sensor FOV,
+rotated by the sensor's relative azimuth/elevation/roll, then by the
+platform's heading/pitch/roll in the local east-north-up frame, and
+intersected with the WGS84 ellipsoid (or a local DEM tile when given).
+
+    python footprint.py ./raw/videos/truck.ts.klv > truck.geojson
+"""
+import argparse
+import json
+
+import numpy as np
+
+GRID_N = 4
+
+WGS84_A = 6378137.0
+WGS84_B = 6356752.3142451793
+WGS84_E2 = 1.0 - (WGS84_B / WGS84_A) ** 2
+WGS84_EP2 = (WGS84_A / WGS84_B) ** 2 - 1.0
+
+# ST 0601 tags the footprint depends on
+SENSOR_LATITUDE, SENSOR_LONGITUDE, SENSOR_ALTITUDE = 13, 14, 15
+PLATFORM_HEADING, PLATFORM_PITCH, PLATFORM_ROLL = 5, 6, 7
+SENSOR_HFOV, SENSOR_VFOV = 16, 17
+SENSOR_AZIMUTH, SENSOR_ELEVATION, SENSOR_ROLL = 18, 19, 20
+FRAME_CENTER_LATITUDE, FRAME_CENTER_LONGITUDE = 23, 24
+OFFSET_CORNERS = ((26, 27), (28, 29), (30, 31), (32, 33))  # (lat, lon) per corner
+
+FOOTPRINT_TAGS = (
+    SENSOR_LATITUDE, SENSOR_LONGITUDE, SENSOR_ALTITUDE,
+    PLATFORM_HEADING, PLATFORM_PITCH, PLATFORM_ROLL,
+    SENSOR_HFOV, SENSOR_VFOV,
+    SENSOR_AZIMUTH, SENSOR_ELEVATION, SENSOR_ROLL,
+)
+
+
+# ---------------------------
+# Geodesy
+# ---------------------------
+def geodetic_to_ecef(lat, lon, height):
+    """Degrees/metres -> ECEF metres, shape (..., 3)."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    n = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat ** 2)
+    return np.stack([
+        (n + height) * cos_lat * np.cos(lon),
+        (n + height) * cos_lat * np.sin(lon),
+        (n * (1.0 - WGS84_E2) + height) * sin_lat,
+    ], axis=-1)
+
+
+def ecef_to_geodetic(xyz):
+    """ECEF (..., 3) -> (lat deg, lon deg, height m) using Bowring's method."""
+    x, y, z = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * WGS84_A, p * WGS84_B)
+    lat = np.arctan2(z + WGS84_EP2 * WGS84_B * np.sin(theta) ** 3,
+                     p - WGS84_E2 * WGS84_A * np.cos(theta) ** 3)
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat ** 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        height = np.where(np.abs(np.cos(lat)) > 1e-9,
+                          p / np.cos(lat) - n,
+                          np.abs(z) - WGS84_B)
+    return np.degrees(lat), np.degrees(np.arctan2(y, x)), height
+
+
+def enu_matrix(lat, lon):
+    """Columns east, north, up in ECEF, shape (..., 3, 3)."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    sin_lon, cos_lon = np.sin(lon), np.cos(lon)
+    zero = np.zeros_like(lat)
+    east = np.stack([-sin_lon, cos_lon, zero], axis=-1)
+    north = np.stack([-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat], axis=-1)
+    up = np.stack([cos_lat * cos_lon, cos_lat * sin_lon, sin_lat], axis=-1)
+    return np.stack([east, north, up], axis=-1)
+
+
+def hpr_matrix(heading, pitch, roll):
+    """Cesium's Matrix3.fromHeadingPitchRoll (radians): Rz(-heading) Ry(-pitch) Rx(roll)."""
+    psi, theta, phi = -heading, -pitch, roll
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    cos_s, sin_s = np.cos(psi), np.sin(psi)
+    cos_p, sin_p = np.cos(phi), np.sin(phi)
+    return np.stack([
+        np.stack([cos_t * cos_s, -cos_p * sin_s + sin_p * sin_t * cos_s, sin_p * sin_s + cos_p * sin_t * cos_s], -1),
+        np.stack([cos_t * sin_s, cos_p * cos_s + sin_p * sin_t * sin_s, -sin_p * cos_s + cos_p * sin_t * sin_s], -1),
+        np.stack([-sin_t, sin_p * cos_t, cos_p * cos_t], -1),
+    ], axis=-2)
+
+
+def ray_ellipsoid(origin, direction, height=0.0):
+    """
+    Distance along `direction` (in units of its length) to the first hit of
+    the WGS84 ellipsoid grown by `height` metres; NaN on a miss or when the
+    origin is already inside. Mirrors Cesium.IntersectionTests.rayEllipsoid.
+    """
+    radii = np.array([WGS84_A, WGS84_A, WGS84_B])
+    inv = 1.0 / (radii + np.asarray(height, dtype=np.float64)[..., None])
+    q = origin * inv
+    w = direction * inv
+    q2 = np.einsum("...i,...i", q, q)
+    qw = np.einsum("...i,...i", q, w)
+    w2 = np.einsum("...i,...i", w, w)
+    disc = qw ** 2 - w2 * (q2 - 1.0)
+    with np.errstate(invalid="ignore"):
+        t = (-qw - np.sqrt(disc)) / w2
+    return np.where((q2 > 1.0) & (qw < 0.0) & (disc >= 0.0) & (t > 0.0), t, np.nan)
+
+
+# ---------------------------
+# DEM
+# ---------------------------
+class DEM:
+    """
+    Height grid (metres above the ellipsoid) covering a lat/lon box. Row 0 is
+    the northern edge. Stored as an .npz with `heights` and
+    `bounds` = (west, south, east, north) in degrees.
+    """
+
+    def __init__(self, heights, bounds):
+        self.heights = np.asarray(heights, dtype=np.float64)
+        self.west, self.south, self.east, self.north = map(float, bounds)
+        self.min_height = float(np.nanmin(self.heights))
+        self.max_height = float(np.nanmax(self.heights))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["heights"], data["bounds"])
+
+    def sample(self, lat, lon):
+        """Bilinear height at each point; NaN outside the tile."""
+        rows, cols = self.heights.shape
+        y = (self.north - lat) / (self.north - self.south) * (rows - 1)
+        x = (lon - self.west) / (self.east - self.west) * (cols - 1)
+        inside = (x >= 0) & (x <= cols - 1) & (y >= 0) & (y <= rows - 1)
+        x = np.clip(np.nan_to_num(x), 0, cols - 1)
+        y = np.clip(np.nan_to_num(y), 0, rows - 1)
+        x0 = np.minimum(x.astype(np.int64), cols - 2) if cols > 1 else np.zeros_like(x, dtype=np.int64)
+        y0 = np.minimum(y.astype(np.int64), rows - 2) if rows > 1 else np.zeros_like(y, dtype=np.int64)
+        x1 = np.minimum(x0 + 1, cols - 1)
+        y1 = np.minimum(y0 + 1, rows - 1)
+        fx, fy = x - x0, y - y0
+        h = self.heights
+        top = h[y0, x0] * (1 - fx) + h[y0, x1] * fx
+        bottom = h[y1, x0] * (1 - fx) + h[y1, x1] * fx
+        return np.where(inside, top * (1 - fy) + bottom * fy, np.nan)
+
+    def intersect(self, origin, direction, samples=64):
+        """
+        Distance to the first terrain hit, marching between the ellipsoid
+        shells at the tile's highest and lowest heights. Rays leaving the tile
+        fall back to the bare ellipsoid.
+        """
+        t_top = ray_ellipsoid(origin, direction, self.max_height)
+        t_top = np.where(np.isnan(t_top), 0.0, t_top)
+        t_bottom = ray_ellipsoid(origin, direction, self.min_height)
+
+        steps = np.linspace(0.0, 1.0, samples)
+        t = t_top[..., None] + (t_bottom - t_top)[..., None] * steps
+        points = origin[..., None, :] + direction[..., None, :] * t[..., None]
+        lat, lon, height = ecef_to_geodetic(points)
+        terrain = self.sample(lat, lon)
+        above = height - np.where(np.isnan(terrain), 0.0, terrain)
+
+        below = above <= 0
+        first = np.argmax(below, axis=-1)
+        hit = below.any(axis=-1)
+        prev = np.maximum(first - 1, 0)
+        a0 = np.take_along_axis(above, prev[..., None], -1)[..., 0]
+        a1 = np.take_along_axis(above, first[..., None], -1)[..., 0]
+        t0 = np.take_along_axis(t, prev[..., None], -1)[..., 0]
+        t1 = np.take_along_axis(t, first[..., None], -1)[..., 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.where(a0 != a1, a0 / (a0 - a1), 0.0)
+        t_hit = t0 + (t1 - t0) * np.clip(frac, 0.0, 1.0)
+        return np.where(hit, t_hit, ray_ellipsoid(origin, direction))
+
+
+# ---------------------------
+# Footprints
+# ---------------------------
+def _column(columns, tag, n, default=np.nan):
+    values = columns.get(tag)
+    if values is None:
+        return np.full(n, default)
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(values), default, values)
+
+
+def compute_footprints(columns, grid_n=GRID_N, dem=None, sensor_offset=(0.0, 0.0, 0.0)):
+    """
+    `columns` maps tag -> array of n values (NaN = missing). Returns a dict of
+    arrays:
+        grid      (n, grid_n, grid_n, 3)  lon, lat, height of each ray hit, row 0 = top
+        corners   (n, 4, 3)               TL, TR, BR, BL
+        sensor    (n, 3)                  sensor lon, lat, altitude
+        platform  (n, 3)                  sensor position moved by `sensor_offset` (platform frame, m)
+        valid     (n,)                    every ray hit the ground
+    """
+    n = len(next(iter(columns.values()))) if columns else 0
+    lat = _column(columns, SENSOR_LATITUDE, n)
+    lon = _column(columns, SENSOR_LONGITUDE, n)
+    alt = _column(columns, SENSOR_ALTITUDE, n, 0.0)
+    rad = np.radians
+
+    sensor = geodetic_to_ecef(lat, lon, alt)                               # (n, 3)
+    platform_rot = enu_matrix(lat, lon) @ hpr_matrix(
+        rad(_column(columns, PLATFORM_HEADING, n, 0.0) - 90.0),
+        rad(_column(columns, PLATFORM_PITCH, n, 0.0)),
+        rad(_column(columns, PLATFORM_ROLL, n, 0.0)),
+    )                                                                      # (n, 3, 3)
+    sensor_rot = hpr_matrix(
+        rad(_column(columns, SENSOR_AZIMUTH, n, 0.0)),
+        rad(_column(columns, SENSOR_ELEVATION, n, 0.0)),
+        rad(_column(columns, SENSOR_ROLL, n, 0.0)),
+    )
+
+    half_h = rad(_column(columns, SENSOR_HFOV, n, 0.0)) / 2
+    half_v = rad(_column(columns, SENSOR_VFOV, n, 0.0)) / 2
+    s = np.linspace(0.0, 1.0, grid_n)                                      # left -> right
+    tan_h = np.tan(half_h[:, None, None] * (1 - 2 * s)[None, None, :])
+    tan_v = np.tan(half_v[:, None, None] * (1 - 2 * s)[None, :, None])     # top = positive
+    local = np.stack(np.broadcast_arrays(np.ones_like(tan_h), tan_h, tan_v), axis=-1)  # (n, N, N, 3)
+
+    rotation = platform_rot @ sensor_rot
+    direction = np.einsum("nij,nrcj->nrci", rotation, local)
+    origin = np.broadcast_to(sensor[:, None, None, :], direction.shape)
+
+    t = (dem.intersect(origin, direction) if dem is not None
+         else ray_ellipsoid(origin, direction))
+    hits = origin + direction * t[..., None]
+    valid = ~np.isnan(t).reshape(n, -1).any(axis=1) & ~np.isnan(lat) & ~np.isnan(lon)
+
+    hit_lat, hit_lon, hit_height = ecef_to_geodetic(hits)
+    grid = np.stack([hit_lon, hit_lat, hit_height], axis=-1)
+    grid[~valid] = np.nan
+    corners = grid[:, [0, 0, -1, -1], [0, -1, -1, 0]]
+
+    platform = sensor + np.einsum("nij,j->ni", platform_rot, np.asarray(sensor_offset, dtype=np.float64))
+    p_lat, p_lon, p_height = ecef_to_geodetic(platform)
+    return {
+        "grid": grid,
+        "corners": corners,
+        "sensor": np.stack([lon, lat, alt], axis=-1),
+        "platform": np.stack([p_lon, p_lat, p_height], axis=-1),
+        "valid": valid,
+    }
+
+
+def offset_polygons(columns):
+    """(n, 4, 2) lon/lat corners from the frame center plus offset corner tags 26-33."""
+    n = len(next(iter(columns.values()))) if columns else 0
+    fc_lat = _column(columns, FRAME_CENTER_LATITUDE, n, 0.0)
+    fc_lon = _column(columns, FRAME_CENTER_LONGITUDE, n, 0.0)
+    return np.stack([
+        np.stack([fc_lon + _column(columns, lon_tag, n, 0.0),
+                  fc_lat + _column(columns, lat_tag, n, 0.0)], axis=-1)
+        for lat_tag, lon_tag in OFFSET_CORNERS
+    ], axis=1)
+
+
+def local_set_footprint(local_set, grid_n=GRID_N, dem=None, sensor_offset=(0.0, 0.0, 0.0)):
+    """Footprint of one decoded Local Set as plain lists, or None if a ray misses."""
+    columns = {}
+    for tag in FOOTPRINT_TAGS:
+        value = local_set.get(tag)
+        columns[tag] = [value if type(value) is float else np.nan]
+    result = compute_footprints(columns, grid_n, dem, sensor_offset)
+    if not result["valid"][0]:
+        return None
+    return {
+        "grid": np.round(result["grid"][0].reshape(-1, 3), 7).tolist(),
+        "corners": np.round(result["corners"][0], 7).tolist(),
+    }
+
+
+# ---------------------------
+# GeoJSON
+# ---------------------------
+def footprint_geojson(pts, columns, grid_n=GRID_N, dem=None):
+    """FeatureCollection with one footprint polygon per packet (pts in ns) and the sensor track."""
+    result = compute_footprints(columns, grid_n, dem)
+    features = []
+    for i in np.flatnonzero(result["valid"]):
+        ring = result["corners"][i, :, :2].tolist()
+        ring.append(ring[0])
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {"pts": int(pts[i]) / 1e9},
+        })
+    track = result["sensor"][~np.isnan(result["sensor"][:, :2]).any(axis=1)]
+    if len(track) > 1:
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": track.tolist()},
+            "properties": {"kind": "sensor track"},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def store_geojson(store, start_ns=None, end_ns=None, step=1, grid_n=GRID_N, dem=None):
+    """GeoJSON footprint track of a klv_store.KLVStore window, every `step`th packet."""
+    rows = store.window(start_ns, end_ns)
+    rows = slice(rows.start, rows.stop, max(1, step))
+    columns = {tag: np.asarray(store.column(tag)[rows]) for tag in FOOTPRINT_TAGS if tag in store.tags}
+    pts = np.asarray(store.pts[rows])
+    if not columns:
+        return {"type": "FeatureCollection", "features": []}
+    return footprint_geojson(pts, columns, grid_n, dem)
+
+
+if __name__ == "__main__":
+    import klv_store
+
+    parser = argparse.ArgumentParser(description="Footprint track of an extracted KLV store as GeoJSON")
+    parser.add_argument("store", help="Store directory written by klv_store.py")
+    parser.add_argument("--dem", default=None, help=".npz DEM tile with heights and bounds")
+    parser.add_argument("--step", type=int, default=1, help="Use every n-th packet")
+    args = parser.parse_args()
+
+    dem = DEM.load(args.dem) if args.dem else None
+    print(json.dumps(store_geojson(klv_store.KLVStore(args.store), step=args.step, dem=dem)))
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Columnar, memory-mapped store of the ST 0601 metadata in a recording.
+
+    python klv_store.py ./raw/videos/truck.ts            # -> ./raw/videos/truck.ts.klv/
+
+Layout of the store directory:
+    meta.json        packet count, source file, column descriptions
+    pts.npy          int64 PTS in nanoseconds, sorted ascending
+    tag_<n>.npy      one fixed-dtype column per ST 0601 tag, row-aligned with pts:
+                       mapped tags   float64 (NaN = absent/out of domain)
+                       timestamps    int64 microseconds since epoch (-1 = absent)
+                       strings       fixed-width bytes (b"" = absent)
+
+Every .npy is opened with mmap_mode="r", so a time-window lookup is a
+binary search on pts plus a slice of the columns it needs.
+"""
+import argparse
+import datetime
+import json
+import os
+
+import numpy as np
+
+import misc
+import misb0601
+
+STORE_SUFFIX = ".klv"
+NO_TIMESTAMP = -1
+
+
+def default_store_path(video_path):
+    return video_path + STORE_SUFFIX
+
+
+# ---------------------------
+# Writing
+# ---------------------------
+class KLVStoreWriter:
+    """Collects KLV buffers with their PTS and writes the columnar store in one go."""
+
+    def __init__(self):
+        self.batch = misc.KLVBatch()
+        self.packet_pts = []
+        self._last_pts = 0
+
+    def add(self, pts, raw):
+        """Add one KLV buffer. Packets without a PTS inherit the previous one."""
+        if pts is None:
+            pts = self._last_pts
+        self._last_pts = pts
+        count = self.batch.add(raw)
+        self.packet_pts.extend([pts] * count)
+
+    def write(self, path, source=None):
+        os.makedirs(path, exist_ok=True)
+        n = self.batch.packets
+        pts = np.asarray(self.packet_pts, dtype=np.int64)
+        order = np.argsort(pts, kind="stable")
+        np.save(os.path.join(path, "pts.npy"), pts[order])
+
+        rows = self.batch.as_numpy()
+        present = set(np.unique(rows[:, 2]).tolist()) if len(rows) else set()
+        columns = {}
+        for tag in sorted(present):
+            column = self._column(tag, n)
+            if column is None:
+                continue
+            np.save(os.path.join(path, f"tag_{tag}.npy"), column[order])
+            columns[str(tag)] = {
+                "name": misb0601.TAG_NAMES.get(tag, ""),
+                "dtype": column.dtype.str,
+            }
+
+        meta = {"source": source, "packets": n, "columns": columns}
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+    def _column(self, tag, n):
+        decoder = misb0601.DECODERS.get(tag)
+        if tag in misb0601.MAPPED_TAGS:
+            column = np.full(n, np.nan)
+            packets, values = misb0601.decode_batch_column(self.batch, tag)
+            column[packets] = values
+            return column
+        if decoder is misb0601._decode_timestamp:
+            # ST 0601 timestamps are 8-byte big-endian microseconds
+            column = np.full(n, NO_TIMESTAMP, dtype=np.int64)
+            packets, matrix = misb0601.gather_column(self.batch, tag, 8)
+            column[packets] = matrix.view(">u8").reshape(-1).astype(np.int64)
+            return column
+        if decoder is misb0601._decode_string:
+            values = list(self._values(tag))
+            width = max((len(v) for _, v in values), default=1) or 1
+            column = np.zeros(n, dtype=f"S{width}")
+            for packet, value in values:
+                column[packet] = bytes(value)
+            return column
+        # checksums, nested sets and unknown tags are not columnar
+        return None
+
+    def _values(self, tag):
+        buffers = self.batch.buffers
+        rows = self.batch.as_numpy()
+        for buffer_no, packet, _, off, length in rows[rows[:, 2] == tag].tolist():
+            yield packet, buffers[buffer_no][off:off + length]
+
+
+def extract_ts(video_path, writer, klv_index=0, workers=None):
+    """Feed every KLV PES of `video_path` into `writer` using the mmap demuxer (no playback)."""
+    import ts_demux
+
+    for pts, data in ts_demux.extract_klv(video_path, klv_index, workers):
+        writer.add(pts, data)
+
+
+def extract_gstreamer(video_path, writer):
+    """Feed every KLV buffer of `video_path` into `writer` using the GStreamer extractor."""
+    from test_klv import KLVExtractor
+
+    extractor = KLVExtractor(video_path, on_packet=writer.add)
+    extractor.start()
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+class KLVStore:
+    """Read-only, memory-mapped view of a store written by KLVStoreWriter."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.pts = np.load(os.path.join(path, "pts.npy"), mmap_mode="r")
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.pts)
+
+    @property
+    def tags(self):
+        return [int(t) for t in self.meta["columns"]]
+
+    def column(self, tag):
+        column = self._columns.get(tag)
+        if column is None:
+            if str(tag) not in self.meta["columns"]:
+                raise KeyError(tag)
+            column = np.load(os.path.join(self.path, f"tag_{tag}.npy"), mmap_mode="r")
+            self._columns[tag] = column
+        return column
+
+    def window(self, start_ns=None, end_ns=None):
+        """Row slice covering start_ns <= pts < end_ns."""
+        lo = 0 if start_ns is None else int(np.searchsorted(self.pts, start_ns, side="left"))
+        hi = len(self.pts) if end_ns is None else int(np.searchsorted(self.pts, end_ns, side="left"))
+        return slice(lo, hi)
+
+    def range(self, start_ns=None, end_ns=None, tags=None):
+        """{"pts": array, tag: array, ...} for the window; arrays are memmap slices."""
+        rows = self.window(start_ns, end_ns)
+        out = {"pts": self.pts[rows]}
+        for tag in (self.tags if tags is None else tags):
+            if str(tag) in self.meta["columns"]:
+                out[tag] = self.column(tag)[rows]
+        return out
+
+    def records(self, start_ns=None, end_ns=None, tags=None):
+        """Window as a list of {tag: value} dicts (the shape clients get live), absent values omitted."""
+        columns = self.range(start_ns, end_ns, tags)
+        pts = columns.pop("pts")
+        decoded = {}
+        for tag, column in columns.items():
+            if column.dtype.kind == "f":
+                values = column.tolist()
+                decoded[tag] = [None if v != v else v for v in values]
+            elif column.dtype.kind == "i":
+                decoded[tag] = [None if v == NO_TIMESTAMP else _timestamp(v) for v in column.tolist()]
+            else:
+                decoded[tag] = [v.decode("utf-8", "replace") or None for v in column.tolist()]
+
+        records = []
+        for i, p in enumerate(pts.tolist()):
+            record = {"#pts": p / 1e9}
+            for tag, values in decoded.items():
+                if values[i] is not None:
+                    record[tag] = values[i]
+            records.append(record)
+        return records
+
+
+def _timestamp(microseconds):
+    """UTC datetime of a stored timestamp, or None if it's outside datetime's range (a corrupt tag)."""
+    try:
+        return datetime.datetime.fromtimestamp(microseconds / 1e6, tz=datetime.timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def open_store(video_path):
+    """Open the store next to `video_path`, or return None if it hasn't been extracted."""
+    path = default_store_path(video_path)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    return KLVStore(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract ST 0601 KLV from an MPEG-TS file into a columnar store")
+    parser.add_argument("file", help="Path to MPEG-TS file")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Store directory (default: <file>.klv next to the input)")
+    parser.add_argument("--klv-index", dest="klv_index", type=int, default=0,
+                        help="Which KLV stream to extract (0-based). Default 0.")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Demuxer worker processes (default: cpu count)")
+    parser.add_argument("--gstreamer", action="store_true",
+                        help="Extract through a GStreamer tsdemux pipeline instead of the mmap demuxer")
+    args = parser.parse_args()
+
+    writer = KLVStoreWriter()
+    if args.gstreamer:
+        extract_gstreamer(args.file, writer)
+    else:
+        extract_ts(args.file, writer, args.klv_index, args.workers)
+    out = args.output or default_store_path(args.file)
+    meta = writer.write(out, source=os.path.abspath(args.file))
+    print(f"Wrote {meta['packets']} packets, {len(meta['columns'])} columns -> {out}")
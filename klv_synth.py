@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Deterministic generator of valid MISB ST 0601 Local Sets, for benchmarks
+and for exercising the demuxers without a real recording.
+
+    python klv_synth.py out.ts --packets 3000                 # KLV-only MPEG-TS
+    python klv_synth.py out.ts --packets 3000 --gstreamer     # + videotestsrc H.264
+    python klv_synth.py udp://127.0.0.1:5000 --packets 0      # live feed for server.py
+
+A Generator flies a platform in a slow circle and encodes one Local Set per
+frame from a tag mix ("minimal", "typical", "full" or explicit tag numbers).
+Values go through the inverse of misb0601's fixed-point tables, so decoding
+a generated packet returns the generated values (to encoding precision).
+Optional extras: long-form BER lengths on items, nested Security (48) and
+VMTI (74) sets, and the tag 1 checksum. The same seed always gives the same
+bytes.
+"""
+import argparse
+import datetime
+import math
+import random
+import time
+
+import misc
+import misb0601
+
+UAS_LS_KEY = bytes.fromhex("060e2b34020b01010e01030101000000")
+
+MIXES = {
+    "minimal": (2, 13, 14, 15, 65),
+    "typical": (2, 3, 5, 6, 7, 10, 11, 13, 14, 15, 16, 17, 18, 19, 20, 21, 23, 24, 25,
+                26, 27, 28, 29, 30, 31, 32, 33, 56, 65),
+    "full": tuple(sorted(set(misb0601.MAPPED_TAGS) | {t for t, _ in misb0601.STRINGS}
+                         | {t for t, _ in misb0601.TIMESTAMPS})),
+}
+
+EPOCH_US = 1_700_000_000_000_000  # 2023-11-14, fixed so output is reproducible
+
+
+# ---------------------------
+# Encoding primitives
+# ---------------------------
+def encode_ber_length(length, long_form=False):
+    """BER length; short form below 128 unless `long_form` is forced."""
+    if length < 0x80 and not long_form:
+        return bytes((length,))
+    body = length.to_bytes(max(1, (length.bit_length() + 7) // 8), "big")
+    return bytes((0x80 | len(body),)) + body
+
+
+def encode_item(tag, value, long_form=False):
+    return misc.encode_ber_oid(tag) + encode_ber_length(len(value), long_form) + value
+
+
+def encode_mapped(tag, value):
+    """Inverse of misb0601.MappedTag: float -> big-endian fixed point, clamped to the domain."""
+    mapping = misb0601.MAPPED_TAGS[tag]
+    raw = round((value - mapping.rmin) / mapping.scale + mapping.dmin)
+    raw = min(max(raw, mapping.dmin), mapping.dmax)
+    return raw.to_bytes(mapping.length, "big", signed=mapping.signed)
+
+
+def encode_value(tag, value):
+    if tag in misb0601.MAPPED_TAGS:
+        return encode_mapped(tag, value)
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp() * 1e6).to_bytes(8, "big")
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return bytes(value)
+
+
+def encode_packet(items, checksum=True, long_lengths=(), key=UAS_LS_KEY):
+    """
+    One Local Set from [(tag, value bytes)]. Tags in `long_lengths` get a
+    long-form length. With `checksum`, tag 1 is appended last and covers the
+    key through its own length byte.
+    """
+    body = b"".join(encode_item(tag, value, tag in long_lengths) for tag, value in items)
+    if not checksum:
+        return key + encode_ber_length(len(body)) + body
+    body += b"\x01\x02"
+    head = key + encode_ber_length(len(body) + 2)
+    return head + body + misb0601.st0601_checksum(head + body).to_bytes(2, "big")
+
+
+def security_set(rng):
+    """ST 0102 Security Local Set (tag 48): classification, coding method, country, version."""
+    return b"".join((
+        encode_item(1, bytes((1,))),               # UNCLASSIFIED
+        encode_item(2, bytes((7,))),               # ISO-3166 two letter
+        encode_item(3, rng.choice((b"US", b"CA", b"GB"))),
+        encode_item(22, (12).to_bytes(2, "big")),  # ST 0102 version
+    ))
+
+
+def vmti_set(rng, frame, targets):
+    """
+    ST 0903 VMTI Local Set (tag 74) with a CRC-16-CCITT checksum (tag 1) over
+    the set's own items up to and including the checksum's tag and length.
+    """
+    body = b"".join((
+        encode_item(3, b"SYNTH-VMTI"),
+        encode_item(4, (5).to_bytes(2, "big")),
+        encode_item(5, targets.to_bytes(3, "big")),
+        encode_item(6, targets.to_bytes(3, "big")),
+        encode_item(7, (frame & 0xFFFFFF).to_bytes(3, "big")),
+        encode_item(8, (1280).to_bytes(2, "big")),
+        encode_item(9, (720).to_bytes(2, "big")),
+    )) + b"\x01\x02"
+    return body + misb0601.crc16_ccitt(body).to_bytes(2, "big")
+
+
+# ---------------------------
+# Generator
+# ---------------------------
+class Generator:
+    """
+    Reproducible stream of ST 0601 packets. `mix` is a MIXES name or a tag
+    list; `long_lengths` is the fraction of items written with long-form
+    lengths; `nested` adds tags 48 and 74; `checksum` appends tag 1.
+    """
+
+    def __init__(self, mix="typical", seed=0, rate=30.0, long_lengths=0.0, nested=False, checksum=True):
+        self.tags = tuple(MIXES[mix] if isinstance(mix, str) else mix)
+        self.seed = seed
+        self.rate = rate
+        self.long_lengths = long_lengths
+        self.nested = nested
+        self.checksum = checksum
+
+    def local_set(self, i, captured=None):
+        """
+        {tag: value} of packet `i`, before encoding. `captured` (a UTC
+        datetime) replaces the synthetic Precision Time Stamp, for live feeds.
+        """
+        rng = random.Random(self.seed * 1_000_003 + i)
+        t = i / self.rate
+        # a 2 km circle around Cheyenne every 4 minutes at 1500 m, camera looking down-left
+        angle = 2 * math.pi * t / 240.0 + self.seed
+        lat = 41.1 + 0.018 * math.sin(angle)
+        lon = -104.8 + 0.024 * math.cos(angle)
+        heading = (math.degrees(-angle) + 180.0) % 360.0
+        values = {
+            2: datetime.datetime.fromtimestamp((EPOCH_US + int(t * 1e6)) / 1e6, tz=datetime.timezone.utc),
+            3: "SYNTH",
+            4: "N0000",
+            5: heading,
+            6: 2.0 * math.sin(t / 7.0),
+            7: -15.0 + rng.uniform(-0.5, 0.5),
+            8: 45.0,
+            9: 44.0,
+            10: "SYNTH-UAV",
+            11: "EO",
+            12: "Geodetic WGS84",
+            13: lat,
+            14: lon,
+            15: 1500.0 + 20.0 * math.sin(t / 11.0),
+            16: 12.0 + 4.0 * math.sin(t / 13.0),
+            17: 6.75 + 2.25 * math.sin(t / 13.0),
+            18: 270.0 + rng.uniform(-1.0, 1.0),
+            19: -30.0 + rng.uniform(-1.0, 1.0),
+            20: 0.0,
+            21: 3000.0 + rng.uniform(-5.0, 5.0),
+            22: 600.0,
+            23: lat + 0.01,
+            24: lon - 0.01,
+            25: 1830.0,
+            56: 45.0,
+            59: "SYNTH01",
+            65: 17.0,
+            70: "ALT",
+            72: datetime.datetime.fromtimestamp(EPOCH_US / 1e6, tz=datetime.timezone.utc),
+            77: "Exercise",
+        }
+        if captured is not None:
+            values[2] = captured
+        for k, tag in enumerate(range(26, 34)):
+            values[tag] = (0.002 if k % 2 == 0 else -0.003) * (1 + k // 2)
+        for tag in self.tags:
+            if tag not in values and tag in misb0601.MAPPED_TAGS:
+                mapping = misb0601.MAPPED_TAGS[tag]
+                values[tag] = mapping.rmin + (mapping.rmax - mapping.rmin) * rng.random()
+            elif tag not in values:
+                values[tag] = misb0601.TAG_NAMES.get(tag, f"TAG{tag}")
+        return {tag: values[tag] for tag in self.tags}
+
+    def packet(self, i, captured=None):
+        rng = random.Random(self.seed * 7_919 + i)
+        items = [(tag, encode_value(tag, value)) for tag, value in self.local_set(i, captured).items()]
+        if self.nested:
+            items.append((48, security_set(rng)))
+            items.append((74, vmti_set(rng, i, rng.randint(0, 12))))
+        long_lengths = {tag for tag, _ in items if rng.random() < self.long_lengths}
+        return encode_packet(items, self.checksum, long_lengths)
+
+    def packets(self, n, start=0):
+        return [self.packet(i) for i in range(start, start + n)]
+
+
+# ---------------------------
+# MPEG-TS output
+# ---------------------------
+TS_PACKET = 188
+PMT_PID = 0x1000
+KLV_PID = 0x0101
+
+
+def crc32_mpeg(data):
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        crc &= 0xFFFFFFFF
+    return crc
+
+
+def _psi_packets(pid, table_id, table_ext, payload, cc):
+    section = bytes((table_id,)) + (0xB000 | (len(payload) + 9)).to_bytes(2, "big")
+    section += table_ext.to_bytes(2, "big") + b"\xc1\x00\x00" + payload
+    section += crc32_mpeg(section).to_bytes(4, "big")
+    data = b"\x00" + section
+    header = bytes((0x47, 0x40 | (pid >> 8), pid & 0xFF, 0x10 | (cc & 0x0F)))
+    return header + data + b"\xff" * (TS_PACKET - 4 - len(data))
+
+
+def _pes_packets(pid, data, pts_ns, cc):
+    pts = pts_ns * 9 // 100000
+    pts_bytes = bytes((
+        0x21 | ((pts >> 29) & 0x0E), (pts >> 22) & 0xFF, 0x01 | ((pts >> 14) & 0xFE),
+        (pts >> 7) & 0xFF, 0x01 | ((pts << 1) & 0xFE),
+    ))
+    # stream_id 0xFC (metadata), PTS only
+    pes = b"\x00\x00\x01\xfc" + (len(data) + 8).to_bytes(2, "big") + b"\x84\x80\x05" + pts_bytes + data
+    out = []
+    first = True
+    while pes:
+        chunk, pes = pes[:TS_PACKET - 4], pes[TS_PACKET - 4:]
+        header = bytes((0x47, (0x40 if first else 0) | (pid >> 8), pid & 0xFF))
+        if len(chunk) < TS_PACKET - 4:
+            # adaptation field of stuffing bytes pads the last packet
+            stuffing = TS_PACKET - 4 - len(chunk)
+            field = bytes((stuffing - 1,)) + (b"\x00" + b"\xff" * (stuffing - 2) if stuffing > 1 else b"")
+            out.append(header + bytes((0x30 | (cc & 0x0F),)) + field + chunk)
+        else:
+            out.append(header + bytes((0x10 | (cc & 0x0F),)) + chunk)
+        cc += 1
+        first = False
+    return out, cc
+
+
+def write_ts(path, packets, rate=30.0, psi_interval=30):
+    """KLV-only MPEG-TS: PAT/PMT (stream_type 0x15 on KLV_PID) and one PES per packet."""
+    pat = (1).to_bytes(2, "big") + (0xE000 | PMT_PID).to_bytes(2, "big")
+    metadata_descriptor = b"\x26\x09\x01\x00\xffKLVA\x00\x0f"
+    pmt = (0xE000 | KLV_PID).to_bytes(2, "big") + b"\xf0\x00"
+    pmt += bytes((0x15,)) + (0xE000 | KLV_PID).to_bytes(2, "big")
+    pmt += (0xF000 | len(metadata_descriptor)).to_bytes(2, "big") + metadata_descriptor
+    psi_cc = klv_cc = 0
+    with open(path, "wb") as f:
+        for i, data in enumerate(packets):
+            if i % psi_interval == 0:
+                f.write(_psi_packets(0x0000, 0x00, 1, pat, psi_cc))
+                f.write(_psi_packets(PMT_PID, 0x02, 1, pmt, psi_cc))
+                psi_cc += 1
+            ts_packets, klv_cc = _pes_packets(KLV_PID, data, int(i * 1e9 / rate), klv_cc)
+            f.write(b"".join(ts_packets))
+
+
+def mux_gstreamer(path, generator, frames, fps=30, width=1280, height=720):
+    """
+    videotestsrc H.264 plus the generator's KLV on an appsrc, muxed by
+    mpegtsmux into `path` as fast as the encoder runs. Needs GStreamer.
+    """
+    import gi
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+
+    Gst.init(None)
+    pipeline = Gst.parse_launch(
+        f"videotestsrc num-buffers={frames} pattern=ball ! "
+        f"video/x-raw,width={width},height={height},framerate={fps}/1 ! "
+        f"x264enc tune=zerolatency speed-preset=ultrafast key-int-max={fps} ! h264parse ! "
+        f"mpegtsmux name=mux ! filesink location=\"{path}\" "
+        f"appsrc name=klvsrc format=time caps=meta/x-klv,parsed=true ! mux."
+    )
+    klvsrc = pipeline.get_by_name("klvsrc")
+    pipeline.set_state(Gst.State.PLAYING)
+    duration = Gst.SECOND // fps
+    for i in range(frames):
+        data = generator.packet(i)
+        buf = Gst.Buffer.new_wrapped(data)
+        buf.pts = buf.dts = i * duration
+        buf.duration = duration
+        klvsrc.emit("push-buffer", buf)
+    klvsrc.emit("end-of-stream")
+
+    bus = pipeline.get_bus()
+    message = bus.timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    if message.type == Gst.MessageType.ERROR:
+        err, dbg = message.parse_error()
+        raise RuntimeError(f"muxing failed: {err} {dbg}")
+
+
+def stream_udp(uri, generator, frames=0, fps=30, width=1280, height=720):
+    """
+    Live videotestsrc H.264 + KLV as MPEG-TS over UDP (udp://host:port, a
+    multicast group works too), paced in real time, for testing live ingest
+    on loopback. Tag 2 carries the wall-clock capture time so the server
+    can report glass-to-glass latency. `frames` = 0 streams until Ctrl-C.
+    """
+    import gi
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+
+    host, _, port = uri[len("udp://"):].rpartition(":")
+    Gst.init(None)
+    num_buffers = frames if frames > 0 else -1
+    pipeline = Gst.parse_launch(
+        f"videotestsrc is-live=true num-buffers={num_buffers} pattern=ball ! "
+        f"video/x-raw,width={width},height={height},framerate={fps}/1 ! "
+        f"x264enc tune=zerolatency speed-preset=ultrafast key-int-max={fps} ! h264parse ! "
+        f"mpegtsmux name=mux alignment=7 ! udpsink host={host} port={port} sync=false "
+        f"appsrc name=klvsrc is-live=true do-timestamp=true format=time caps=meta/x-klv,parsed=true ! mux."
+    )
+    klvsrc = pipeline.get_by_name("klvsrc")
+    pipeline.set_state(Gst.State.PLAYING)
+    print(f"📡 Streaming to {uri} (Ctrl-C to stop)")
+    start = time.monotonic()
+    i = 0
+    try:
+        while frames <= 0 or i < frames:
+            captured = datetime.datetime.now(datetime.timezone.utc)
+            klvsrc.emit("push-buffer", Gst.Buffer.new_wrapped(generator.packet(i, captured)))
+            i += 1
+            time.sleep(max(0.0, start + i / fps - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic MISB ST 0601 MPEG-TS file")
+    parser.add_argument("output", help="Output .ts path, or udp://host:port to stream live")
+    parser.add_argument("--packets", type=int, default=900,
+                        help="KLV packets (= video frames). Default 900; 0 streams forever to udp://.")
+    parser.add_argument("--mix", default="typical",
+                        help="Tag mix: minimal, typical, full, or comma separated tag numbers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=30.0, help="Packets (frames) per second")
+    parser.add_argument("--long-lengths", dest="long_lengths", type=float, default=0.0,
+                        help="Fraction of items written with long-form BER lengths")
+    parser.add_argument("--nested", action="store_true", help="Add Security (48) and VMTI (74) sets")
+    parser.add_argument("--no-checksum", dest="checksum", action="store_false")
+    parser.add_argument("--gstreamer", action="store_true",
+                        help="Mux with a videotestsrc H.264 stream through GStreamer")
+    args = parser.parse_args()
+
+    mix = args.mix if args.mix in MIXES else [int(t) for t in args.mix.split(",")]
+    generator = Generator(mix, args.seed, args.rate, args.long_lengths, args.nested, args.checksum)
+    if args.output.startswith("udp://"):
+        stream_udp(args.output, generator, args.packets, fps=int(args.rate))
+    elif args.gstreamer:
+        mux_gstreamer(args.output, generator, args.packets, fps=int(args.rate))
+    else:
+        write_ts(args.output, generator.packets(args.packets), args.rate)
+    print(f"Wrote {args.packets} KLV packets -> {args.output}")
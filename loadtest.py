@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Headless load generator for server.py: opens simulated viewers in-process
+with aiortc, ramps their number up until the SLOs break, and prints the
+scaling curve.
+
+    python loadtest.py http://localhost:8080 --start 1 --step 2 --max 40
+    python loadtest.py http://host:8080 --source truck --slo-fps 25 --slo-latency 250 -o curve.json
+
+Every peer does the same /offer -> /answer exchange as index.htm, decodes
+the video and reads the "klv" DataChannel. Per step it records, per peer:
+    fps          decoded frames per second
+    jitter       standard deviation of the inter-frame gap (ms)
+    klv rate     DataChannel messages per second
+    latency      KLV: message arrival - server send stamp
+                 video: arrival of the frame with that RTP timestamp - server send stamp
+The server stamps messages with its wall clock when asked (?klv_timestamps=1),
+so latencies are only meaningful when both clocks agree (same host or NTP).
+Decoding runs in this process too; the client CPU column shows when the
+load generator, not the server, is the bottleneck.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import deque
+
+import aiohttp
+from aiortc import RTCPeerConnection, RTCSessionDescription
+
+RTP_MATCH_WINDOW = 512  # frames / KLV stamps kept per peer for latency matching
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class Peer:
+    """One simulated viewer."""
+
+    def __init__(self, index, http, url, params):
+        self.index = index
+        self.http = http
+        self.url = url
+        self.params = params
+        self.pc = RTCPeerConnection()
+        self.session_id = None
+        self.connected = asyncio.Event()
+        self.failed = False
+        self._tasks = []
+        # rtp timestamp -> arrival / server stamp, whichever shows up first waits for the other
+        self._frame_arrivals = {}
+        self._klv_stamps = {}
+        self.reset()
+
+    def reset(self):
+        """Start a new measurement window."""
+        self.window_start = time.monotonic()
+        self.frames = 0
+        self.intervals = []
+        self.klv_messages = 0
+        self.klv_latencies = []
+        self.video_latencies = []
+        self._last_frame = None
+
+    # ---- signalling ----
+    async def connect(self):
+        pc = self.pc
+
+        @pc.on("track")
+        def on_track(track):
+            if track.kind == "video":
+                self._tasks.append(asyncio.ensure_future(self._consume(track)))
+
+        @pc.on("datachannel")
+        def on_datachannel(channel):
+            channel.on("message", self._on_klv)
+
+        @pc.on("connectionstatechange")
+        async def on_state():
+            if pc.connectionState == "connected":
+                self.connected.set()
+            elif pc.connectionState in ("failed", "closed"):
+                self.failed = pc.connectionState == "failed"
+                self.connected.set()
+
+        async with self.http.post(f"{self.url}/offer", params=self.params) as response:
+            if response.status != 200:
+                raise RuntimeError(f"/offer returned {response.status}: {await response.text()}")
+            offer = await response.json()
+        self.session_id = offer["session_id"]
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=offer["sdp"], type=offer["type"]))
+        await pc.setLocalDescription(await pc.createAnswer())
+        answer = {"session_id": self.session_id, "sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+        async with self.http.post(f"{self.url}/answer", json=answer) as response:
+            if response.status != 200:
+                raise RuntimeError(f"/answer returned {response.status}: {await response.text()}")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await self.pc.close()
+
+    # ---- media ----
+    async def _consume(self, track):
+        while True:
+            try:
+                frame = await track.recv()
+            except Exception:
+                return
+            now = time.monotonic()
+            if self._last_frame is not None:
+                self.intervals.append(now - self._last_frame)
+            self._last_frame = now
+            self.frames += 1
+            # decoded frames carry the RTP timestamp the server also puts in "rtp"
+            self._match(frame.pts, arrival=time.time())
+
+    def _on_klv(self, message):
+        arrival = time.time()
+        self.klv_messages += 1
+        try:
+            data = json.loads(message)
+        except (TypeError, ValueError):
+            return
+        sent = data.get("ts")
+        if sent is None:
+            return
+        self.klv_latencies.append(arrival - sent)
+        self._match(data.get("rtp"), sent=sent)
+
+    def _match(self, rtp, arrival=None, sent=None):
+        if rtp is None:
+            return
+        if arrival is not None:
+            sent = self._klv_stamps.pop(rtp, None)
+            if sent is None:
+                self._remember(self._frame_arrivals, rtp, arrival)
+                return
+        else:
+            arrival = self._frame_arrivals.pop(rtp, None)
+            if arrival is None:
+                self._remember(self._klv_stamps, rtp, sent)
+                return
+        self.video_latencies.append(arrival - sent)
+
+    @staticmethod
+    def _remember(table, rtp, value):
+        table[rtp] = value
+        if len(table) > RTP_MATCH_WINDOW:
+            table.pop(next(iter(table)))
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.window_start, 1e-6)
+        return {
+            "fps": self.frames / elapsed,
+            "jitter_ms": statistics.pstdev(self.intervals) * 1000 if len(self.intervals) > 1 else None,
+            "klv_rate": self.klv_messages / elapsed,
+            "klv_latency_ms": [v * 1000 for v in self.klv_latencies],
+            "video_latency_ms": [v * 1000 for v in self.video_latencies],
+            "failed": self.failed,
+        }
+
+
+def summarize(level, peer_stats, cpu):
+    fps = [s["fps"] for s in peer_stats]
+    jitter = [s["jitter_ms"] for s in peer_stats if s["jitter_ms"] is not None]
+    klv_latency = [v for s in peer_stats for v in s["klv_latency_ms"]]
+    video_latency = [v for s in peer_stats for v in s["video_latency_ms"]]
+    return {
+        "peers": level,
+        "failed": sum(1 for s in peer_stats if s["failed"]),
+        "fps_min": min(fps, default=0.0),
+        "fps_median": statistics.median(fps) if fps else 0.0,
+        "jitter_p95_ms": percentile(jitter, 0.95),
+        "klv_rate_median": statistics.median([s["klv_rate"] for s in peer_stats]) if peer_stats else 0.0,
+        "klv_latency_p50_ms": percentile(klv_latency, 0.50),
+        "klv_latency_p95_ms": percentile(klv_latency, 0.95),
+        "video_latency_p50_ms": percentile(video_latency, 0.50),
+        "video_latency_p95_ms": percentile(video_latency, 0.95),
+        "client_cpu": cpu,
+    }
+
+
+def slo_violations(row, args):
+    broken = []
+    if row["failed"]:
+        broken.append(f"{row['failed']} peers failed")
+    if row["fps_min"] < args.slo_fps:
+        broken.append(f"min fps {row['fps_min']:.1f} < {args.slo_fps}")
+    latency = row["video_latency_p95_ms"] or row["klv_latency_p95_ms"]
+    if latency is not None and latency > args.slo_latency:
+        broken.append(f"p95 latency {latency:.0f} ms > {args.slo_latency}")
+    if row["jitter_p95_ms"] is not None and row["jitter_p95_ms"] > args.slo_jitter:
+        broken.append(f"p95 jitter {row['jitter_p95_ms']:.0f} ms > {args.slo_jitter}")
+    return broken
+
+
+def _fmt(value, spec=".0f"):
+    return "-" if value is None else format(value, spec)
+
+
+def print_row(row):
+    print(f"{row['peers']:>5} {row['failed']:>6} {row['fps_min']:>7.1f} {row['fps_median']:>7.1f} "
+          f"{_fmt(row['jitter_p95_ms']):>10} {row['klv_rate_median']:>8.1f} "
+          f"{_fmt(row['klv_latency_p95_ms']):>10} {_fmt(row['video_latency_p95_ms']):>10} "
+          f"{row['client_cpu']:>6.0%}")
+
+
+async def run(args):
+    params = {"source": args.source, "klv_timestamps": "1"}
+    if args.klv_rate is not None:
+        params["klv_rate"] = str(args.klv_rate)
+    peers = deque()
+    curve = []
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(timeout=timeout) as http:
+        print(f"{'peers':>5} {'failed':>6} {'fps min':>7} {'fps med':>7} {'jitter p95':>10} "
+              f"{'klv/s':>8} {'klv p95':>10} {'video p95':>10} {'cpu':>6}")
+        level = args.start
+        try:
+            while level <= args.max:
+                new = [Peer(len(peers) + i, http, args.url, params) for i in range(level - len(peers))]
+                results = await asyncio.gather(*(p.connect() for p in new), return_exceptions=True)
+                for peer, result in zip(new, results):
+                    if isinstance(result, Exception):
+                        print(f"⚠️ peer {peer.index} failed to connect: {result}")
+                        peer.failed = True
+                    peers.append(peer)
+                await asyncio.wait([asyncio.ensure_future(p.connected.wait()) for p in new], timeout=args.connect_timeout)
+
+                await asyncio.sleep(args.warmup)
+                for peer in peers:
+                    peer.reset()
+                cpu_start, wall_start = time.process_time(), time.monotonic()
+                await asyncio.sleep(args.hold)
+                cpu = (time.process_time() - cpu_start) / (time.monotonic() - wall_start) / (os.cpu_count() or 1)
+
+                row = summarize(level, [p.stats() for p in peers], cpu)
+                curve.append(row)
+                print_row(row)
+                broken = slo_violations(row, args)
+                if broken:
+                    row["slo_broken"] = broken
+                    print(f"🛑 SLO broken at {level} peers: {'; '.join(broken)}")
+                    break
+                level += args.step
+        finally:
+            await asyncio.gather(*(p.close() for p in peers), return_exceptions=True)
+
+    passing = [row["peers"] for row in curve if "slo_broken" not in row]
+    print(f"✅ Sustained {max(passing)} peers within SLO" if passing else "❌ SLO broken at the first step")
+    return curve
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ramp simulated WebRTC viewers against server.py")
+    parser.add_argument("url", nargs="?", default="http://localhost:8080", help="Server base URL")
+    parser.add_argument("--source", default="default", help="Source id to watch")
+    parser.add_argument("--klv-rate", dest="klv_rate", type=float, default=None,
+                        help="Requested KLV rate (Hz) per peer; server default if omitted")
+    parser.add_argument("--start", type=int, default=1, help="Peers in the first step")
+    parser.add_argument("--step", type=int, default=1, help="Peers added per step")
+    parser.add_argument("--max", type=int, default=50, help="Stop ramping at this many peers")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds after connecting before measuring")
+    parser.add_argument("--hold", type=float, default=10.0, help="Measurement seconds per step")
+    parser.add_argument("--connect-timeout", dest="connect_timeout", type=float, default=15.0)
+    parser.add_argument("--slo-fps", dest="slo_fps", type=float, default=25.0,
+                        help="Every peer must decode at least this many fps")
+    parser.add_argument("--slo-latency", dest="slo_latency", type=float, default=300.0,
+                        help="p95 end-to-end latency budget (ms)")
+    parser.add_argument("--slo-jitter", dest="slo_jitter", type=float, default=50.0,
+                        help="p95 inter-frame jitter budget (ms)")
+    parser.add_argument("-o", "--output", default=None, help="Write the scaling curve as JSON")
+    args = parser.parse_args()
+
+    curve = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": args.url, "source": args.source, "args": vars(args), "curve": curve}, f, indent=2)
+        print(f"Curve -> {args.output}")
@@ -280,6 +280,9 @@ class Metadata {
         result[pairings[key]] = frame[key];
       }
     }
+    if (frame.footprint) {
+      result.footprint = frame.footprint;
+    }
 
     return result;
   }
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Minimal Prometheus instrumentation for the streaming server.
+
+Counters, gauges and histograms with labels, rendered in the Prometheus
+text exposition format (0.0.4) by render(). Updates are a dict lookup plus
+a few additions under a per-series lock, so they are safe to call from
+GStreamer streaming threads and cheap enough to leave on.
+
+    FRAMES = metrics.counter("frames_total", "Frames sent", ["source"])
+    FRAMES.labels("default").inc()
+    text = metrics.render()
+
+Gauges that are cheaper to read than to keep up to date (queue depths,
+per-peer backlog) are filled in at scrape time by callbacks registered
+with on_collect().
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; spans sub-millisecond parsing up to multi-frame pipeline delays
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+# ---------------------------
+# Series (one label combination of a metric)
+# ---------------------------
+class _CounterSeries:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeSeries:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class _HistogramSeries:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the elapsed wall time of its block."""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("series", "start")
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.start)
+        return False
+
+
+# ---------------------------
+# Metrics
+# ---------------------------
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Series for these label values (created on first use)."""
+        values = tuple(str(v) for v in values)
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(values, self._new_series())
+        return series
+
+    def remove(self, *values):
+        """Forget one series, e.g. when its session ends."""
+        self._series.pop(tuple(str(v) for v in values), None)
+
+    def remove_matching(self, **match):
+        """Forget every series whose labels include `match`."""
+        index = [(self.labelnames.index(k), str(v)) for k, v in match.items()]
+        for values in list(self._series):
+            if all(values[i] == v for i, v in index):
+                self._series.pop(values, None)
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """[(suffix, label values, extra label or None, value)] for rendering."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            labels = _labels(self.labelnames, values, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def samples(self):
+        return [("", values, None, series.value) for values, series in list(self._series.items())]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_series(self):
+        return _GaugeSeries()
+
+    def samples(self):
+        return [("", values, None, series.value) for values, series in list(self._series.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def samples(self):
+        out = []
+        for values, series in list(self._series.items()):
+            with series._lock:
+                counts, total = list(series.counts), series.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                out.append(("_bucket", values, ("le", _format_value(float(bound))), cumulative))
+            out.append(("_sum", values, None, total))
+            out.append(("_count", values, None, cumulative))
+        return out
+
+
+# ---------------------------
+# Registry
+# ---------------------------
+_metrics = {}
+_collectors = []
+
+
+def _register(metric):
+    existing = _metrics.get(metric.name)
+    if existing is not None:
+        return existing
+    _metrics[metric.name] = metric
+    return metric
+
+
+def counter(name, help, labelnames=()):
+    return _register(Counter(name, help, labelnames))
+
+
+def gauge(name, help, labelnames=()):
+    return _register(Gauge(name, help, labelnames))
+
+
+def histogram(name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, help, labelnames, buckets))
+
+
+def on_collect(callback):
+    """Call `callback()` before every render, to refresh scrape-time gauges."""
+    _collectors.append(callback)
+    return callback
+
+
+def render():
+    """All metrics in Prometheus text format."""
+    for callback in _collectors:
+        try:
+            callback()
+        except Exception as e:  # a broken collector must not take /metrics down
+            print(f"⚠️ metrics collector {callback.__name__} failed: {e}")
+    lines = []
+    for metric in list(_metrics.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,632 @@
+"""
+Table-driven MISB ST 0601 (UAS Datalink Local Set) value decoding.
+
+Replaces the per-tag klvdata element construction in the streaming path.
+Every tag's struct format and fixed-point mapping is resolved once at import
+time; decoding a value is a dict lookup plus one struct unpack. Results match
+klvdata's `.value.value` (mapped floats, UTC datetimes, UTF-8 strings, raw
+bytes for anything unknown or out of domain) so clients see the same JSON.
+
+Nested Local Sets (48 Security, 73 RVT, 74 VMTI) decode to NestedSet
+mappings that only walk their bytes when first read, so a VMTI target list
+nobody looks at costs one bytes copy. decode_klv(verify=True) checks the
+tag 1 checksum and drops corrupt packets before any value is decoded.
+
+klv.js `decodeMISBValue` carries a subset of the same mappings for the
+browser-side file loader.
+"""
+import datetime
+import struct
+from collections.abc import Mapping
+
+import misc
+
+# try to import numpy (optional). Only the batch/column API needs it.
+try:
+    import numpy as _np  # type: ignore
+except Exception:
+    _np = None
+
+
+# ---------------------------
+# Tag table
+# ---------------------------
+# (tag, name, length, signed, domain, range). The domain is the integer
+# range of the encoded value, the range is what it maps onto. Signed domains
+# are symmetric (the most negative value is the "out of range" indicator).
+_U8 = (1, False, (0, 2**8 - 1))
+_U16 = (2, False, (0, 2**16 - 1))
+_U32 = (4, False, (0, 2**32 - 1))
+_S16 = (2, True, (-(2**15 - 1), 2**15 - 1))
+_S32 = (4, True, (-(2**31 - 1), 2**31 - 1))
+
+MAPPED = [
+    (5, "Platform Heading Angle", _U16, (0, 360)),
+    (6, "Platform Pitch Angle", _S16, (-20, 20)),
+    (7, "Platform Roll Angle", _S16, (-50, 50)),
+    (8, "Platform True Airspeed", _U8, (0, 255)),
+    (9, "Platform Indicated Airspeed", _U8, (0, 255)),
+    (13, "Sensor Latitude", _S32, (-90, 90)),
+    (14, "Sensor Longitude", _S32, (-180, 180)),
+    (15, "Sensor True Altitude", _U16, (-900, 19000)),
+    (16, "Sensor Horizontal Field of View", _U16, (0, 180)),
+    (17, "Sensor Vertical Field of View", _U16, (0, 180)),
+    (18, "Sensor Relative Azimuth Angle", _U32, (0, 360)),
+    (19, "Sensor Relative Elevation Angle", _S32, (-180, 180)),
+    (20, "Sensor Relative Roll Angle", _U32, (0, 360)),
+    (21, "Slant Range", _U32, (0, 5e6)),
+    (22, "Target Width", _U16, (0, 10e3)),
+    (23, "Frame Center Latitude", _S32, (-90, 90)),
+    (24, "Frame Center Longitude", _S32, (-180, 180)),
+    (25, "Frame Center Elevation", _U16, (-900, 19e3)),
+    (26, "Offset Corner Latitude Point 1", _S16, (-0.075, 0.075)),
+    (27, "Offset Corner Longitude Point 1", _S16, (-0.075, 0.075)),
+    (28, "Offset Corner Latitude Point 2", _S16, (-0.075, 0.075)),
+    (29, "Offset Corner Longitude Point 2", _S16, (-0.075, 0.075)),
+    (30, "Offset Corner Latitude Point 3", _S16, (-0.075, 0.075)),
+    (31, "Offset Corner Longitude Point 3", _S16, (-0.075, 0.075)),
+    (32, "Offset Corner Latitude Point 4", _S16, (-0.075, 0.075)),
+    (33, "Offset Corner Longitude Point 4", _S16, (-0.075, 0.075)),
+    (34, "Icing Detected", _U8, (0, 255)),
+    (35, "Wind Direction", _U16, (0, 360)),
+    (36, "Wind Speed", _U8, (0, 100)),
+    (37, "Static Pressure", _U16, (0, 5000)),
+    (38, "Density Altitude", _U16, (-900, 19e3)),
+    (39, "Outside Air Temperature", _U8, (0, 255)),
+    (40, "Target Location Latitude", _S32, (-90, 90)),
+    (41, "Target Location Longitude", _S32, (-180, 180)),
+    (42, "Target Location Elevation", _U16, (-900, 19000)),
+    (43, "Target Track Gate Width", _U8, (0, 512)),
+    (44, "Target Track Gate Height", _U8, (0, 512)),
+    (45, "Target Error Estimate - CE90", _U16, (0, 4095)),
+    (46, "Target Error Estimate - LE90", _U16, (0, 4095)),
+    (47, "Generic Flag Data 01", _U8, (0, 255)),
+    (49, "Differential Pressure", _U16, (0, 5000)),
+    (50, "Platform Angle of Attack", _S16, (-20, 20)),
+    (51, "Platform Vertical Speed", _S16, (-180, 180)),
+    (52, "Platform Sideslip Angle", _S16, (-20, 20)),
+    (53, "Airfield Barometric Pressure", _U16, (0, 5000)),
+    (54, "Airfield Elevation", _U16, (-900, 19000)),
+    (55, "Relative Humidity", _U8, (0, 100)),
+    (56, "Platform Ground Speed", _U8, (0, 255)),
+    (57, "Ground Range", _U32, (0, 5000000)),
+    (58, "Platform Fuel Remaining", _U16, (0, 10000)),
+    (60, "Weapon Load", _U16, (0, 65535)),
+    (61, "Weapon Fired", _U8, (0, 255)),
+    (62, "Laser PRF Code", _U16, (0, 65535)),
+    (63, "Sensor Field of View Name", _U8, (0, 255)),
+    (64, "Platform Magnetic Heading", _U16, (0, 360)),
+    (65, "UAS Datalink LS Version Number", _U8, (0, 255)),
+    (67, "Alternate Platform Latitude", _S32, (-90, 90)),
+    (68, "Alternate Platform Longitude", _S32, (-180, 180)),
+    (69, "Alternate Platform Altitude", _U16, (-900, 19000)),
+    (71, "Alternate Platform Heading", _U16, (0, 360)),
+    (75, "Sensor Ellipsoid Height", _U16, (-900, 19000)),
+    (76, "Alternate Platform Ellipsoid Height", _U16, (-900, 19000)),
+    (78, "Frame Center Height Above Ellipsoid", _U16, (-900, 19000)),
+    (79, "Sensor North Velocity", _S16, (-327, 327)),
+    (80, "Sensor East Velocity", _S16, (-327, 327)),
+    (82, "Corner Latitude Point 1 (Full)", _S32, (-90, 90)),
+    (83, "Corner Longitude Point 1 (Full)", _S32, (-180, 180)),
+    (84, "Corner Latitude Point 2 (Full)", _S32, (-90, 90)),
+    (85, "Corner Longitude Point 2 (Full)", _S32, (-180, 180)),
+    (86, "Corner Latitude Point 3 (Full)", _S32, (-90, 90)),
+    (87, "Corner Longitude Point 3 (Full)", _S32, (-180, 180)),
+    (88, "Corner Latitude Point 4 (Full)", _S32, (-90, 90)),
+    (89, "Corner Longitude Point 4 (Full)", _S32, (-180, 180)),
+    (90, "Platform Pitch Angle (Full)", _S32, (-90, 90)),
+    (91, "Platform Roll Angle (Full)", _S32, (-90, 90)),
+    (92, "Platform Angle of Attack (Full)", _S32, (-90, 90)),
+    (93, "Platform Sideslip Angle (Full)", _S32, (-90, 90)),
+    (96, "Target Width Extended", _U8, (0, 255)),
+    (103, "Density Altitude Extended", _U16, (-900, 40000)),
+    (104, "Sensor Ellipsoid Height Extended", _U16, (-900, 40000)),
+    (105, "Alternate Platform Ellipsoid Height Extended", _U16, (-900, 40000)),
+]
+
+STRINGS = [
+    (3, "Mission ID"),
+    (4, "Platform Tail Number"),
+    (10, "Platform Designation"),
+    (11, "Image Source Sensor"),
+    (12, "Image Coordinate System"),
+    (59, "Platform Call Sign"),
+    (70, "Alternate Platform Name"),
+    (77, "Operational Mode"),
+]
+
+TIMESTAMPS = [
+    (2, "Precision Time Stamp"),
+    (72, "Event Start Time - UTC"),
+]
+
+RAW = [
+    (1, "Checksum"),
+]
+
+NESTED = [
+    (48, "Security Local Set"),
+    (73, "RVT Local Set"),
+    (74, "VMTI Local Set"),
+]
+
+_STRUCT_CODES = {(1, False): "B", (1, True): "b", (2, False): "H",
+                 (2, True): "h", (4, False): "I", (4, True): "i"}
+
+
+class MappedTag:
+    """Precomputed fixed-point mapping for one tag: value = scale * (raw - dmin) + rmin."""
+
+    __slots__ = ("tag", "name", "length", "signed", "dmin", "dmax", "rmin", "rmax",
+                 "scale", "unpack", "dtype")
+
+    def __init__(self, tag, name, encoding, value_range):
+        length, signed, (dmin, dmax) = encoding
+        self.tag = tag
+        self.name = name
+        self.length = length
+        self.signed = signed
+        self.dmin, self.dmax = dmin, dmax
+        self.rmin, self.rmax = value_range
+        # same operation order as klvdata.common.linear_map so floats match exactly
+        self.scale = (self.rmax - self.rmin) / (dmax - dmin)
+        self.unpack = struct.Struct(">" + _STRUCT_CODES[(length, signed)]).unpack_from
+        self.dtype = ">" + ("i" if signed else "u") + str(length)
+
+    def __call__(self, value):
+        if len(value) == self.length:
+            raw = self.unpack(value)[0]
+        else:
+            raw = int.from_bytes(value, "big", signed=self.signed)
+        if not (self.dmin <= raw <= self.dmax):
+            return bytes(value)
+        return self.scale * (raw - self.dmin) + self.rmin
+
+
+def _decode_string(value):
+    try:
+        return bytes(value).decode("utf-8")
+    except UnicodeDecodeError:
+        return bytes(value)
+
+
+def _decode_timestamp(value):
+    microseconds = int.from_bytes(value, "big")
+    try:
+        return datetime.datetime.fromtimestamp(microseconds / 1e6, tz=datetime.timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        return bytes(value)  # outside datetime's range
+
+
+def _decode_uint(value):
+    return int.from_bytes(value, "big")
+
+
+# ---------------------------
+# Checksums
+# ---------------------------
+CHECKSUM_TAG = 1
+
+_CRC16_TABLE = []
+for _byte in range(256):
+    _crc = _byte << 8
+    for _ in range(8):
+        _crc = ((_crc << 1) ^ 0x1021) if _crc & 0x8000 else _crc << 1
+    _CRC16_TABLE.append(_crc & 0xFFFF)
+_CRC16_TABLE = tuple(_CRC16_TABLE)
+
+
+def st0601_checksum(data) -> int:
+    """ST 0601 tag 1: 16-bit sum of `data`, even-indexed bytes in the high byte."""
+    data = bytes(data)
+    return ((sum(data[0::2]) << 8) + sum(data[1::2])) & 0xFFFF
+
+
+def crc16_ccitt(data, crc=0xFFFF) -> int:
+    """CRC-16-CCITT (poly 0x1021, init 0xFFFF), the ST 0903 VMTI checksum. One table lookup per byte."""
+    table = _CRC16_TABLE
+    for byte in bytes(data):
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def _checksum_entry(entries, end):
+    """
+    (value offset, length) of the checksum, or None. The checksum must be
+    the last item and end exactly at `end`: an index that stopped short
+    means a corrupt length somewhere in the set.
+    """
+    if len(entries) >= 3 and entries[-3] == CHECKSUM_TAG and entries[-2] + entries[-1] == end:
+        return entries[-2], entries[-1]
+    return None
+
+
+def verify_checksum(local_set: "misc.LocalSet") -> bool:
+    """
+    Check an indexed ST 0601 packet against its tag 1 checksum, which covers
+    the key through the checksum's own length byte. ST 0601 requires the
+    checksum, so a packet without a trailing one (or whose items don't
+    fill its declared length) fails too.
+    """
+    entry = _checksum_entry(local_set.entries, local_set.end)
+    if entry is None:
+        return False
+    off, length = entry
+    if length != 2:
+        return False
+    buf = local_set.buf
+    return st0601_checksum(buf[local_set.key_offset:off]) == int.from_bytes(buf[off:off + 2], "big")
+
+
+# ---------------------------
+# Nested Local Sets (lazy)
+# ---------------------------
+class NestedSet(Mapping):
+    """
+    A Local Set carried as the value of an ST 0601 tag. Holds the raw bytes
+    and only walks and decodes its items the first time it is read, then
+    keeps the result. Equality and hashing use the raw bytes, so comparing
+    two sets (delta encoding, interpolation) never decodes them. A set whose
+    own checksum is present but fails reads as empty and has `valid` False.
+    """
+
+    __slots__ = ("raw", "_values")
+
+    NAME = "Local Set"
+    DECODERS = {}      # tag -> callable(bytes) -> value
+    CHECKSUM = None    # callable(bytes covered) -> int, for sets that may carry a tag 1 checksum
+
+    def __init__(self, raw):
+        self.raw = bytes(raw)
+        self._values = None
+
+    def _entries(self):
+        return misc.index_local_set(self.raw, 0, len(self.raw))
+
+    @property
+    def valid(self):
+        """
+        True / False against the set's own tag 1 checksum. None when there is
+        nothing to check: the type defines no checksum, or the set carries
+        none (it's optional in ST 0903) and its items fill it exactly.
+        """
+        if self.CHECKSUM is None:
+            return None
+        entries = self._entries()
+        entry = _checksum_entry(entries, len(self.raw))
+        if entry is None:
+            if CHECKSUM_TAG in entries[0::3]:
+                return False  # present, but not the last item or cut short
+            if (entries[-2] + entries[-1] if entries else 0) != len(self.raw):
+                return False  # a corrupt length stopped the walk early
+            return None
+        off, length = entry
+        return self.CHECKSUM(self.raw[:off]) == int.from_bytes(self.raw[off:off + length], "big")
+
+    def _decode(self):
+        values = self._values
+        if values is None:
+            values = {}
+            if self.valid is not False:
+                raw = self.raw
+                decoders_get = self.DECODERS.get
+                entries = self._entries()
+                for i in range(0, len(entries), 3):
+                    tag, off, length = entries[i], entries[i + 1], entries[i + 2]
+                    value = raw[off:off + length]
+                    decoder = decoders_get(tag)
+                    if decoder is not None:
+                        try:
+                            value = decoder(value)
+                        except (ValueError, OverflowError, OSError):
+                            pass  # keep the raw bytes; this runs lazily, e.g. inside json_safe_dumps
+                    values[tag] = value
+            self._values = values
+        return values
+
+    @property
+    def decoded(self):
+        """Whether the items have been decoded yet."""
+        return self._values is not None
+
+    def __getitem__(self, tag):
+        return self._decode()[tag]
+
+    def __iter__(self):
+        return iter(self._decode())
+
+    def __len__(self):
+        return len(self._decode())
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.raw == other.raw
+
+    def __hash__(self):
+        return hash(self.raw)
+
+    def __repr__(self):
+        state = dict(self._values) if self._values is not None else f"<{len(self.raw)} bytes, not decoded>"
+        return f"{type(self).__name__}({state})"
+
+
+class SecuritySet(NestedSet):
+    """ST 0102 Security Metadata Local Set (tag 48)."""
+
+    __slots__ = ()
+    NAME = "Security Local Set"
+    # enumerations and the version are integers, everything else is text
+    DECODERS = dict.fromkeys(range(1, 23), _decode_string)
+    DECODERS.update(dict.fromkeys((1, 2, 12, 22), _decode_uint))
+
+
+class VTargetPack(NestedSet):
+    """One ST 0903 VTarget Pack: a target's items, without the leading target id."""
+
+    __slots__ = ()
+    NAME = "VTarget Pack"
+    # centroid / box pixel numbers, priority, confidence, history, % pixels,
+    # RGB colour, intensity, centroid row / column, FPA index, algorithm id
+    DECODERS = dict.fromkeys((1, 2, 3, 4, 5, 6, 7, 8, 9, 19, 20, 22), _decode_uint)
+
+
+class VTargetSeries(NestedSet):
+    """ST 0903 VTarget Series (VMTI tag 101): {target id: VTargetPack}, split on first read."""
+
+    __slots__ = ()
+    NAME = "VTarget Series"
+
+    def _decode(self):
+        values = self._values
+        if values is None:
+            values = {}
+            buf = self.raw
+            pos, end = 0, len(buf)
+            try:
+                while pos < end:
+                    length, pos = misc.read_ber_length(buf, pos)
+                    stop = pos + length
+                    if stop > end:
+                        break
+                    target_id, start = misc.read_ber_oid(buf, pos)
+                    values[target_id] = VTargetPack(buf[start:stop])
+                    pos = stop
+            except IndexError:
+                pass
+            self._values = values
+        return values
+
+
+class VMTISet(NestedSet):
+    """ST 0903 VMTI Local Set (tag 74), CRC-16-CCITT checked when it has one. Targets stay undecoded until read."""
+
+    __slots__ = ()
+    NAME = "VMTI Local Set"
+    CHECKSUM = staticmethod(crc16_ccitt)
+    DECODERS = {
+        2: _decode_timestamp,
+        3: _decode_string,    # system name
+        4: _decode_uint,      # LS version
+        5: _decode_uint,      # targets detected
+        6: _decode_uint,      # targets reported
+        7: _decode_uint,      # frame number
+        8: _decode_uint,      # frame width
+        9: _decode_uint,      # frame height
+        10: _decode_string,   # source sensor
+        101: VTargetSeries,
+    }
+
+
+class RVTSet(NestedSet):
+    """ST 0806 Remote Video Terminal Local Set (tag 73). Only the common items are decoded."""
+
+    __slots__ = ()
+    NAME = "RVT Local Set"
+    DECODERS = {
+        2: _decode_timestamp,
+        3: _decode_uint,      # platform true airspeed, m/s
+        4: _decode_uint,      # platform indicated airspeed, m/s
+        8: _decode_uint,      # UAS LDS version
+        10: _decode_string,   # digital video file format
+    }
+
+
+NESTED_SETS = {48: SecuritySet, 73: RVTSet, 74: VMTISet}
+
+
+# ---------------------------
+# Registration
+# ---------------------------
+TAG_NAMES = {}
+DECODERS = {}  # tag -> callable(memoryview|bytes) -> value
+MAPPED_TAGS = {}  # tag -> MappedTag
+
+for _tag, _name, _encoding, _range in MAPPED:
+    MAPPED_TAGS[_tag] = DECODERS[_tag] = MappedTag(_tag, _name, _encoding, _range)
+    TAG_NAMES[_tag] = _name
+for _tag, _name in STRINGS:
+    DECODERS[_tag] = _decode_string
+    TAG_NAMES[_tag] = _name
+for _tag, _name in TIMESTAMPS:
+    DECODERS[_tag] = _decode_timestamp
+    TAG_NAMES[_tag] = _name
+for _tag, _name in RAW:
+    TAG_NAMES[_tag] = _name
+for _tag, _name in NESTED:
+    DECODERS[_tag] = NESTED_SETS[_tag]
+    TAG_NAMES[_tag] = _name
+
+
+# ---------------------------
+# Per-packet decoding
+# ---------------------------
+def decode_value(tag: int, value):
+    """Decode one tag's value. Unknown tags come back as raw bytes."""
+    decoder = DECODERS.get(tag)
+    if decoder is None:
+        return bytes(value)
+    return decoder(value)
+
+
+def decode_local_set(local_set: "misc.LocalSet", tags=None) -> dict:
+    """Decode the items of an indexed Local Set into {tag: value}; only those in `tags` when given."""
+    buf = local_set.buf
+    decoders_get = DECODERS.get
+    out = {}
+    for tag, off, length in local_set.triples():
+        if tags is not None and tag not in tags:
+            continue
+        value = buf[off:off + length]
+        decoder = decoders_get(tag)
+        out[tag] = bytes(value) if decoder is None else decoder(value)
+    return out
+
+
+def _index_tags(tags):
+    """What to index for a `tags` subscription: those tags plus the checksum verify_checksum needs."""
+    return None if tags is None else frozenset(tags) | {CHECKSUM_TAG}
+
+
+def decode_klv(raw, verify=False, tags=None) -> list[dict]:
+    """
+    Index and decode every ST 0601 Local Set in a KLV buffer. With `verify`,
+    packets whose tag 1 checksum doesn't match are dropped before decoding.
+    `tags` limits indexing and decoding to those tags; the others are only
+    skipped over.
+    """
+    return [decode_local_set(s, tags) for s in misc.index_klv_local_sets(raw, _index_tags(tags))
+            if not verify or verify_checksum(s)]
+
+
+class LocalSetDecoder:
+    """
+    Stateful decode_local_set() for one stream. Most tags repeat byte for
+    byte from packet to packet, so each tag's last raw bytes and decoded
+    value are kept and reused when the bytes match. Unchanged tags therefore
+    come back as the very same object, which makes change detection cheap.
+    """
+
+    __slots__ = ("_cache", "_subscription", "rejected")
+
+    def __init__(self):
+        self._cache = {}  # tag -> (raw bytes, decoded value)
+        self._subscription = (None, None)  # (tags, _index_tags(tags)) of the last call
+        self.rejected = 0  # packets dropped by decode_klv(verify=True)
+
+    def decode(self, local_set: "misc.LocalSet", tags=None) -> dict:
+        buf = local_set.buf
+        cache = self._cache
+        decoders_get = DECODERS.get
+        out = {}
+        for tag, off, length in local_set.triples():
+            if tags is not None and tag not in tags:
+                continue
+            value = buf[off:off + length]
+            hit = cache.get(tag)
+            if hit is not None and value == hit[0]:
+                out[tag] = hit[1]
+                continue
+            raw = bytes(value)
+            decoder = decoders_get(tag)
+            value = raw if decoder is None else decoder(raw)
+            cache[tag] = (raw, value)
+            out[tag] = value
+        return out
+
+    def decode_klv(self, raw, verify=False, tags=None) -> list[dict]:
+        subscribed, indexed = self._subscription
+        if tags is not subscribed:
+            indexed = _index_tags(tags)
+            self._subscription = (tags, indexed)
+        out = []
+        for local_set in misc.index_klv_local_sets(raw, indexed):
+            if verify and not verify_checksum(local_set):
+                self.rejected += 1
+                continue
+            out.append(self.decode(local_set, tags))
+        return out
+
+
+# ---------------------------
+# Interpolation between two decoded Local Sets
+# ---------------------------
+# angles whose range covers a full turn interpolate the short way round
+# (51, Platform Vertical Speed, is +/-180 m/s and not an angle)
+ANGULAR_TAGS = frozenset(t for t, m in MAPPED_TAGS.items() if m.rmax - m.rmin == 360) - {51}
+
+
+def _lerp_angle(mapping, a, b, fraction):
+    delta = (b - a + 180.0) % 360.0 - 180.0
+    value = a + delta * fraction
+    return (value - mapping.rmin) % 360.0 + mapping.rmin
+
+
+def interpolate(before: dict, after: dict, fraction: float) -> dict:
+    """
+    Local Set at `fraction` (0..1) of the way from `before` to `after`.
+    Mapped values and timestamps present in both are interpolated linearly;
+    everything else is held from `before`.
+    """
+    if fraction <= 0.0:
+        return before
+    out = dict(before)
+    for tag, a in before.items():
+        b = after.get(tag)
+        if b is None or type(a) is not type(b) or a == b:
+            continue
+        if type(a) is float:
+            if tag in ANGULAR_TAGS:
+                out[tag] = _lerp_angle(MAPPED_TAGS[tag], a, b, fraction)
+            else:
+                out[tag] = a + (b - a) * fraction
+        elif type(a) is datetime.datetime:
+            out[tag] = a + (b - a) * fraction
+    return out
+
+
+# ---------------------------
+# Column (batch) decoding
+# ---------------------------
+def decode_column(tag: int, raw):
+    """
+    Vectorized decode of many values of one mapped tag.
+
+    `raw` is a uint8 array of shape (n, length) holding the big-endian encoded
+    values (see gather_column). Returns float64 values with NaN where the
+    encoded value is outside the tag's domain.
+    """
+    if _np is None:
+        raise RuntimeError("numpy is required for decode_column()")
+    mapping = MAPPED_TAGS[tag]
+    raw = _np.ascontiguousarray(raw, dtype=_np.uint8).reshape(-1, mapping.length)
+    ints = raw.view(mapping.dtype).reshape(-1).astype(_np.int64)
+    values = mapping.scale * (ints - mapping.dmin) + mapping.rmin
+    values[(ints < mapping.dmin) | (ints > mapping.dmax)] = _np.nan
+    return values
+
+
+def gather_column(batch: "misc.KLVBatch", tag: int, length: int = None):
+    """
+    Pull every value of `tag` out of a KLVBatch into one (n, length) uint8
+    matrix with a single fancy index over the whole batch. Returns
+    (packet_numbers, matrix). `length` defaults to the mapped tag's;
+    values with any other length are skipped.
+    """
+    if _np is None:
+        raise RuntimeError("numpy is required for gather_column()")
+    if length is None:
+        length = MAPPED_TAGS[tag].length
+    rows = batch.as_numpy()
+    rows = rows[(rows[:, 2] == tag) & (rows[:, 4] == length)]
+    if not len(rows):
+        return rows[:, 1], _np.empty((0, length), dtype=_np.uint8)
+    flat, bases = batch.flat()
+    starts = bases[rows[:, 0]] + rows[:, 3]
+    return rows[:, 1], flat[starts[:, None] + _np.arange(length)]
+
+
+def decode_batch_column(batch: "misc.KLVBatch", tag: int):
+    """Convenience: (packet_numbers, float64 values) for one mapped tag across a batch."""
+    packets, matrix = gather_column(batch, tag)
+    return packets, decode_column(tag, matrix)
@@ -3,6 +3,8 @@ import datetime
 import decimal
 import json
 import uuid
+from array import array
+from collections.abc import Mapping
 from enum import Enum
 from typing import Any
 
@@ -18,6 +20,127 @@ _PRIMITIVE_TYPES = (str, int, float, bool, type(None))
 def _is_primitive(obj):
     return isinstance(obj, _PRIMITIVE_TYPES)
 
+
+# ---------------------------
+# Per-type conversion handlers
+# ---------------------------
+# Each handler converts one non-JSON value shallowly. The handler for a
+# concrete type is resolved once (in the order below) and cached, so hot
+# paths pay a dict lookup instead of a chain of isinstance checks.
+
+def _datetime_to_json(obj):
+    if obj.tzinfo is None:
+        return obj.isoformat() + "Z"
+    else:
+        # canonicalize to UTC Z
+        return obj.astimezone(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+def _isoformat_to_json(obj):
+    return obj.isoformat()
+
+def _timedelta_to_json(obj):
+    return obj.total_seconds()
+
+def _bytes_to_json(obj):
+    return base64.b64encode(bytes(obj)).decode("ascii")
+
+def _decimal_to_json(obj):
+    # try exact int first, otherwise float
+    try:
+        iv = obj.to_integral_value()
+        if obj == iv:
+            return int(iv)
+    except Exception:
+        pass
+    try:
+        return float(obj)
+    except Exception:
+        return str(obj)
+
+def _enum_to_json(obj):
+    return obj.value
+
+def _ndarray_to_json(obj):
+    # fast C-level conversion
+    try:
+        return obj.tolist()
+    except Exception:
+        # fallback to manual iterate
+        return obj.astype(object).tolist()
+
+def _numpy_scalar_to_json(obj):
+    try:
+        return obj.item()
+    except Exception:
+        try:
+            return float(obj)
+        except Exception:
+            return str(obj)
+
+def _complex_to_json(obj):
+    return [obj.real, obj.imag]
+
+def _sequence_to_json(obj):
+    return list(obj)
+
+def _mapping_to_json(obj):
+    # non-dict mappings, e.g. misb0601's lazily decoded nested sets
+    return {_json_key(k): v for k, v in obj.items()}
+
+def _object_to_json(obj):
+    # objects with __dict__ (shallow)
+    try:
+        return vars(obj)
+    except Exception:
+        return _str_to_json(obj)
+
+def _str_to_json(obj):
+    # fallback to str
+    try:
+        return str(obj)
+    except Exception:
+        return None
+
+# handlers whose result may itself need converting
+_NESTED_HANDLERS = frozenset((_enum_to_json, _object_to_json, _mapping_to_json))
+
+_JSON_HANDLERS = {}
+
+
+def _resolve_json_handler(obj):
+    cls = type(obj)
+    if issubclass(cls, datetime.datetime):
+        handler = _datetime_to_json
+    elif issubclass(cls, (datetime.date, datetime.time)):
+        handler = _isoformat_to_json
+    elif issubclass(cls, datetime.timedelta):
+        handler = _timedelta_to_json
+    elif issubclass(cls, (bytes, bytearray, memoryview)):
+        handler = _bytes_to_json
+    elif issubclass(cls, uuid.UUID):
+        handler = _str_to_json
+    elif issubclass(cls, decimal.Decimal):
+        handler = _decimal_to_json
+    elif issubclass(cls, Enum):
+        handler = _enum_to_json
+    elif _np is not None and issubclass(cls, _np.ndarray):
+        handler = _ndarray_to_json
+    elif _np is not None and issubclass(cls, _np.generic):
+        handler = _numpy_scalar_to_json
+    elif issubclass(cls, complex):
+        handler = _complex_to_json
+    elif issubclass(cls, (list, tuple, set)):
+        handler = _sequence_to_json
+    elif isinstance(obj, Mapping):
+        handler = _mapping_to_json
+    elif hasattr(obj, "__dict__"):
+        handler = _object_to_json
+    else:
+        handler = _str_to_json
+    _JSON_HANDLERS[cls] = handler
+    return handler
+
+
 def json_safe_serialize(obj: Any):
     """
     Recursively convert `obj` into JSON-serializable types.
@@ -29,6 +152,7 @@ def json_safe_serialize(obj: Any):
     - Enum -> its value
     - numpy arrays/scalars -> tolist()/item()
     - complex -> [real, imag]
+    - other Mappings -> dict
     - objects with __dict__ -> their __dict__ (shallow)
     Returns sanitized object (not a JSON string).
     """
@@ -37,68 +161,6 @@ def json_safe_serialize(obj: Any):
     if _is_primitive(obj):
         return obj
 
-    # datetimes
-    if isinstance(obj, datetime.datetime):
-        if obj.tzinfo is None:
-            return obj.isoformat() + "Z"
-        else:
-            # canonicalize to UTC Z
-            return obj.astimezone(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
-    if isinstance(obj, datetime.date):
-        return obj.isoformat()
-    if isinstance(obj, datetime.time):
-        return obj.isoformat()
-    if isinstance(obj, datetime.timedelta):
-        return obj.total_seconds()
-
-    # bytes
-    if isinstance(obj, (bytes, bytearray)):
-        return base64.b64encode(bytes(obj)).decode("ascii")
-
-    # uuid
-    if isinstance(obj, uuid.UUID):
-        return str(obj)
-
-    # decimal
-    if isinstance(obj, decimal.Decimal):
-        # try exact int first, otherwise float
-        try:
-            iv = obj.to_integral_value()
-            if obj == iv:
-                return int(iv)
-        except Exception:
-            pass
-        try:
-            return float(obj)
-        except Exception:
-            return str(obj)
-
-    # enum
-    if isinstance(obj, Enum):
-        return json_safe_serialize(obj.value)
-
-    # numpy
-    if _np is not None:
-        if isinstance(obj, _np.ndarray):
-            # fast C-level conversion
-            try:
-                return obj.tolist()
-            except Exception:
-                # fallback to manual iterate
-                obj = obj.astype(object).tolist()
-        if isinstance(obj, _np.generic):
-            try:
-                return obj.item()
-            except Exception:
-                try:
-                    return float(obj)
-                except Exception:
-                    return str(obj)
-
-    # complex -> [real, imag]
-    if isinstance(obj, complex):
-        return [obj.real, obj.imag]
-
     # mapping-like
     if isinstance(obj, dict):
         out = {}
@@ -115,66 +177,296 @@ def json_safe_serialize(obj: Any):
     if isinstance(obj, (list, tuple, set)):
         return [json_safe_serialize(v) for v in obj]
 
-    # objects with __dict__ (shallow)
-    if hasattr(obj, "__dict__"):
-        try:
-            return json_safe_serialize(vars(obj))
-        except Exception:
-            pass
+    handler = _JSON_HANDLERS.get(type(obj)) or _resolve_json_handler(obj)
+    converted = handler(obj)
+    if handler in _NESTED_HANDLERS:
+        return json_safe_serialize(converted)
+    return converted
 
-    # fallback to str
+
+def _json_key(key):
+    # the C encoder writes True/False/None keys as true/false/null; json_safe_serialize uses str()
+    return str(key) if key is None or key is True or key is False else key
+
+
+def _json_default(obj):
+    handler = _JSON_HANDLERS.get(type(obj)) or _resolve_json_handler(obj)
+    return handler(obj)
+
+
+# The C encoder walks the structure once and only calls back into Python
+# (via the cached handler) for values it can't encode natively.
+_json_encoder = json.JSONEncoder(default=_json_default, check_circular=False)
+_json_encode = _json_encoder.encode
+
+
+# what the C encoder writes for True/False/None dict keys; a str key of the
+# same spelling also matches, which only costs it the slow path
+_LITERAL_KEYS = ('"true": ', '"false": ', '"null": ')
+
+
+def json_safe_dumps(obj: Any) -> str:
+    """
+    Single-pass equivalent of json.dumps(json_safe_serialize(obj)).
+    Dict keys other than str/int/float make the encoder raise, and bool/None
+    keys show up in its output as true/false/null; both fall back to the
+    two-pass path so they keep the str(key) behaviour.
+    """
     try:
-        return str(obj)
-    except Exception:
-        return None
-    
+        text = _json_encode(obj)
+    except TypeError:
+        return json.dumps(json_safe_serialize(obj))
+    if _LITERAL_KEYS[0] in text or _LITERAL_KEYS[1] in text or _LITERAL_KEYS[2] in text:
+        return json.dumps(json_safe_serialize(obj))
+    return text
 
-def parse_klv_local_sets(raw: bytes) -> list[dict[bytes, bytes]]:
+
+def json_safe_dumpb(obj: Any) -> bytes:
+    """json_safe_dumps() as bytes (the encoder output is ASCII)."""
+    return json_safe_dumps(obj).encode("ascii")
+
+
+# ---------------------------
+# KLV Local Set indexing (offset based, no per-tag copies)
+# ---------------------------
+UL_KEY_LENGTH = 16
+
+
+def read_ber_length(buf, pos: int) -> tuple[int, int]:
     """
-    Parse one or more KLV Local Sets (e.g., MISB ST 0601) from a byte stream.
-    Returns a list of dicts [{tag_bytes: value_bytes}, ...].
+    Decode a BER length (short or long form) at `pos`.
+    Returns (length, position after the length field). Raises IndexError on truncation.
     """
-    packets = []
-    cursor = 0
-    total_len = len(raw)
+    first = buf[pos]
+    pos += 1
+    if first < 0x80:
+        return first, pos
+    n = first & 0x7F
+    end = pos + n
+    if end > len(buf):
+        raise IndexError("truncated BER length")
+    length = 0
+    while pos < end:
+        length = (length << 8) | buf[pos]
+        pos += 1
+    return length, pos
 
-    while cursor + 18 <= total_len:
-        key = raw[cursor:cursor + 16]
-        cursor += 16
 
-        if cursor >= total_len:
-            break
-        length_byte = raw[cursor]
-        cursor += 1
+def read_ber_oid(buf, pos: int) -> tuple[int, int]:
+    """
+    Decode a BER-OID encoded tag (7 bits per byte, high bit = continuation).
+    Returns (tag, position after the tag). Raises IndexError on truncation.
+    """
+    byte = buf[pos]
+    pos += 1
+    if byte < 0x80:
+        return byte, pos
+    tag = byte & 0x7F
+    while byte & 0x80:
+        byte = buf[pos]
+        pos += 1
+        tag = (tag << 7) | (byte & 0x7F)
+    return tag, pos
 
-        if length_byte & 0x80:
-            n = length_byte & 0x7F
-            if cursor + n > total_len:
+
+def index_local_set(buf, start: int, end: int, out: array = None, tags=None) -> array:
+    """
+    Walk the tag/length/value items between `start` and `end` of `buf` and
+    append flat (tag, value_offset, value_length) triples to `out`; only
+    for tags in `tags` when given. Stops at the first truncated item. Also
+    used for nested sets.
+    """
+    if out is None:
+        out = array("q")
+    append = out.append
+    pos = start
+    try:
+        while pos < end:
+            # single-byte tags and short-form lengths are the common case
+            tag = buf[pos]
+            if tag < 0x80:
+                pos += 1
+            else:
+                tag, pos = read_ber_oid(buf, pos)
+            length = buf[pos]
+            if length < 0x80:
+                pos += 1
+            else:
+                length, pos = read_ber_length(buf, pos)
+            stop = pos + length
+            if stop > end:
                 break
-            total_length = int.from_bytes(raw[cursor:cursor + n], "big")
-            cursor += n
-        else:
-            total_length = length_byte
+            if tags is None or tag in tags:
+                append(tag)
+                append(pos)
+                append(length)
+            pos = stop
+    except IndexError:
+        pass
+    return out
+
+
+class LocalSet:
+    """
+    One KLV Local Set located inside a shared buffer. `entries` is a flat
+    array of (tag, offset, length) triples into `buf`; values are only
+    sliced out (as memoryviews) when they are asked for.
+    """
+
+    __slots__ = ("buf", "key_offset", "start", "end", "entries")
+
+    def __init__(self, buf, key_offset: int, start: int, end: int, entries: array):
+        self.buf = buf
+        self.key_offset = key_offset
+        self.start = start
+        self.end = end
+        self.entries = entries
+
+    @property
+    def key(self) -> memoryview:
+        return self.buf[self.key_offset:self.key_offset + UL_KEY_LENGTH]
+
+    def __len__(self) -> int:
+        return len(self.entries) // 3
+
+    def tags(self):
+        return self.entries[0::3]
+
+    def triples(self):
+        """Iterate (tag, offset, length) without touching the values."""
+        e = self.entries
+        return zip(e[0::3], e[1::3], e[2::3])
 
+    def items(self):
+        """Iterate (tag, memoryview of value)."""
+        buf = self.buf
+        for tag, off, length in self.triples():
+            yield tag, buf[off:off + length]
+
+    def get(self, tag: int):
+        e = self.entries
+        for i in range(0, len(e), 3):
+            if e[i] == tag:
+                return self.buf[e[i + 1]:e[i + 1] + e[i + 2]]
+        return None
+
+
+def index_klv_local_sets(raw, tags=None) -> list[LocalSet]:
+    """
+    Index one or more KLV Local Sets (e.g. MISB ST 0601) in `raw` without
+    copying. `raw` may be bytes, a bytearray, a memoryview or a mapped
+    Gst buffer's data; the returned LocalSets reference it, so it must stay
+    mapped for as long as values are read from them. With `tags`, only
+    those tags are indexed (see index_local_set).
+    """
+    buf = raw if isinstance(raw, memoryview) else memoryview(raw)
+    if buf.format != "B" or buf.ndim != 1:
+        buf = buf.cast("B")
+    sets = []
+    cursor = 0
+    total_len = len(buf)
+
+    while cursor + UL_KEY_LENGTH + 2 <= total_len:
+        key_offset = cursor
+        try:
+            total_length, cursor = read_ber_length(buf, cursor + UL_KEY_LENGTH)
+        except IndexError:
+            break
         end = cursor + total_length
         if end > total_len:
             break
-
-        value_bytes = raw[cursor:end]
+        sets.append(LocalSet(buf, key_offset, cursor, end, index_local_set(buf, cursor, end, tags=tags)))
         cursor = end
 
-        tags = {}
-        i = 0
-        while i + 2 <= len(value_bytes):
-            tag = bytes([value_bytes[i]])  # store key as raw byte
-            length = value_bytes[i + 1]
-            start = i + 2
-            stop = start + length
-            if stop > len(value_bytes):
-                break
-            tags[tag] = value_bytes[start:stop]
-            i = stop
+    return sets
+
+
+class KLVBatch:
+    """
+    Index over many KLV buffers at once. `rows` is a flat array of
+    (buffer_no, packet_no, tag, offset, length) records; `as_numpy()` views it
+    as an (n, 5) int64 matrix without copying.
+    """
 
-        packets.append(tags)
+    ROW = 5
 
+    __slots__ = ("buffers", "rows", "packets", "_flat")
+
+    def __init__(self):
+        self.buffers = []
+        self.rows = array("q")
+        self.packets = 0
+        self._flat = None
+
+    def __len__(self) -> int:
+        return len(self.rows) // self.ROW
+
+    def add(self, raw) -> int:
+        """Index `raw` and append its items. Returns the number of Local Sets found."""
+        buffer_no = len(self.buffers)
+        sets = index_klv_local_sets(raw)
+        if not sets:
+            return 0
+        self.buffers.append(sets[0].buf)
+        self._flat = None
+        rows = self.rows
+        for local_set in sets:
+            packet_no = self.packets
+            for tag, off, length in local_set.triples():
+                rows.extend((buffer_no, packet_no, tag, off, length))
+            self.packets += 1
+        return len(sets)
+
+    def as_numpy(self):
+        if _np is None:
+            raise RuntimeError("numpy is required for KLVBatch.as_numpy()")
+        return _np.frombuffer(self.rows, dtype=_np.int64).reshape(-1, self.ROW)
+
+    def flat(self):
+        """
+        (bytes, bases): every buffer concatenated into one uint8 array, and
+        each buffer's offset into it, so row (b, _, _, off, _) starts at
+        bases[b] + off. Built once and kept until the next add().
+        """
+        if _np is None:
+            raise RuntimeError("numpy is required for KLVBatch.flat()")
+        if self._flat is None:
+            sizes = _np.fromiter(map(len, self.buffers), dtype=_np.int64, count=len(self.buffers))
+            bases = _np.zeros(len(sizes), dtype=_np.int64)
+            _np.cumsum(sizes[:-1], out=bases[1:])
+            data = b"".join(self.buffers)
+            self._flat = (_np.frombuffer(data, dtype=_np.uint8), bases)
+        return self._flat
+
+
+def index_klv_batch(buffers) -> KLVBatch:
+    """Index every KLV buffer in `buffers` into a single KLVBatch."""
+    batch = KLVBatch()
+    for raw in buffers:
+        batch.add(raw)
+    return batch
+
+
+def encode_ber_oid(tag: int) -> bytes:
+    out = [tag & 0x7F]
+    tag >>= 7
+    while tag:
+        out.append(0x80 | (tag & 0x7F))
+        tag >>= 7
+    return bytes(reversed(out))
+
+
+def parse_klv_local_sets(raw: bytes) -> list[dict[bytes, bytes]]:
+    """
+    Parse one or more KLV Local Sets (e.g., MISB ST 0601) from a byte stream.
+    Returns a list of dicts [{tag_bytes: value_bytes}, ...] where tag_bytes is
+    the BER-OID encoded tag. Kept for callers that want owned copies; hot
+    paths should use index_klv_local_sets() instead.
+    """
+    packets = []
+    for local_set in index_klv_local_sets(raw):
+        packets.append({
+            encode_ber_oid(tag): bytes(value)
+            for tag, value in local_set.items()
+        })
     return packets
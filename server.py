@@ -1,15 +1,20 @@
 # save as webrtc_klv_fixed.py (replace your original)
 import argparse
 import asyncio
+from bisect import bisect_right
+from collections import deque
 from fractions import Fraction
+import datetime
 import json
 import logging
 import time
 import threading
+import uuid
 import random
+import re
 import os
-from aiohttp import web
-from aiortc import MediaStreamError, RTCPeerConnection, RTCSessionDescription, MediaStreamTrack
+from aiohttp import web, WSMsgType
+from aiortc import MediaStreamError, RTCPeerConnection, RTCSessionDescription, MediaStreamTrack, RTCRtpSender
 import numpy as np
 from PIL import Image
 from io import BytesIO
@@ -19,18 +24,25 @@ gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib
 
 import aiortc.codecs
+import aiortc.rtcrtpsender
 from aiortc.codecs.h264 import H264Decoder, H264Encoder, h264_depayload
 from aiortc.codecs.vpx import Vp8Encoder, Vp8Decoder, VpxPayloadDescriptor, PACKET_MAX
 from aiortc.codecs.base import Decoder, Encoder
 from aiortc.mediastreams import VIDEO_TIME_BASE, convert_timebase
 from aiortc.jitterbuffer import JitterFrame
 from aiortc.rtp import RtpPacket
+from aiortc.rtcpeerconnection import is_codec_compatible
 from aiortc.rtcrtpparameters import (
+    RTCRtcpFeedback,
     RTCRtpCodecParameters,
 )
 
-from klvdata.misb0601 import UASLocalMetadataSet
 import misc  # your helper with parse_klv_local_sets()
+import misb0601
+import klv_store
+import footprint
+import metrics
+import ts_index
 
 
 Gst.init(None)
@@ -47,16 +59,223 @@ VIDEO_TS = r"./raw/videos/truck.ts"
 # VIDEO_TS = "./raw/videos/cheyenne.ts"
 VIDEO_TS = "./raw/videos/klv_metadata_test_sync.ts"
 
-pcs = set()
+# Source registry: VIDEO_TS is registered as DEFAULT_SOURCE, more with
+# --source id=path. Pipelines start on their first subscriber, linger
+# SOURCE_IDLE_GRACE seconds after the last one leaves, and at most
+# MAX_PIPELINES run at once.
+DEFAULT_SOURCE = "default"
+
+# Seconds a session may wait for its /answer before it is torn down
+OFFER_TIMEOUT = 30.0
+SOURCE_IDLE_GRACE = 30.0
+MAX_PIPELINES = 8
+KLV_INDEX = 0
+
+# Per-peer video delivery: samples wait in a bounded asyncio queue between
+# the appsink's new-sample callback and recv(). When it is full, "oldest"
+# drops the stalest queued frame, "newest" drops the incoming one.
+VIDEO_QUEUE_SIZE = 4
+VIDEO_DROP_POLICY = "oldest"
+
+# Transcoded video rate control. vp8enc starts at VIDEO_BITRATE (bps); each
+# VP8 peer's bandwidth estimate (REMB capped, RTCP loss driven) is refreshed
+# every ABR_INTERVAL seconds and the shared encoder follows the slowest peer.
+# With ABR_SCALE the encoder also drops resolution along ABR_LADDER
+# ((minimum bitrate, max height or None for native), best first).
+# VIDEO_LAYERS = [(height or None, bitrate), ...] instead pre-encodes fixed
+# quality layers and moves each peer to the best layer its estimate allows.
+VIDEO_BITRATE = 2_000_000
+ABR_MIN_BITRATE = 150_000
+ABR_INTERVAL = 1.0
+ABR_SCALE = False
+ABR_LADDER = ((1_000_000, None), (500_000, 480), (0, 360))
+VIDEO_LAYERS = []
+
+# Fast start: each output tee keeps the frames since its last keyframe (at
+# most GOP_CACHE_FRAMES) and replays them to a joining peer, so the first
+# picture doesn't wait for the next keyframe. PREROLL lists source ids (or
+# "all") started and kept warm, transcoder included, before anyone asks.
+GOP_CACHE_FRAMES = 150
+# Shortest gap between force-key-units sent to one encoder; PLIs from many
+# peers (or a lossy one) inside it are served by the keyframe already coming.
+KEYFRAME_MIN_INTERVAL = 0.5
+PREROLL = []
+
+# Live MPEG-TS ingest: udp://host:port (udp://239.x.x.x:port joins the
+# multicast group) or srt://host:port. Every queue is leaky and bounded by
+# its LIVE_BUDGETS entry (ms of media, or buffers) plus LIVE_QUEUE_BYTES, so
+# a burst costs frames rather than latency or memory.
+LIVE_SCHEMES = ("udp://", "srt://")
+LIVE_BUDGETS = {
+    "ingest_ms": 200,      # socket -> tsdemux jitter absorption
+    "video_ms": 100,       # demuxed video (vqueue)
+    "transcode_ms": 100,   # decoder input (transcode_queue)
+    "encoder_ms": 150,     # vp8enc rate-control buffer
+    "klv_buffers": 16,     # klv_queue
+    "branch_buffers": 2,   # per-peer branch queue
+    "socket_kb": 2048,     # kernel receive buffer of the UDP socket
+}
+LIVE_QUEUE_BYTES = 4 * 1024 * 1024
+GOP_CACHE_BYTES = 8 * 1024 * 1024
+
+# Decoded KLV packets kept per source for matching against outgoing video frames
+KLV_HISTORY_SIZE = 256
+
+# Drop ST 0601 packets whose tag 1 checksum doesn't match (lossy links)
+# before decoding them. ST 0601 requires the checksum, so packets without
+# one are dropped too; --no-klv-checksum forwards everything.
+KLV_VERIFY_CHECKSUM = True
+
+# Per-peer KLV DataChannel: hold messages back above KLV_HIGH_WATER bytes of
+# SCTP backlog until it drains below KLV_LOW_WATER. KLV_MAX_RATE (Hz) is the
+# default per-client cap; 0 sends one message per video frame.
+KLV_HIGH_WATER = 256 * 1024
+KLV_LOW_WATER = 64 * 1024
+KLV_MAX_RATE = 0
+
+# "delta" sends a full snapshot on join and every KLV_SNAPSHOT_INTERVAL
+# seconds, and only the tags that changed in between; "full" always sends
+# the whole Local Set.
+KLV_MODE = "delta"
+KLV_SNAPSHOT_INTERVAL = 5.0
+
+# Metadata-only clients (GET /klv/ws, GET /klv/events) skip WebRTC. Each KLV
+# packet is serialized once per distinct tag subscription and the same bytes
+# are written to every client. A client whose socket holds more than
+# BROADCAST_HIGH_WATER unsent bytes misses messages until it drains.
+BROADCAST_HIGH_WATER = 256 * 1024
+BROADCAST_MAX_CLIENTS = 10000
+BROADCAST_KEEPALIVE = 15.0  # seconds between SSE comments on a quiet feed
+
+# Server-side sensor footprint (footprint.py) attached to live KLV as
+# local_set["footprint"]; FOOTPRINT_DEM is an optional footprint.DEM.
+FOOTPRINT = False
+FOOTPRINT_DEM = None
+
+# ---------------------------
+# Metrics (GET /metrics, Prometheus text format; see metrics.py)
+# ---------------------------
+# Latencies are per session, KLV processing per source. Session series are
+# dropped when the session closes so the label set stays bounded.
+DEMUX_TIMES_SIZE = 256  # PTS -> demux time entries kept per source
+
+M_DEMUX_TO_APPSINK = metrics.histogram(
+    "klv_video_demux_to_appsink_seconds",
+    "Time from the demuxer (or decoder for non-TS inputs) to a peer's appsink",
+    ["source", "session"])
+M_APPSINK_TO_RTP = metrics.histogram(
+    "klv_video_appsink_to_rtp_seconds",
+    "Time a frame waits between a peer's appsink and aiortc's RTP packetizer",
+    ["source", "session"])
+M_KLV_PARSE = metrics.histogram(
+    "klv_parse_seconds", "Time to decode one KLV buffer into Local Sets", ["source"])
+M_KLV_REJECTED = metrics.counter(
+    "klv_checksum_rejected_total", "KLV packets dropped for a bad ST 0601 checksum", ["source"])
+M_KLV_SERIALIZE = metrics.histogram(
+    "klv_serialize_seconds", "Time to build one DataChannel message", ["source"])
+M_DROPPED = metrics.counter(
+    "klv_video_dropped_frames_total",
+    "Frames dropped for a peer; stage is branch_queue (GStreamer leaky queue) or peer_queue (asyncio)",
+    ["source", "session", "stage"])
+M_MISSED = metrics.counter(
+    "klv_video_missed_frames_total",
+    "recv() calls that returned an empty packet (no sample in time or map failure)",
+    ["source", "session"])
+M_DC_BYTES = metrics.counter(
+    "klv_datachannel_bytes_total", "KLV DataChannel payload bytes sent", ["source", "session"])
+M_DC_MESSAGES = metrics.counter(
+    "klv_datachannel_messages_total",
+    "KLV DataChannel messages by outcome (sent, coalesced, dropped)",
+    ["source", "session", "outcome"])
+M_ENCODER_FRAMES = metrics.counter(
+    "klv_encoder_frames_total", "Frames out of each vp8enc", ["source", "encoder"])
+M_ENCODER_FPS = metrics.gauge(
+    "klv_encoder_fps", "vp8enc output rate over the last second", ["source", "encoder"])
+M_VIDEO_QUEUE = metrics.gauge(
+    "klv_video_queue_depth", "Frames waiting for a peer, by queue", ["source", "session", "queue"])
+M_GLASS_TO_GLASS = metrics.histogram(
+    "klv_glass_to_glass_seconds",
+    "Live sources: KLV Precision Time Stamp (tag 2, capture) to the frame leaving the source tee, once per frame",
+    ["source"], buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0))
+M_KLV_QUEUE = metrics.gauge(
+    "klv_klv_queue_depth", "KLV buffers waiting in the source's klv_queue", ["source"])
+M_DC_BUFFERED = metrics.gauge(
+    "klv_datachannel_buffered_bytes", "SCTP backlog of a peer's KLV DataChannel", ["source", "session"])
+
+M_BROADCAST_MESSAGES = metrics.counter(
+    "klv_broadcast_messages_total",
+    "KLV messages to WebSocket / SSE clients by outcome (sent, coalesced, dropped)",
+    ["source", "transport", "outcome"])
+M_BROADCAST_CLIENTS = metrics.gauge(
+    "klv_broadcast_clients", "Connected WebSocket / SSE metadata clients", ["source", "transport"])
+# series labelled by source only; dropped when a private (range) source stops
+SOURCE_METRICS = (M_KLV_PARSE, M_KLV_REJECTED, M_KLV_SERIALIZE, M_ENCODER_FRAMES, M_ENCODER_FPS,
+                  M_GLASS_TO_GLASS, M_KLV_QUEUE)
+SESSION_METRICS = (M_DEMUX_TO_APPSINK, M_APPSINK_TO_RTP, M_DROPPED, M_MISSED,
+                   M_DC_BYTES, M_DC_MESSAGES, M_VIDEO_QUEUE, M_DC_BUFFERED)
 
 # ---------------------------
 # RawEncoder for VP8 passthrough (from your code)
 # ---------------------------
 from av import Packet, VideoFrame
 
+class GstPacket:
+    """
+    Encoded frame still backed by a mapped Gst.Buffer. Stands in for
+    av.Packet on aiortc's pack() path so the frame bytes are only copied
+    once, straight into the RTP payloads. The encoder calls release()
+    after packetizing, which unmaps the buffer.
+    """
+
+    __slots__ = ("data", "pts", "time_base", "_buffer", "_map_info")
+
+    def __init__(self, data, pts, time_base, buffer=None, map_info=None):
+        self.data = data
+        self.pts = pts
+        self.time_base = time_base
+        self._buffer = buffer
+        self._map_info = map_info
+
+    def __len__(self):
+        return len(self.data)
+
+    def release(self):
+        if self._map_info is not None:
+            if isinstance(self.data, memoryview):
+                self.data.release()
+            self.data = b""
+            self._buffer.unmap(self._map_info)
+            self._buffer = self._map_info = None
+
+    def __del__(self):
+        # the sender skips pack() while disabled; don't leave the buffer mapped
+        self.release()
+
+
+def _packet_view(packet):
+    return packet.data if isinstance(packet, GstPacket) else memoryview(packet)
+
+
+def _release_packet(packet):
+    if isinstance(packet, GstPacket):
+        packet.release()
+
+
 class RawEncoder(Encoder):
     def __init__(self) -> None:
         self.picture_id = random.randint(0, (1 << 15) - 1)
+        self._target_bitrate = None
+
+    @property
+    def target_bitrate(self):
+        """Latest REMB estimate from the receiver (bps), None until one arrives."""
+        return self._target_bitrate
+
+    @target_bitrate.setter
+    def target_bitrate(self, bitrate):
+        # aiortc sets this on REMB; BitrateController reads it, as the frames
+        # were encoded upstream in GStreamer
+        self._target_bitrate = bitrate
 
     def encode(
         self, frame: VideoFrame, force_keyframe: bool = False
@@ -64,34 +283,105 @@ class RawEncoder(Encoder):
         raise NotImplementedError("RawEncoder does not support frame-level encoding.")
 
     def pack(self, packet: Packet) -> tuple[list[bytes], int]:
-        payloads = self._packetize(bytes(packet), self.picture_id)
+        try:
+            payloads = self._packetize(_packet_view(packet), self.picture_id)
+        finally:
+            _release_packet(packet)
         timestamp = convert_timebase(packet.pts, packet.time_base, VIDEO_TIME_BASE)
         self.picture_id = (self.picture_id + 1) % (1 << 15)
         return payloads, timestamp
 
     @classmethod
-    def _packetize(cls, buffer: bytes, picture_id: int) -> list[bytes]:
-        payloads = []
+    def _packetize(cls, buffer, picture_id: int) -> list[bytes]:
+        # Serialize the two descriptor variants once; each payload is then a
+        # single allocation holding the descriptor plus a slice of the view.
         descr = VpxPayloadDescriptor(
             partition_start=1, partition_id=0, picture_id=picture_id
         )
-        length = len(buffer)
+        first_descr = bytes(descr)
+        descr.partition_start = 0
+        next_descr = bytes(descr)
+
+        view = memoryview(buffer)
+        payloads = []
+        length = len(view)
         pos = 0
+        descr_bytes = first_descr
+        max_size = PACKET_MAX - len(descr_bytes)
         while pos < length:
-            descr_bytes = bytes(descr)
-            size = min(length - pos, PACKET_MAX - len(descr_bytes))
-            payloads.append(descr_bytes + buffer[pos : pos + size])
-            descr.partition_start = 0
+            size = min(length - pos, max_size)
+            payloads.append(descr_bytes + view[pos : pos + size])
+            descr_bytes = next_descr
             pos += size
         return payloads
 
+_NAL_START_CODE = re.compile(b"\x00\x00\x01")
+
+def split_nal_units(view):
+    """Split an Annex B byte stream into NAL unit memoryviews (no copies)."""
+    starts = [m.end() for m in _NAL_START_CODE.finditer(view)]
+    for i, start in enumerate(starts):
+        end = starts[i + 1] - 3 if i + 1 < len(starts) else len(view)
+        # drop the leading zero of a 4-byte start code / trailing zero bytes
+        while end > start and view[end - 1] == 0:
+            end -= 1
+        yield view[start:end]
+
+class RawH264Encoder(Encoder):
+    """Packetizes H.264 access units from h264parse (byte-stream, au) without re-encoding."""
+
+    def encode(
+        self, frame: VideoFrame, force_keyframe: bool = False
+    ) -> tuple[list[bytes], int]:
+        raise NotImplementedError("RawH264Encoder does not support frame-level encoding.")
+
+    def pack(self, packet: Packet) -> tuple[list[bytes], int]:
+        try:
+            payloads = H264Encoder._packetize(split_nal_units(_packet_view(packet)))
+            # a lone NAL unit comes back as the view itself; RTP history must own its bytes
+            payloads = [p if type(p) is bytes else bytes(p) for p in payloads]
+        finally:
+            _release_packet(packet)
+        timestamp = convert_timebase(packet.pts, packet.time_base, VIDEO_TIME_BASE)
+        return payloads, timestamp
+
 def get_encoder(codec: RTCRtpCodecParameters) -> Encoder:
     mimeType = codec.mimeType.lower()
     if mimeType == "video/vp8":
         return RawEncoder()
+    if mimeType == "video/h264":
+        return RawH264Encoder()
     raise ValueError(f"No encoder found for MIME type `{mimeType}`")
 
 aiortc.codecs.get_encoder = get_encoder
+# RTCRtpSender imported get_encoder by name, so it has to be patched there too
+aiortc.rtcrtpsender.get_encoder = get_encoder
+
+# RTCRtpSender keeps what we need private (name-mangled): the RTP timestamp
+# and packet count of the last packet out (KLV <-> frame matching), the
+# encoder (REMB bitrate) and the PLI force-keyframe flag. Written against
+# aiortc 1.15; every access goes through these helpers so a rename in
+# another version disables the feature with a warning instead of breaking
+# recv().
+AIORTC_TESTED_VERSION = "1.15"
+_missing_sender_fields = set()
+
+
+def _sender_field(sender, name, default=None):
+    """RTCRtpSender's private `__<name>`, or `default` (warned once) if this aiortc has no such field."""
+    try:
+        return getattr(sender, "_RTCRtpSender__" + name)
+    except AttributeError:
+        if name not in _missing_sender_fields:
+            _missing_sender_fields.add(name)
+            print(f"⚠️ aiortc {aiortc.__version__} has no RTCRtpSender.__{name} "
+                  f"(written against {AIORTC_TESTED_VERSION}); the feature using it is off")
+        return default
+
+
+def _set_sender_field(sender, name, value):
+    if hasattr(sender, "_RTCRtpSender__" + name):
+        setattr(sender, "_RTCRtpSender__" + name, value)
 
 # ---------------------------
 # GStreamerVideoTrack (reads encoded packets from appsink and returns Packet)
@@ -99,208 +389,849 @@ aiortc.codecs.get_encoder = get_encoder
 class GStreamerVideoTrack(MediaStreamTrack):
     kind = "video"
 
-    def __init__(self, appsink):
+    def __init__(self, source, session_id=""):
         super().__init__()
-        self.appsink = appsink
+        self.source = source
+        self.session_id = session_id
+        labels = (source.name, session_id)
+        self._m_demux_latency = M_DEMUX_TO_APPSINK.labels(*labels)
+        self._m_sink_latency = M_APPSINK_TO_RTP.labels(*labels)
+        self._m_branch_drops = M_DROPPED.labels(*labels, "branch_queue")
+        self._m_queue_drops = M_DROPPED.labels(*labels, "peer_queue")
+        self._m_missed = M_MISSED.labels(*labels)
+        # the branch is chosen in bind() once the peer's answer fixes the codec
+        self.appsink = None
+        self.passthrough = False
+        self._bound = asyncio.Event()
+        self._loop = asyncio.get_event_loop()
+        self._queue = asyncio.Queue(maxsize=VIDEO_QUEUE_SIZE)
+        # cached GOP replayed on join; live samples up to its last PTS are duplicates
+        self._primed = deque()
+        self._primed_range = None  # (first pts, last pts) of the replayed GOP
+        self._drop_oldest = VIDEO_DROP_POLICY == "oldest"
+        self._dropped_frames = 0
         self._pts = 0
         self._time_base = Fraction(1, 30)
         self._missed_frames = 0
         self._decoder = Vp8Decoder()
 
-        # Fallback (red frame)
-        img = np.zeros((300, 500, 3), dtype=np.uint8)
-        img[:] = (0, 0, 255)
-        self._fallback_frame = img.tobytes()
-        self._current_frame = self._fallback_frame
+        # per-frame KLV: the peer's KLVTrack, and what is needed to turn a
+        # media timestamp into the RTP timestamp the browser sees
+        self.klv_track = None
+        self.sender = None
+        self._rtp_origin = None
+        self._last_timestamp = None
+        self._sent_packets = 0
 
         self._printed_caps = False
 
-    async def recv(self):
-        """Fetch the next encoded frame from GStreamer (VP8) and wrap it as a Packet."""
-        loop = asyncio.get_event_loop()
-        sample = await loop.run_in_executor(None, self._pull_sample)
+    def bind(self, codec, sender=None):
+        """Attach to the passthrough branch for H.264, otherwise to the VP8 transcode branch."""
+        self.sender = sender
+        if self.appsink is None:
+            passthrough = self.passthrough = codec.mimeType.lower() == "video/h264"
+            self.appsink = self.source.add_video_branch(passthrough=passthrough)
+            self.appsink.connect("new-sample", self._on_new_sample)
+            self._prime(self.source.cached_gop(self.appsink))
+            # the branch's leaky queue drops silently; count its overruns
+            branch_queue = self.appsink.get_static_pad("sink").get_peer().get_parent_element()
+            branch_queue.connect("overrun", lambda queue: self._m_branch_drops.inc())
+            print(f"🎞️ Peer negotiated {codec.mimeType} ({'passthrough' if passthrough else 'transcode'})")
+        self._bound.set()
 
-        data = self._current_frame
-        valid_frame = False
+    async def recv(self):
+        """Fetch the next encoded frame from GStreamer (VP8 or H.264) and wrap it as a Packet."""
+        await self._bound.wait()
+        self._sync_rtp_origin()
+        self._forward_keyframe_request()
+        sample, received, replay_timestamp = await self._next_sample()
 
         if sample is not None:
+            if replay_timestamp is None:
+                self._m_sink_latency.observe(time.monotonic() - received)
             buf = sample.get_buffer()
             success, map_info = buf.map(Gst.MapFlags.READ)
 
             if success:
-                try:
-                    size = buf.get_size()
-                    data = map_info.data[:size]
-                    self._current_frame = data
-                    self._missed_frames = 0
-                    valid_frame = True
-
-                    # Print format once for debugging
-                    if not self._printed_caps:
-                        caps = sample.get_caps()
-                        print("🔹 GStreamer sample caps:", caps.to_string())
-                        self._printed_caps = True
-
-                finally:
-                    buf.unmap(map_info)
-
-                # Build packet using real timestamp
-                pkt = Packet(data)
-
-                if buf.pts != Gst.CLOCK_TIME_NONE:
-                    pkt.pts = int(Fraction(buf.pts, Gst.SECOND) / self._time_base + Fraction(1, 2))
+                # Print format once for debugging
+                if not self._printed_caps:
+                    caps = sample.get_caps()
+                    print("🔹 GStreamer sample caps:", caps.to_string())
+                    self._printed_caps = True
+                self._missed_frames = 0
+
+                time_base = self._time_base
+                if replay_timestamp is not None:
+                    # cached GOP frame, moved onto the live edge (see _prime)
+                    pts = replay_timestamp
+                    time_base = VIDEO_TIME_BASE
+                elif buf.pts != Gst.CLOCK_TIME_NONE:
+                    pts = self._frame_pts(buf.pts)
                 else:
                     self._pts += 1
-                    pkt.pts = self._pts
+                    pts = self._pts
 
-                pkt.time_base = self._time_base
-                return pkt
+                timestamp = convert_timebase(pts, time_base, VIDEO_TIME_BASE)
+                self._last_timestamp = timestamp
+                if self.klv_track is not None and buf.pts != Gst.CLOCK_TIME_NONE and replay_timestamp is None:
+                    rtp_timestamp = self._rtp_timestamp(timestamp)
+                    if rtp_timestamp is not None:
+                        self.klv_track.send_frame(buf.pts, rtp_timestamp)
+
+                # zero-copy view of the mapped buffer; the encoder unmaps it
+                # once the RTP payloads are built
+                data = memoryview(map_info.data)[:buf.get_size()]
+                return GstPacket(data, pts, time_base, buf, map_info)
 
             else:
                 self._missed_frames += 1
+                self._m_missed.inc()
                 if self._missed_frames % 30 == 0:
                     print(f"⚠️ Buffer map failed {self._missed_frames} times in a row. Bad stream!")
 
-        # If no new sample — reuse last good one
+        # No new sample — send an empty packet (no payloads) and keep the clock moving
         self._missed_frames += 1
+        self._m_missed.inc()
 
-        if not valid_frame:
-            self._current_frame = bytes()
-
-        pkt = Packet(self._current_frame)
         self._pts += 1
-        pkt.pts = self._pts
-        pkt.time_base = self._time_base
-        return pkt
+        self._last_timestamp = None
+        return GstPacket(b"", self._pts, self._time_base)
 
-    def _pull_sample(self):
-        """Block until a complete frame is ready."""
-        try:
-            return self.appsink.emit("try-pull-sample", Gst.SECOND)
-        except Exception as e:
-            print(f"⚠️ Error pulling sample: {e}")
+    def _sync_rtp_origin(self):
+        """
+        aiortc adds a random origin to every RTP timestamp. recv() is called
+        once the previous frame's packets are out, so if the sender's packet
+        count moved since the last call, its last RTP timestamp belongs to
+        the frame we returned last time and the difference is the origin.
+        """
+        if self._rtp_origin is not None or self.sender is None:
+            return
+        sent = _sender_field(self.sender, "packet_count")
+        if sent is None:
+            return
+        if sent > self._sent_packets and self._last_timestamp is not None:
+            rtp_timestamp = _sender_field(self.sender, "rtp_timestamp")
+            if rtp_timestamp is None:
+                return
+            self._rtp_origin = (rtp_timestamp - self._last_timestamp) & 0xFFFFFFFF
+        self._sent_packets = sent
+
+    def _forward_keyframe_request(self):
+        """
+        aiortc turns a receiver's PLI into a force-keyframe flag for its own
+        encoder, which RawEncoder.pack() never sees; pass it on to vp8enc.
+        Only aiortc's encode() path resets the flag, so clear it here.
+        """
+        if self.sender is None or self.passthrough or self.appsink is None:
+            return
+        if _sender_field(self.sender, "force_keyframe", False):
+            _set_sender_field(self.sender, "force_keyframe", False)
+            self.source.request_keyframe(self.appsink)
+
+    def _frame_pts(self, pts):
+        return int(Fraction(pts, Gst.SECOND) / self._time_base + Fraction(1, 2))
+
+    def _prime(self, samples):
+        """
+        Queue the cached GOP ahead of live samples. Transcoded peers only get
+        its keyframe: vp8enc is forced to a fresh one on join anyway. The
+        replay's timestamps are squeezed onto the live edge, one 90 kHz tick
+        apart and ending at the newest frame, so the browser decodes through
+        the GOP at once instead of playing it out and starting behind.
+        """
+        if not samples:
+            return
+        if not self.passthrough:
+            samples = samples[:1]
+        last = samples[-1].get_buffer().pts
+        if last == Gst.CLOCK_TIME_NONE:
+            return
+        self._primed_range = (samples[0].get_buffer().pts, last)
+        edge = convert_timebase(self._frame_pts(last), self._time_base, VIDEO_TIME_BASE)
+        count = len(samples)
+        self._primed.extend((sample, edge - (count - 1 - i)) for i, sample in enumerate(samples))
+        print(f"⚡ Replaying {count} cached frames to the new peer")
+
+    def _rtp_timestamp(self, timestamp):
+        if self._rtp_origin is None:
             return None
+        return (self._rtp_origin + timestamp) & 0xFFFFFFFF
+
+    def _on_new_sample(self, sink):
+        """Streaming thread: hand the sample to the event loop without blocking."""
+        sample = sink.emit("pull-sample")
+        if sample is not None:
+            now = time.monotonic()
+            demuxed = self.source.demux_time(sample.get_buffer().pts)
+            if demuxed is not None:
+                self._m_demux_latency.observe(now - demuxed)
+            self._loop.call_soon_threadsafe(self._enqueue, (sample, now))
+        return Gst.FlowReturn.OK
+
+    def _enqueue(self, item):
+        if self._primed_range is not None:
+            first, last = self._primed_range
+            if first <= item[0].get_buffer().pts <= last:
+                return  # already replayed from the GOP cache
+            self._primed_range = None
+        if self._queue.full():
+            self._dropped_frames += 1
+            self._m_queue_drops.inc()
+            if not self._drop_oldest:
+                return
+            self._queue.get_nowait()
+        self._queue.put_nowait(item)
+
+    async def _next_sample(self):
+        """
+        Next (sample, appsink time, replay timestamp): a cached GOP frame with
+        its live-edge RTP timestamp (90 kHz) first, then queued live samples
+        (replay timestamp None). (None, None, None) if nothing arrived within a second.
+        """
+        if self._primed:
+            sample, timestamp = self._primed.popleft()
+            return sample, time.monotonic(), timestamp
+        if not self._queue.empty():
+            return (*self._queue.get_nowait(), None)
+        try:
+            return (*await asyncio.wait_for(self._queue.get(), 1.0), None)
+        except asyncio.TimeoutError:
+            return None, None, None
+
+    def stop(self):
+        super().stop()
+        if self.appsink is not None:
+            self.source.remove_video_branch(self.appsink)
+
+class BitrateController:
+    """
+    Bandwidth estimate for one transcoded peer, GCC style: the receiver's
+    REMB caps it, RTCP receiver-report loss steers it (back off above 10%
+    loss, probe up 8% below 2%). Source.set_peer_bitrate() turns the
+    estimates into encoder settings or a quality layer.
+    """
+
+    def __init__(self, track, sender, interval=ABR_INTERVAL):
+        self.track = track
+        self.sender = sender
+        self.interval = interval
+        self.bitrate = min(VIDEO_BITRATE, track.source.max_bitrate)
+        self.loss = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                await self._update()
+        except asyncio.CancelledError:
+            pass
+
+    async def _update(self):
+        stats = await self.sender.getStats()
+        for report in stats.values():
+            if report.type == "remote-inbound-rtp" and report.fractionLost is not None:
+                self.loss = report.fractionLost / 256.0
+
+        bitrate = self.bitrate
+        if self.loss > 0.10:
+            bitrate *= 1.0 - 0.5 * self.loss
+        elif self.loss < 0.02:
+            bitrate *= 1.08
+        encoder = _sender_field(self.sender, "encoder")
+        remb = getattr(encoder, "target_bitrate", None)
+        if remb:
+            bitrate = min(bitrate, remb)
+        self.bitrate = max(ABR_MIN_BITRATE, min(bitrate, self.track.source.max_bitrate))
+        self.track.source.set_peer_bitrate(self.track.appsink, self.bitrate)
+
+class GopCache:
+    """
+    Frames since the last keyframe seen on one tee, as Gst.Samples. A GOP
+    longer than `max_frames` is dropped until the next keyframe, since a
+    partial one can't be decoded.
+    """
+
+    def __init__(self, tee, max_frames=None):
+        self.max_frames = GOP_CACHE_FRAMES if max_frames is None else max_frames
+        self._samples = []
+        self._bytes = 0
+        self._caps = None
+        self._lock = threading.Lock()
+        if self.max_frames > 0:
+            tee.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self._on_buffer)
+
+    def _on_buffer(self, pad, info):
+        # streaming thread: keep a reference, no copy
+        buf = info.get_buffer()
+        size = buf.get_size()
+        with self._lock:
+            if not buf.has_flags(Gst.BufferFlags.DELTA_UNIT):
+                self._caps = pad.get_current_caps()
+                self._samples = [Gst.Sample.new(buf, self._caps, None, None)]
+                self._bytes = size
+            elif (self._samples and len(self._samples) < self.max_frames
+                  and self._bytes + size <= GOP_CACHE_BYTES):
+                self._samples.append(Gst.Sample.new(buf, self._caps, None, None))
+                self._bytes += size
+            else:
+                self._samples = []
+                self._bytes = 0
+        return Gst.PadProbeReturn.OK
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._samples)
+
+    def clear(self):
+        with self._lock:
+            self._samples = []
+            self._bytes = 0
 
 # ---------------------------
-# KLV handling: KLVTrack sends parsed KLV metadata to a DataChannel
+# KLV handling: decode once per source, KLVTrack forwards to one peer's DataChannel
 # ---------------------------
+def _restrict(local_set, tags):
+    return {tag: value for tag, value in local_set.items() if tag in tags or type(tag) is str}
+
+
+class KLVHistory:
+    """Recently decoded Local Sets of one source, ordered by PTS (ns)."""
+
+    def __init__(self, size=KLV_HISTORY_SIZE):
+        self.pts = deque(maxlen=size)
+        self.sets = deque(maxlen=size)
+
+    def add(self, pts, local_set):
+        if self.pts and pts < self.pts[-1]:
+            self.clear()  # the source looped
+        self.pts.append(pts)
+        self.sets.append(local_set)
+
+    def clear(self):
+        self.pts.clear()
+        self.sets.clear()
+
+    def restrict(self, tags):
+        """Drop every tag not in `tags` from the stored sets (the decoded tag set shrank)."""
+        for i, local_set in enumerate(self.sets):
+            self.sets[i] = _restrict(local_set, tags)
+
+    def at(self, pts):
+        """
+        Local Set for a video frame at `pts`: interpolated between the packets
+        either side of it, or the newest one if metadata hasn't caught up yet.
+        None before the first packet.
+        """
+        i = bisect_right(self.pts, pts)
+        if i == 0:
+            return None
+        if i == len(self.pts):
+            return self.sets[-1]
+        t0, t1 = self.pts[i - 1], self.pts[i]
+        return misb0601.interpolate(self.sets[i - 1], self.sets[i], (pts - t0) / (t1 - t0))
+
+
+class DataChannelScheduler:
+    """
+    Latest-wins sender for one DataChannel. A message waits while the SCTP
+    backlog is above the high-water mark or the client's rate limit hasn't
+    elapsed; a newer message replaces it (counted as coalesced). Payloads are
+    built by a callback at send time, so superseded ones are never serialized.
+    """
+
+    def __init__(self, dc, max_rate=None, high_water=KLV_HIGH_WATER, low_water=KLV_LOW_WATER,
+                 labels=("", "")):
+        self.dc = dc
+        self.loop = asyncio.get_event_loop()
+        self.high_water = high_water
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._pending = None
+        self._next_send = 0.0
+        self._timer = None
+        self._m_bytes = M_DC_BYTES.labels(*labels)
+        self._m_sent = M_DC_MESSAGES.labels(*labels, "sent")
+        self._m_coalesced = M_DC_MESSAGES.labels(*labels, "coalesced")
+        self._m_dropped = M_DC_MESSAGES.labels(*labels, "dropped")
+        self.set_rate(max_rate)
+        dc.bufferedAmountLowThreshold = low_water
+        dc.on("bufferedamountlow", self._flush)
+
+    def set_rate(self, max_rate):
+        """Cap this channel at `max_rate` messages per second (0/None = uncapped)."""
+        self.max_rate = max_rate if max_rate and max_rate > 0 else None
+        self._interval = 1.0 / self.max_rate if self.max_rate else 0.0
+
+    def submit(self, build):
+        """Queue `build() -> str|None` as the next message, replacing any pending one."""
+        if self._pending is not None:
+            self.coalesced += 1
+            self._m_coalesced.inc()
+        self._pending = build
+        self._flush()
+
+    def _flush(self):
+        if self._pending is None:
+            return
+        if self.dc.readyState != "open":
+            self._pending = None
+            self.dropped += 1
+            self._m_dropped.inc()
+            return
+        if self.dc.bufferedAmount > self.high_water:
+            return  # "bufferedamountlow" calls back once the backlog drains
+        now = self.loop.time()
+        if now < self._next_send:
+            if self._timer is None:
+                self._timer = self.loop.call_later(self._next_send - now, self._on_timer)
+            return
+
+        build, self._pending = self._pending, None
+        payload = build()
+        if payload is None:
+            return
+        self.dc.send(payload)
+        self.sent += 1
+        self._m_sent.inc()
+        self._m_bytes.inc(len(payload))
+        self._next_send = now + self._interval
+
+    def _on_timer(self):
+        self._timer = None
+        self._flush()
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending is not None:
+            self._pending = None
+            self.dropped += 1
+            self._m_dropped.inc()
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "buffered": self.dc.bufferedAmount,
+            "max_rate": self.max_rate,
+        }
+
+
+def parse_klv_tags(value):
+    """
+    Tag subscription from a client: a list of tag numbers, or a comma
+    separated string of them. None, "" or "all" subscribe to every tag
+    (returned as None). ValueError on anything else.
+    """
+    if value is None or value == "all":
+        return None
+    if isinstance(value, str):
+        value = [v for v in value.split(",") if v.strip()]
+        if not value:
+            return None
+    if not isinstance(value, (list, tuple)):
+        raise ValueError(f"tags must be a list of tag numbers, got {value!r}")
+    tags = frozenset(int(tag) for tag in value)
+    if any(tag < 1 for tag in tags):
+        raise ValueError("tag numbers start at 1")
+    return tags
+
+
+def parse_klv_rate(value):
+    """
+    Message rate cap from a client, in Hz; 0 (or below) means full rate.
+    ValueError on anything that isn't a finite number.
+    """
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"rate must be a number (Hz), got {value!r}") from None
+    if rate != rate or rate in (float("inf"), float("-inf")):
+        raise ValueError(f"rate must be finite, got {value!r}")
+    return max(rate, 0.0)
+
+
 class KLVTrack:
-    def __init__(self, sink, data_channel):
-        self.sink = sink
+    def __init__(self, source, data_channel, max_rate=None, mode=KLV_MODE,
+                 snapshot_interval=KLV_SNAPSHOT_INTERVAL, session_id="", timestamps=False, tags=None):
+        self.source = source
         self.dc = data_channel
-        # keep an index because you may want to debug which pads map to which stream
-        self._enabled = True
-        self.loop = asyncio.get_event_loop()
+        self.session_id = session_id
+        self.scheduler = DataChannelScheduler(data_channel, max_rate, labels=(source.name, session_id))
+        self._m_serialize = M_KLV_SERIALIZE.labels(source.name)
+        self.mode = mode
+        self.snapshot_interval = snapshot_interval
+        # add "ts" (server wall clock, seconds) to every message for latency measurements
+        self.timestamps = timestamps
+        # subscribed ST 0601 tags (frozenset), None for all; the source decodes the union
+        self.tags = tags
+        self._active = False
+        # delta mode: the Local Set the client last received, and when the next full one is due
+        self._last_sent = None
+        self._next_snapshot = 0.0
 
     def start(self):
-        # connect the new-sample handler
+        self._active = True
+        self.source.add_klv_subscriber(self)
+        # the newest Local Set right away, before the first frame's message
+        if self.source.klv_history.sets:
+            self.scheduler.submit(self._join_payload)
+
+    def _join_payload(self):
+        """Full snapshot without an RTP timestamp; clients hold it until frame-keyed messages arrive."""
+        if not self.source.klv_history.sets:
+            return None
+        local_set = self._last_sent = self._project(self.source.klv_history.sets[-1])
+        self._next_snapshot = self.scheduler.loop.time() + self.snapshot_interval
+        return misc.json_safe_dumps({"rtp": None, "klv": local_set, "full": True})
+
+    def stop(self):
+        if not self._active:
+            return
+        self._active = False
+        self.source.remove_klv_subscriber(self)
+        self.scheduler.close()
+        print("📊 KLV channel stats:", self.scheduler.stats())
+
+    def on_message(self, message):
+        """
+        Client config, e.g. {"maxRate": 5} for a 5 Hz map view or {"maxRate": 0}
+        for full rate, and {"tags": [5, 6, 7, 13, ...]} (or "all") to receive
+        only those tags.
+        """
         try:
-            # appsink must have "emit-signals"=True
-            self.sink.connect("new-sample", self.on_new_sample)
-        except Exception as e:
-            print("Failed to connect klv sink new-sample:", e)
+            config = json.loads(message)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(config, dict):
+            return
+        if "maxRate" in config:
+            try:
+                self.scheduler.set_rate(parse_klv_rate(config["maxRate"]))
+            except ValueError as e:
+                print(f"⚠️ Ignoring KLV rate: {e}")
+            else:
+                print(f"KLV rate for peer set to {self.scheduler.max_rate or 'full'}")
+        if "tags" in config:
+            try:
+                self.set_tags(parse_klv_tags(config["tags"]))
+            except (TypeError, ValueError) as e:
+                print(f"⚠️ Ignoring KLV subscription: {e}")
+
+    def set_tags(self, tags):
+        self.tags = tags
+        # the client's state no longer matches: next message is a full snapshot
+        self._last_sent = None
+        if self._active:
+            self.source.update_klv_tags()
+        print(f"KLV tags for peer set to {sorted(tags) if tags is not None else 'all'}")
+
+    def _project(self, local_set):
+        """The subscribed part of a Local Set. Derived entries (str keys, e.g. "footprint") always pass."""
+        tags = self.tags
+        if tags is None:
+            return local_set
+        decoded = self.source.klv_tags
+        if decoded is not None and tags >= decoded:
+            return local_set  # the source decoded nothing this client doesn't want
+        return _restrict(local_set, tags)
+
+    def send_frame(self, pts, rtp_timestamp):
+        """
+        Queue the metadata for the video frame at `pts` (ns), stamped with the
+        RTP timestamp the browser reports for that frame.
+        """
+        if self._active:
+            # stamped when the frame goes to the RTP sender, not when the message is built
+            sent = time.time() if self.timestamps else None
+            self.scheduler.submit(lambda: self._frame_payload(pts, rtp_timestamp, sent))
 
-    def on_new_sample(self, sink):
-        sample = sink.emit("pull-sample")
-        if not sample:
-            return Gst.FlowReturn.OK
+    def _frame_payload(self, pts, rtp_timestamp, sent=None):
+        """
+        Built at send time, so in delta mode the diff is always against what
+        the client actually received, however many messages were coalesced.
+        """
+        with self._m_serialize.time():
+            message = self._build_message(pts, rtp_timestamp)
+            if message is None:
+                return None
+            if sent is not None:
+                message["ts"] = sent
+            return misc.json_safe_dumps(message)
+
+    def _build_message(self, pts, rtp_timestamp):
+        local_set = self.source.klv_history.at(pts)
+        if local_set is None:
+            return None
+        local_set = self._project(local_set)
+        if self.mode != "delta":
+            return {"rtp": rtp_timestamp, "klv": local_set}
+
+        last = self._last_sent
+        self._last_sent = local_set
+        now = self.scheduler.loop.time()
+        if last is None or now >= self._next_snapshot:
+            self._next_snapshot = now + self.snapshot_interval
+            return {"rtp": rtp_timestamp, "klv": local_set, "full": True}
+
+        # unchanged tags are usually the same object (see misb0601.LocalSetDecoder)
+        delta = {}
+        for tag, value in local_set.items():
+            previous = last.get(tag, last)
+            if value is not previous and value != previous:
+                delta[tag] = value
+        message = {"rtp": rtp_timestamp, "delta": delta}
+        removed = [tag for tag in last if tag not in local_set]
+        if removed:
+            message["removed"] = removed
+        return message
+
+class BroadcastMessage:
+    """One serialized KLV message shared by every client it goes to; the SSE framing is built on first use."""
+
+    __slots__ = ("payload", "_event")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self._event = None
+
+    @property
+    def event(self):
+        if self._event is None:
+            self._event = b"data: " + self.payload + b"\n\n"
+        return self._event
+
+
+class BroadcastClient:
+    """
+    One WebSocket or SSE connection. Latest wins: a message arriving while
+    the previous one is still being written replaces the one waiting, and
+    while the socket's write buffer is over BROADCAST_HIGH_WATER messages
+    are dropped outright, so a slow client costs nothing but its own gaps.
+    """
 
-        buffer = sample.get_buffer()
-        success, map_info = buffer.map(Gst.MapFlags.READ)
-        if not success:
-            return Gst.FlowReturn.OK
+    def __init__(self, transport_name, transport, write, tags=None, keepalive=None):
+        self.transport_name = transport_name
+        self.transport = transport
+        self.write = write  # async write(BroadcastMessage)
+        self.keepalive = keepalive  # async keepalive(), called on a quiet feed
+        self.tags = tags
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._pending = None
+        self._wake = asyncio.Event()
+        self._counters = None
+
+    def offer(self, message):
+        transport = self.transport
+        if transport is None or transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > BROADCAST_HIGH_WATER:
+            self.dropped += 1
+            self._counters[2].inc()
+            return
+        if self._pending is not None:
+            self.coalesced += 1
+            self._counters[1].inc()
+        self._pending = message
+        self._wake.set()
+
+    async def run(self):
+        """Write messages until the connection goes away."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), BROADCAST_KEEPALIVE)
+            except asyncio.TimeoutError:
+                if self.keepalive is not None:
+                    await self.keepalive()
+                continue
+            self._wake.clear()
+            message, self._pending = self._pending, None
+            if message is None:
+                continue
+            await self.write(message)
+            self.sent += 1
+            self._counters[0].inc()
+
+    def stats(self):
+        return {"sent": self.sent, "coalesced": self.coalesced, "dropped": self.dropped}
+
+
+class KLVBroadcast:
+    """
+    Fan-out of one source's KLV to its WebSocket / SSE clients. Subscribes
+    to the source like a KLVTrack (its tags are the union of its clients'),
+    and serializes each Local Set once per distinct subscription.
+    """
 
-        raw_bytes = map_info.data
+    def __init__(self, source):
+        self.source = source
+        self.groups = {}  # tags (frozenset or None) -> set of BroadcastClient
 
-        parsed_sets = misc.parse_klv_local_sets(raw_bytes)
-        parsers = UASLocalMetadataSet.parsers
+    def __len__(self):
+        return sum(len(clients) for clients in self.groups.values())
 
-        parsed_metadatas =[]
-        for packet in parsed_sets:
-            parsed_metadata = {}
-            for key, value_bytes in packet.items():
-                try:
-                    parser = parsers[key]
-                    value = parser(value_bytes).value.value
-                except Exception:
-                    value = value_bytes
-                parsed_metadata[int.from_bytes(key, "big")] = value
-            parsed_metadatas.append(parsed_metadata)
-
-        self.loop.call_soon_threadsafe(
-            self.dc.send, json.dumps(misc.json_safe_serialize(parsed_metadatas))
-        )
+    @property
+    def tags(self):
+        if None in self.groups:
+            return None
+        return frozenset().union(*self.groups)
+
+    def add(self, client):
+        client._counters = tuple(M_BROADCAST_MESSAGES.labels(self.source.name, client.transport_name, outcome)
+                                 for outcome in ("sent", "coalesced", "dropped"))
+        first = not self.groups
+        self.groups.setdefault(client.tags, set()).add(client)
+        if first:
+            self.source.add_klv_subscriber(self)
+        else:
+            self.source.update_klv_tags()
+        # the newest Local Set right away
+        if self.source.klv_history.sets:
+            client.offer(self._message(client.tags, self.source.klv_history.pts[-1],
+                                       self.source.klv_history.sets[-1]))
+
+    def remove(self, client):
+        clients = self.groups.get(client.tags)
+        if clients is None or client not in clients:
+            return
+        clients.discard(client)
+        if not clients:
+            del self.groups[client.tags]
+        if self.groups:
+            self.source.update_klv_tags()
+        else:
+            self.source.remove_klv_subscriber(self)
+
+    def retag(self, client, tags):
+        self.remove(client)
+        client.tags = tags
+        self.add(client)
+
+    def _message(self, tags, pts, local_set):
+        with M_KLV_SERIALIZE.labels(self.source.name).time():
+            decoded = self.source.klv_tags
+            if tags is not None and (decoded is None or not tags >= decoded):
+                local_set = _restrict(local_set, tags)
+            return BroadcastMessage(misc.json_safe_dumpb({"pts": pts / 1e9, "klv": local_set}))
+
+    def publish(self, pts, local_set):
+        for tags, clients in list(self.groups.items()):
+            message = self._message(tags, pts, local_set)
+            for client in clients:
+                client.offer(message)
 
-        buffer.unmap(map_info)
-        return Gst.FlowReturn.OK
 
 # ---------------------------
 # Build pipeline: programmatic tsdemux handling (fixed)
 # ---------------------------
-def build_pipeline(input_path):
-    is_ts = input_path.lower().endswith(".ts")
+def build_pipeline(input_path, on_video_caps=None, klv_index=0):
+    """
+    Returns (pipeline, src_tee, video_tee, klv_sink).
+
+    src_tee carries the demuxed video before any decoding (H.264 access units
+    for passthrough peers); video_tee carries VP8 from the transcoding chain.
+    `on_video_caps(codec, caps)` is called from a streaming thread once the
+    video stream is known: codec is "h264" for passthrough-capable streams,
+    None when the stream can only be transcoded. `klv_index` picks which KLV
+    stream to forward when the file carries several (0-based, PMT order).
+    """
+    live = is_live(input_path)
+    is_ts = live or input_path.lower().endswith(".ts")
     if is_ts:
         # Build elements programmatically to correctly handle dynamic pads.
         pipeline = Gst.Pipeline.new("pipeline")
 
-        filesrc = Gst.ElementFactory.make("filesrc", "source")
+        src = make_ts_source(input_path)
         tsdemux = Gst.ElementFactory.make("tsdemux", "demux")
-        # Video chain: queue -> decodebin -> videoconvert -> vp8enc -> queue -> appsink
+        # Video chain: queue -> [h264parse] -> src_tee
         vqueue = Gst.ElementFactory.make("queue", "vqueue")
+        # source tee: passthrough branches, the pacer and (when needed) the transcoder hang off it
+        src_tee = Gst.ElementFactory.make("tee", "src_tee")
+        # clocked sink on the tee paces the shared pipeline whether or not anyone is watching
+        pacer = Gst.ElementFactory.make("fakesink", "pacer")
+        # Transcode chain: queue -> decodebin -> videoconvert -> raw_tee -> queue
+        #   -> videoscale -> scalecaps -> vp8enc -> queue -> video_tee
+        # (quality layers, when configured, hang further encoders off raw_tee)
+        tqueue = Gst.ElementFactory.make("queue", "transcode_queue")
         decodebin = Gst.ElementFactory.make("decodebin", "decodebin")
         videoconvert = Gst.ElementFactory.make("videoconvert", "videoconvert")
+        raw_tee = Gst.ElementFactory.make("tee", "raw_tee")
+        rawqueue = Gst.ElementFactory.make("queue", "rawqueue")
+        videoscale = Gst.ElementFactory.make("videoscale", "videoscale")
+        scalecaps = Gst.ElementFactory.make("capsfilter", "scalecaps")
         vp8enc = Gst.ElementFactory.make("vp8enc", "vp8enc")
         vpostqueue = Gst.ElementFactory.make("queue", "vpostqueue")
-        video_sink = Gst.ElementFactory.make("appsink", "video_sink")
+        # encoded video is fanned out to one branch per peer (see Source.add_video_branch)
+        video_tee = Gst.ElementFactory.make("tee", "video_tee")
 
         # KLV chain: queue -> appsink
         klv_queue = Gst.ElementFactory.make("queue", "klv_queue")
         klv_sink = Gst.ElementFactory.make("appsink", "klv_sink")
 
         # basic checks
-        elems = [filesrc, tsdemux, vqueue, decodebin, videoconvert, vp8enc, vpostqueue, video_sink, klv_queue, klv_sink]
+        elems = [src, tsdemux, vqueue, src_tee, pacer, tqueue, decodebin, videoconvert, raw_tee, rawqueue, videoscale, scalecaps, vp8enc, vpostqueue, video_tee, klv_queue, klv_sink]
         if any(e is None for e in elems):
-            missing = [name for e,name in zip(elems, ["filesrc","tsdemux","vqueue","decodebin","videoconvert","vp8enc","vpostqueue","video_sink","klv_queue","klv_sink"]) if e is None]
+            missing = [name for e,name in zip(elems, ["source","tsdemux","vqueue","src_tee","pacer","transcode_queue","decodebin","videoconvert","raw_tee","rawqueue","videoscale","scalecaps","vp8enc","vpostqueue","video_tee","klv_queue","klv_sink"]) if e is None]
             raise RuntimeError(f"Missing GStreamer elements: {missing} -- check GStreamer installation and plugins")
 
-        # configure elements
-        filesrc.set_property("location", input_path)
+        # configure elements (the source itself is set up by make_ts_source)
 
-        # video appsink: pull using try-pull-sample in track
-        video_sink.set_property("emit-signals", False)
-        video_sink.set_property("sync", False)
-        video_sink.set_property("max-buffers", 20)
-        video_sink.set_property("drop", True)
+        # tees: peers come and go, so they must keep flowing with no branch linked
+        src_tee.set_property("allow-not-linked", True)
+        video_tee.set_property("allow-not-linked", True)
+        raw_tee.set_property("allow-not-linked", True)
+        scalecaps.set_property("caps", Gst.Caps.from_string("video/x-raw"))
+        configure_vp8enc(vp8enc, VIDEO_BITRATE)
+        pacer.set_property("sync", True)
+        pacer.set_property("async", False)
 
-        # klv appsink: use signals to call KLVTrack.on_new_sample
+        # klv appsink: use signals to call Source.on_klv_sample
         klv_sink.set_property("emit-signals", True)
         klv_sink.set_property("sync", False)
         klv_sink.set_property("max-buffers", 50)
         klv_sink.set_property("drop", True)
 
         # add to pipeline
-        pipeline.add(filesrc)
-        pipeline.add(tsdemux)
-        pipeline.add(vqueue)
-        pipeline.add(decodebin)
-        pipeline.add(videoconvert)
-        pipeline.add(vp8enc)
-        pipeline.add(vpostqueue)
-        pipeline.add(video_sink)
-        pipeline.add(klv_queue)
-        pipeline.add(klv_sink)
+        for e in elems:
+            pipeline.add(e)
 
         # link what can be statically linked:
-        if not filesrc.link(tsdemux):
+        if live:
+            # socket -> leaky ingest queue -> tsdemux, the rest tuned in tune_live()
+            ingest = Gst.ElementFactory.make("queue", "ingest_queue")
+            pipeline.add(ingest)
+            if not (src.link(ingest) and ingest.link(tsdemux)):
+                raise RuntimeError("Failed to link source -> ingest_queue -> tsdemux")
+            tune_live(pipeline)
+        elif not src.link(tsdemux):
             raise RuntimeError("Failed to link filesrc -> tsdemux")
-
-        # link decodebin chain statically: we will connect vqueue -> decodebin dynamically
-        if not videoconvert.link(vp8enc):
-            raise RuntimeError("Failed to link videoconvert -> vp8enc")
+        if not src_tee.link(pacer):
+            raise RuntimeError("Failed to link src_tee -> pacer")
+
+        # transcode chain; src_tee -> transcode_queue is linked by link_transcoder()
+        if not tqueue.link(decodebin):
+            raise RuntimeError("Failed to link transcode_queue -> decodebin")
+        if not (videoconvert.link(raw_tee) and raw_tee.link(rawqueue) and rawqueue.link(videoscale)
+                and videoscale.link(scalecaps) and scalecaps.link(vp8enc)):
+            raise RuntimeError("Failed to link videoconvert -> raw_tee -> videoscale -> vp8enc")
         if not vp8enc.link(vpostqueue):
             raise RuntimeError("Failed to link vp8enc -> vpostqueue")
-        if not vpostqueue.link(video_sink):
-            raise RuntimeError("Failed to link vpostqueue -> video_sink")
+        if not vpostqueue.link(video_tee):
+            raise RuntimeError("Failed to link vpostqueue -> video_tee")
 
         # queue to klv sink will be linked when KLV pad found
         if not klv_queue.link(klv_sink):
@@ -327,6 +1258,41 @@ def build_pipeline(input_path):
 
         decodebin.connect("pad-added", on_decodebin_pad)
 
+        def link_h264_passthrough():
+            # vqueue -> h264parse -> capsfilter(byte-stream/au) -> src_tee
+            h264parse = Gst.ElementFactory.make("h264parse", "h264parse")
+            h264caps = Gst.ElementFactory.make("capsfilter", "h264caps")
+            if h264parse is None or h264caps is None:
+                return False
+            # repeat SPS/PPS before every IDR so peers can join mid-stream
+            h264parse.set_property("config-interval", -1)
+            h264caps.set_property(
+                "caps",
+                Gst.Caps.from_string("video/x-h264,stream-format=byte-stream,alignment=au"),
+            )
+            pipeline.add(h264parse)
+            pipeline.add(h264caps)
+            if not (vqueue.link(h264parse) and h264parse.link(h264caps) and h264caps.link(src_tee)):
+                raise RuntimeError("Failed to link vqueue -> h264parse -> src_tee")
+
+            # the profile/level are only known once h264parse has seen the SPS
+            def on_caps_event(pad, info):
+                event = info.get_event()
+                if event.type == Gst.EventType.CAPS:
+                    if on_video_caps:
+                        on_video_caps("h264", event.parse_caps())
+                    return Gst.PadProbeReturn.REMOVE
+                return Gst.PadProbeReturn.OK
+
+            h264caps.get_static_pad("src").add_probe(
+                Gst.PadProbeType.EVENT_DOWNSTREAM, on_caps_event
+            )
+            h264parse.sync_state_with_parent()
+            h264caps.sync_state_with_parent()
+            return True
+
+        klv_pads_seen = [0]
+
         # tsdemux pad-added handler:
         def on_demux_pad(demux, pad):
             caps = pad.get_current_caps()
@@ -334,23 +1300,35 @@ def build_pipeline(input_path):
             print(f"🔗 demux pad-added: {caps_str}")
 
             lower = caps_str.lower()
-            # If the pad looks like video (mpeg2video/h264/etc) -> link into vqueue -> decodebin
+            # If the pad looks like video (mpeg2video/h264/etc) -> link into vqueue -> src_tee
             if lower.startswith("video/") or "video" in lower:
                 sinkpad = vqueue.get_static_pad("sink")
-                if not sinkpad.is_linked():
-                    res = pad.link(sinkpad)
-                    if res == Gst.PadLinkReturn.OK:
-                        print("✅ Linked demux -> vqueue (video)")
-                        # now link queue -> decodebin (queue already in pipeline)
-                        if not vqueue.link(decodebin):
-                            # sometimes queue->decodebin is not direct linkable; try to link once decodebin has pads (handled above)
-                            pass
-                    else:
-                        print("Failed to link demux video pad:", res)
+                if sinkpad.is_linked():
+                    return
+                if lower.startswith("video/x-h264") and link_h264_passthrough():
+                    print("✅ H.264 source: passthrough available")
+                else:
+                    # not browser-compatible as-is: every peer goes through vp8enc
+                    if not vqueue.link(src_tee):
+                        print("Failed to link vqueue -> src_tee")
+                        return
+                    link_transcoder(pipeline)
+                    if on_video_caps:
+                        on_video_caps(None, caps)
+                res = pad.link(sinkpad)
+                if res == Gst.PadLinkReturn.OK:
+                    print("✅ Linked demux -> vqueue (video)")
+                else:
+                    print("Failed to link demux video pad:", res)
                 return
 
             # Heuristic for KLV / metadata pads:
             if "klv" in lower or "meta" in lower or "application/octet-stream" in lower or "x-klv" in lower or "meta/x-klv" in lower:
+                index = klv_pads_seen[0]
+                klv_pads_seen[0] += 1
+                if index != klv_index:
+                    print(f"Skipping KLV stream #{index} (forwarding #{klv_index})")
+                    return
                 sinkpad = klv_queue.get_static_pad("sink")
                 if not sinkpad.is_linked():
                     res = pad.link(sinkpad)
@@ -365,108 +1343,1330 @@ def build_pipeline(input_path):
 
         tsdemux.connect("pad-added", on_demux_pad)
 
-        return pipeline, video_sink, klv_sink
+        return pipeline, src_tee, video_tee, klv_sink
     else:
         # fallback single-stream video pipeline (your original path)
         pipeline_str = f"""
             filesrc location="{input_path}" ! \
             decodebin ! \
-            videoconvert ! \
-            vp8enc cpu-used=4 deadline=1 threads=4 ! \
+            videoconvert name=videoconvert ! \
+            tee name=raw_tee allow-not-linked=true ! \
+            queue ! \
+            videoscale ! \
+            capsfilter name=scalecaps caps=video/x-raw ! \
+            vp8enc name=vp8enc ! \
             queue max-size-buffers=2 max-size-time=0 max-size-bytes=0 ! \
-            appsink name=video_sink emit-signals=false max-buffers=20 drop=true sync=true
+            tee name=video_tee allow-not-linked=true ! \
+            fakesink name=pacer sync=true async=false
         """
         pipeline = Gst.parse_launch(pipeline_str)
-        video_sink = pipeline.get_by_name("video_sink")
-        return pipeline, video_sink, None
+        configure_vp8enc(pipeline.get_by_name("vp8enc"), VIDEO_BITRATE)
+        video_tee = pipeline.get_by_name("video_tee")
+        if on_video_caps:
+            on_video_caps(None, None)
+        return pipeline, None, video_tee, None
+
+
+def is_live(path):
+    return path.lower().startswith(LIVE_SCHEMES)
+
+
+def make_ts_source(path):
+    """filesrc for a recording, udpsrc / srtsrc for a live MPEG-TS feed; named "source"."""
+    if not is_live(path):
+        src = Gst.ElementFactory.make("filesrc", "source")
+        if src is not None:
+            src.set_property("location", path)
+        return src
+    if path.lower().startswith("srt://"):
+        src = Gst.ElementFactory.make("srtsrc", "source")
+        if src is not None:
+            src.set_property("uri", path)
+        return src
+    src = Gst.ElementFactory.make("udpsrc", "source")
+    if src is not None:
+        src.set_property("uri", path)
+        src.set_property("buffer-size", LIVE_BUDGETS["socket_kb"] * 1024)
+        src.set_property("caps", Gst.Caps.from_string("video/mpegts,systemstream=(boolean)true,packetsize=188"))
+    return src
+
+
+def _bound_queue(queue, ms=0, buffers=0):
+    """Leaky (drop oldest) queue limited to `ms` of media or `buffers`, and LIVE_QUEUE_BYTES."""
+    queue.set_property("leaky", 2)
+    queue.set_property("max-size-time", int(ms * Gst.MSECOND))
+    queue.set_property("max-size-buffers", buffers)
+    queue.set_property("max-size-bytes", LIVE_QUEUE_BYTES)
+
+
+def tune_live(pipeline):
+    """Latency-bounded queues, an unclocked pacer and a low-delay encoder for live ingest."""
+    budgets = LIVE_BUDGETS
+    _bound_queue(pipeline.get_by_name("ingest_queue"), ms=budgets["ingest_ms"])
+    _bound_queue(pipeline.get_by_name("vqueue"), ms=budgets["video_ms"])
+    _bound_queue(pipeline.get_by_name("transcode_queue"), ms=budgets["transcode_ms"])
+    _bound_queue(pipeline.get_by_name("rawqueue"), buffers=1)
+    _bound_queue(pipeline.get_by_name("vpostqueue"), buffers=2)
+    _bound_queue(pipeline.get_by_name("klv_queue"), buffers=budgets["klv_buffers"])
+    # the socket delivers in real time already; clock-syncing would only add latency
+    pipeline.get_by_name("pacer").set_property("sync", False)
+    demux = pipeline.get_by_name("demux")
+    if demux.find_property("latency") is not None:
+        demux.set_property("latency", budgets["ingest_ms"])
+
+    vp8enc = pipeline.get_by_name("vp8enc")
+    vp8enc.set_property("buffer-size", budgets["encoder_ms"])
+    vp8enc.set_property("buffer-initial-size", budgets["encoder_ms"] * 2 // 3)
+    vp8enc.set_property("buffer-optimal-size", budgets["encoder_ms"] * 4 // 5)
+    vp8enc.set_property("keyframe-max-dist", 60)
+    Gst.util_set_object_arg(vp8enc, "error-resilient", "default")
+
+
+def configure_vp8enc(vp8enc, bitrate):
+    """Realtime, constant-bitrate VP8 so target-bitrate can be steered per second."""
+    vp8enc.set_property("deadline", 1)
+    vp8enc.set_property("cpu-used", 4)
+    vp8enc.set_property("threads", 4)
+    vp8enc.set_property("lag-in-frames", 0)
+    Gst.util_set_object_arg(vp8enc, "end-usage", "cbr")
+    vp8enc.set_property("target-bitrate", int(bitrate))
+
+
+def scale_caps(height):
+    """Caps for the scalecaps filter: `height` lines (aspect kept by videoscale), None = native."""
+    if height is None:
+        return Gst.Caps.from_string("video/x-raw")
+    return Gst.Caps.from_string(f"video/x-raw,height={int(height) // 2 * 2}")
+
+
+def add_quality_layers(pipeline, layers):
+    """
+    Pre-encode `layers` [(height, bitrate), ...]. The best layer reuses the
+    main vp8enc -> video_tee chain; every other one gets its own
+    queue -> videoscale -> capsfilter -> vp8enc -> tee off raw_tee.
+    Returns [(height, bitrate, tee)] best first, [] without layers.
+    """
+    if not layers:
+        return []
+    layers = sorted(layers, key=lambda layer: layer[1], reverse=True)
+    height, bitrate = layers[0]
+    pipeline.get_by_name("scalecaps").set_property("caps", scale_caps(height))
+    configure_vp8enc(pipeline.get_by_name("vp8enc"), bitrate)
+    result = [(height, bitrate, pipeline.get_by_name("video_tee"))]
+
+    raw_tee = pipeline.get_by_name("raw_tee")
+    for i, (height, bitrate) in enumerate(layers[1:], start=1):
+        queue = Gst.ElementFactory.make("queue", f"layer_queue_{i}")
+        scale = Gst.ElementFactory.make("videoscale", f"layer_scale_{i}")
+        caps = Gst.ElementFactory.make("capsfilter", f"layer_caps_{i}")
+        enc = Gst.ElementFactory.make("vp8enc", f"layer_vp8enc_{i}")
+        post = Gst.ElementFactory.make("queue", f"layer_postqueue_{i}")
+        tee = Gst.ElementFactory.make("tee", f"video_tee_{i}")
+        # a slow layer encoder must not hold back the others
+        queue.set_property("leaky", 2)
+        queue.set_property("max-size-buffers", 2)
+        caps.set_property("caps", scale_caps(height))
+        configure_vp8enc(enc, bitrate)
+        tee.set_property("allow-not-linked", True)
+        for element in (queue, scale, caps, enc, post, tee):
+            pipeline.add(element)
+        if not (raw_tee.link(queue) and queue.link(scale) and scale.link(caps)
+                and caps.link(enc) and enc.link(post) and post.link(tee)):
+            raise RuntimeError(f"Failed to link quality layer {height}p@{bitrate}")
+        result.append((height, bitrate, tee))
+    print("📶 Quality layers:", ", ".join(f"{h or 'native'}@{b // 1000}k" for h, b, _ in result))
+    return result
+
+
+def link_transcoder(pipeline):
+    """Feed src_tee into the decode -> vp8enc chain. Safe to call more than once."""
+    tqueue = pipeline.get_by_name("transcode_queue")
+    sinkpad = tqueue.get_static_pad("sink")
+    if sinkpad.is_linked():
+        return
+    teepad = pipeline.get_by_name("src_tee").get_request_pad("src_%u")
+    res = teepad.link(sinkpad)
+    if res != Gst.PadLinkReturn.OK:
+        raise RuntimeError(f"Failed to link src_tee -> transcode_queue: {res}")
+    print("🔁 Transcoding enabled (decodebin -> vp8enc)")
+
+
+# H.264 profile names as reported in h264parse caps -> profile_idc + constraint flags
+H264_PROFILES = {
+    "constrained-baseline": "42e0",
+    "baseline": "4200",
+    "main": "4d00",
+    "constrained-high": "640c",
+    "high": "6400",
+}
+
+
+def h264_profile_level_id(caps):
+    """Build an SDP profile-level-id (e.g. "4d401f") from h264parse caps, or None."""
+    if caps is None:
+        return None
+    structure = caps.get_structure(0)
+    profile = H264_PROFILES.get(structure.get_string("profile") or "")
+    level = structure.get_string("level")
+    if profile is None or not level:
+        return None
+    try:
+        level_idc = 11 if level == "1b" else int(round(float(level) * 10))
+    except ValueError:
+        return None
+    return f"{profile}{level_idc:02x}"
+
+
+def h264_codec_capability(profile_level_id):
+    """
+    Return the RTCRtpCodecCapability for an H.264 profile, registering it with
+    aiortc first if it isn't one of the built-in (baseline) entries.
+    """
+    video_codecs = aiortc.codecs.CODECS["video"]
+    wanted = RTCRtpCodecParameters(
+        mimeType="video/H264",
+        clockRate=90000,
+        parameters={
+            "level-asymmetry-allowed": "1",
+            "packetization-mode": "1",
+            "profile-level-id": profile_level_id,
+        },
+    )
+    match = next((c for c in video_codecs if is_codec_compatible(c, wanted)), None)
+    if match is None:
+        payload_type = max(c.payloadType for c in video_codecs) + 1
+        match = RTCRtpCodecParameters(
+            mimeType=wanted.mimeType,
+            clockRate=wanted.clockRate,
+            payloadType=payload_type,
+            rtcpFeedback=[
+                RTCRtcpFeedback(type="nack"),
+                RTCRtcpFeedback(type="nack", parameter="pli"),
+                RTCRtcpFeedback(type="goog-remb"),
+            ],
+            parameters=wanted.parameters,
+        )
+        video_codecs += [
+            match,
+            RTCRtpCodecParameters(
+                mimeType="video/rtx",
+                clockRate=90000,
+                payloadType=payload_type + 1,
+                parameters={"apt": payload_type},
+            ),
+        ]
+        print(f"➕ Registered H.264 codec profile-level-id={profile_level_id}")
+    return next(
+        c for c in RTCRtpSender.getCapabilities("video").codecs
+        if c.mimeType == match.mimeType and c.parameters == match.parameters
+    )
+
+
+def vp8_codec_capability():
+    return next(
+        c for c in RTCRtpSender.getCapabilities("video").codecs
+        if c.mimeType.lower() == "video/vp8"
+    )
 
 # ---------------------------
-# Aiohttp handlers
+# Source: one shared pipeline per input, fanned out to every peer
 # ---------------------------
-klv_index_to_forward = 0  # default (0-based)
+class Source:
+    """
+    Owns the pipeline for one input. Video is encoded once and teed into a
+    per-peer queue -> appsink branch; KLV is decoded once into a PTS-ordered
+    history that each peer's KLVTrack samples per outgoing video frame.
+    """
 
-async def index(request):
-    return web.FileResponse("index.htm")
+    def __init__(self, path, klv_index=0, name=None, start=None, end=None):
+        self.path = path
+        self.name = name or path  # metrics label
+        self.live = is_live(path)
+        self.glass_to_glass = None  # seconds, newest measurement (live sources)
+        # range playback (seconds into the recording): seek once prerolled, loop within it
+        self.start_time = start
+        self.end_time = end
+        self._seek_pending = False
+        self.loop = asyncio.get_event_loop()
+        # set once the video stream is known; H.264 sources also record their profile
+        self.h264_profile_level_id = None
+        self._ready = asyncio.Event()
+        self.pipeline, self.src_tee, self.video_tee, self.klv_sink = build_pipeline(
+            path, on_video_caps=self._on_video_caps, klv_index=klv_index
+        )
+        self._branches = {}  # appsink -> (tee, queue, tee src pad)
+        self._keyframe_requested = {}  # tee -> monotonic time of the last force-key-unit
+        self._moving = set()  # appsinks being relinked to another quality layer
+        # rate control for transcoded peers (see BitrateController)
+        self.vp8enc = self.pipeline.get_by_name("vp8enc")
+        self.scalecaps = self.pipeline.get_by_name("scalecaps")
+        self.layers = add_quality_layers(self.pipeline, VIDEO_LAYERS)
+        self._peer_bitrates = {}  # appsink -> bps
+        self._encoder_bitrate = VIDEO_BITRATE
+        self._scale_height = None
+        self._klv_subscribers = set()
+        self.klv_tags = None  # union of the subscribers' tags, None = decode all
+        self.broadcast = KLVBroadcast(self)  # WebSocket / SSE clients
+        self._klv_decoder = misb0601.LocalSetDecoder()
+        self.klv_history = KLVHistory()
+        if self.live:
+            self.update_klv_tags()  # tag 2 is decoded even with no subscribers
+        self._gop_caches = {
+            tee: GopCache(tee)
+            for tee in [self.src_tee, self.video_tee] + [layer[2] for layer in self.layers[1:]]
+            if tee is not None
+        }
+        self._instrument()
+
+    # ---- metrics ----
+    def _instrument(self):
+        """Pad probes feeding the per-source metrics; a dict write or a counter bump per buffer."""
+        self._m_klv_parse = M_KLV_PARSE.labels(self.name)
+        self._m_klv_rejected = M_KLV_REJECTED.labels(self.name)
+        # buffers enter here right after the demuxer (TS) or the decoder (other inputs)
+        entry = self.pipeline.get_by_name("vqueue") or self.pipeline.get_by_name("videoconvert")
+        self._demux_times = {}  # pts -> time.monotonic(), oldest first
+        entry.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self._on_demuxed)
+
+        encoders = ["vp8enc"] + [f"layer_vp8enc_{i}" for i in range(1, len(self.layers))]
+        for name in encoders:
+            frames = M_ENCODER_FRAMES.labels(self.name, name)
+            fps = M_ENCODER_FPS.labels(self.name, name)
+            window = [time.monotonic(), 0]  # start, frames in window
+
+            def on_encoded(pad, info, frames=frames, fps=fps, window=window):
+                frames.inc()
+                window[1] += 1
+                now = time.monotonic()
+                if now - window[0] >= 1.0:
+                    fps.set(window[1] / (now - window[0]))
+                    window[0], window[1] = now, 0
+                return Gst.PadProbeReturn.OK
+
+            self.pipeline.get_by_name(name).get_static_pad("src").add_probe(
+                Gst.PadProbeType.BUFFER, on_encoded)
+
+        if self.live:
+            # once per frame as the source tee releases it to every branch, however many peers
+            self._m_glass = M_GLASS_TO_GLASS.labels(self.name)
+            self.pipeline.get_by_name("pacer").get_static_pad("sink").add_probe(
+                Gst.PadProbeType.BUFFER, self._on_frame_out)
+
+    def _on_frame_out(self, pad, info):
+        pts = info.get_buffer().pts
+        if pts != Gst.CLOCK_TIME_NONE:
+            self.loop.call_soon_threadsafe(self._observe_glass_to_glass, pts, time.time())
+        return Gst.PadProbeReturn.OK
+
+    def _observe_glass_to_glass(self, pts, now):
+        """KLV Precision Time Stamp (tag 2, capture) of the frame at `pts` against when it went out."""
+        local_set = self.klv_history.at(pts)
+        captured = local_set.get(2) if local_set is not None else None
+        if isinstance(captured, datetime.datetime):
+            self.glass_to_glass = now - captured.timestamp()
+            self._m_glass.observe(self.glass_to_glass)
+
+    def _on_demuxed(self, pad, info):
+        pts = info.get_buffer().pts
+        if pts != Gst.CLOCK_TIME_NONE:
+            times = self._demux_times
+            times[pts] = time.monotonic()
+            if len(times) > DEMUX_TIMES_SIZE:
+                times.pop(next(iter(times)), None)
+        return Gst.PadProbeReturn.OK
+
+    def demux_time(self, pts):
+        """When the buffer with `pts` left the demuxer (time.monotonic()), if still known."""
+        return self._demux_times.get(pts)
+
+    def _on_video_caps(self, codec, caps):
+        # streaming thread (or build_pipeline itself for non-TS inputs)
+        profile_level_id = h264_profile_level_id(caps) if codec == "h264" else None
+        if codec == "h264" and profile_level_id is None:
+            print("⚠️ H.264 profile not negotiable, falling back to transcoding")
+            link_transcoder(self.pipeline)
+
+        def ready():
+            self.h264_profile_level_id = profile_level_id
+            self._ready.set()
+
+        self.loop.call_soon_threadsafe(ready)
+
+    async def wait_ready(self, timeout=5.0):
+        """Wait until the video codec is known. Returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def codec_preferences(self):
+        """Codecs to offer, best first: the source's own H.264 profile (passthrough), then VP8."""
+        codecs = []
+        if self.h264_profile_level_id:
+            codecs.append(h264_codec_capability(self.h264_profile_level_id))
+        codecs.append(vp8_codec_capability())
+        return codecs
 
+    def start(self):
+        if self.klv_sink is not None:
+            self.klv_sink.connect("new-sample", self.on_klv_sample)
+        bus = self.pipeline.get_bus()
+        bus.set_sync_handler(self._on_bus_message)
+        if self.start_time is not None:
+            # a seek needs a prerolled pipeline; PLAYING follows in _seek_range()
+            self._seek_pending = True
+            self.pipeline.set_state(Gst.State.PAUSED)
+        else:
+            self.pipeline.set_state(Gst.State.PLAYING)
+        print(f"▶️  Source started: {self.path}")
+
+    def stop(self):
+        """Tear the pipeline down. Peers must have detached already."""
+        self.pipeline.get_bus().set_sync_handler(None)
+        self.pipeline.set_state(Gst.State.NULL)
+        self._klv_subscribers.clear()
+        self.klv_history.clear()
+        print(f"⏹️  Source stopped: {self.path}")
+
+    def _on_bus_message(self, bus, message):
+        # Runs on a streaming thread. Recorded files loop so the shared feed
+        # stays available to peers that join after the first pass.
+        if message.type == Gst.MessageType.EOS:
+            if self.live:
+                print(f"⏹️  Live feed ended: {self.path}")
+            else:
+                self.loop.call_soon_threadsafe(self._rewind)
+        elif (message.type == Gst.MessageType.STATE_CHANGED and self._seek_pending
+              and message.src == self.pipeline):
+            _, new, _ = message.parse_state_changed()
+            if new == Gst.State.PAUSED:
+                self._seek_pending = False
+                self.loop.call_soon_threadsafe(self._seek_range)
+        elif message.type == Gst.MessageType.ERROR:
+            err, dbg = message.parse_error()
+            print(f"❌ Pipeline error ({self.path}):", err, dbg)
+        return Gst.BusSyncReply.PASS
+
+    def preroll(self):
+        """Start ahead of demand with the transcoder linked, so decoder and encoder are warm."""
+        if self.src_tee is not None:
+            link_transcoder(self.pipeline)
+        self.start()
+
+    def cached_gop(self, appsink):
+        """Frames to replay to the peer on `appsink`: its tee's GOP so far (may be empty)."""
+        branch = self._branches.get(appsink)
+        cache = self._gop_caches.get(branch[0]) if branch is not None else None
+        return cache.snapshot() if cache is not None else []
+
+    def _rewind(self):
+        self.klv_history.clear()
+        for cache in self._gop_caches.values():
+            cache.clear()
+        if self.start_time is not None:
+            self._seek_range()
+            return
+        self.pipeline.seek_simple(
+            Gst.Format.TIME, Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT, 0
+        )
 
-async def offer(request):
+    def _seek_range(self):
+        """Flushing seek to the keyframe at start_time; video and KLV pads move together."""
+        self.klv_history.clear()
+        stop_type = Gst.SeekType.NONE if self.end_time is None else Gst.SeekType.SET
+        ok = self.pipeline.seek(
+            1.0, Gst.Format.TIME,
+            Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_BEFORE,
+            Gst.SeekType.SET, int(self.start_time * Gst.SECOND),
+            stop_type, int((self.end_time or 0) * Gst.SECOND),
+        )
+        if not ok:
+            print(f"⚠️ Seek to {self.start_time:.3f}s failed ({self.path}), playing from the start")
+        self.pipeline.set_state(Gst.State.PLAYING)
+        print(f"⏩ {self.path}: {self.start_time:.3f}s -> {'end' if self.end_time is None else f'{self.end_time:.3f}s'}")
+
+    # ---- video fan-out ----
+    def add_video_branch(self, passthrough=False):
+        """Link a new tee -> queue -> appsink branch and return the appsink."""
+        if passthrough:
+            tee = self.src_tee
+        else:
+            tee = self._layer_for(VIDEO_BITRATE)[2] if self.layers else self.video_tee
+            if self.src_tee is not None:
+                link_transcoder(self.pipeline)
+        queue = Gst.ElementFactory.make("queue", None)
+        appsink = Gst.ElementFactory.make("appsink", None)
+
+        # leaky so one slow peer can never stall the shared encoder
+        queue.set_property("leaky", 2)  # downstream
+        queue.set_property("max-size-buffers", LIVE_BUDGETS["branch_buffers"] if self.live else 5)
+        queue.set_property("max-size-time", 0)
+        queue.set_property("max-size-bytes", 0)
+
+        # video appsink: pushes through new-sample into the track's asyncio queue
+        appsink.set_property("emit-signals", True)
+        appsink.set_property("sync", False)
+        appsink.set_property("max-buffers", 2)
+        appsink.set_property("drop", True)
+
+        self.pipeline.add(queue)
+        self.pipeline.add(appsink)
+        if not queue.link(appsink):
+            raise RuntimeError("Failed to link branch queue -> appsink")
+        queue.sync_state_with_parent()
+        appsink.sync_state_with_parent()
+
+        teepad = tee.get_request_pad("src_%u")
+        res = teepad.link(queue.get_static_pad("sink"))
+        if res != Gst.PadLinkReturn.OK:
+            raise RuntimeError(f"Failed to link {tee.get_name()} -> branch queue: {res}")
+
+        self._branches[appsink] = (tee, queue, teepad)
+        self.request_keyframe(appsink)
+        print(f"➕ Video branch added ({len(self._branches)} peers on {self.path})")
+        return appsink
+
+    def remove_video_branch(self, appsink):
+        branch = self._branches.pop(appsink, None)
+        if branch is None:
+            return
+        self._peer_bitrates.pop(appsink, None)
+        tee, queue, teepad = branch
+        if appsink in self._moving:
+            # already unlinked from its old layer; _finish_move() disposes it
+            print(f"➖ Video branch removed ({len(self._branches)} peers on {self.path})")
+            return
+
+        def on_idle(pad, info):
+            pad.unlink(queue.get_static_pad("sink"))
+            tee.release_request_pad(pad)
+            self.loop.call_soon_threadsafe(self._dispose_branch, queue, appsink)
+            return Gst.PadProbeReturn.REMOVE
+
+        teepad.add_probe(Gst.PadProbeType.IDLE, on_idle)
+        print(f"➖ Video branch removed ({len(self._branches)} peers on {self.path})")
+
+    def _dispose_branch(self, queue, appsink):
+        for element in (queue, appsink):
+            element.set_state(Gst.State.NULL)
+            self.pipeline.remove(element)
+
+    # ---- rate control ----
+    @property
+    def max_bitrate(self):
+        return self.layers[0][1] if self.layers else VIDEO_BITRATE
+
+    def _layer_for(self, bitrate):
+        """Best quality layer whose bitrate fits in `bitrate`, else the lowest."""
+        for layer in self.layers:
+            if layer[1] <= bitrate:
+                return layer
+        return self.layers[-1]
+
+    def set_peer_bitrate(self, appsink, bitrate):
+        """New bandwidth estimate for a transcoded peer."""
+        branch = self._branches.get(appsink)
+        if branch is None or branch[0] is self.src_tee:
+            return  # gone, or passthrough: nothing to steer
+        if self.layers:
+            layer_tee = self._layer_for(bitrate)[2]
+            if layer_tee is not branch[0] and appsink not in self._moving:
+                self._move_branch(appsink, layer_tee)
+            return
+        self._peer_bitrates[appsink] = bitrate
+        self._update_encoder()
+
+    def _update_encoder(self):
+        # the shared encoder serves every transcoded peer, so follow the slowest
+        bitrate = int(min(self._peer_bitrates.values(), default=VIDEO_BITRATE))
+        if abs(bitrate - self._encoder_bitrate) > 0.1 * self._encoder_bitrate:
+            self._encoder_bitrate = bitrate
+            self.vp8enc.set_property("target-bitrate", bitrate)
+            print(f"📉 vp8enc target-bitrate {bitrate // 1000} kbps ({self.path})")
+        if ABR_SCALE:
+            height = next(h for floor, h in ABR_LADDER if bitrate >= floor)
+            if height != self._scale_height:
+                native = self._native_height()
+                if height is not None and native is not None and native <= height:
+                    height = None
+                if height != self._scale_height:
+                    self._scale_height = height
+                    self.scalecaps.set_property("caps", scale_caps(height))
+                    print(f"📐 Encoding at {height or 'native'} lines ({self.path})")
+
+    def _native_height(self):
+        caps = self.pipeline.get_by_name("videoconvert").get_static_pad("src").get_current_caps()
+        if caps is None or caps.get_size() == 0:
+            return None
+        ok, height = caps.get_structure(0).get_int("height")
+        return height if ok else None
+
+    def _move_branch(self, appsink, new_tee):
+        """Relink a peer's queue -> appsink branch onto another quality layer's tee."""
+        tee, queue, teepad = self._branches[appsink]
+        self._moving.add(appsink)
+
+        def on_idle(pad, info):
+            pad.unlink(queue.get_static_pad("sink"))
+            tee.release_request_pad(pad)
+            self.loop.call_soon_threadsafe(self._finish_move, appsink, queue, new_tee)
+            return Gst.PadProbeReturn.REMOVE
+
+        teepad.add_probe(Gst.PadProbeType.IDLE, on_idle)
+
+    def _finish_move(self, appsink, queue, new_tee):
+        self._moving.discard(appsink)
+        if appsink not in self._branches:
+            self._dispose_branch(queue, appsink)  # peer left mid-move
+            return
+        teepad = new_tee.get_request_pad("src_%u")
+        res = teepad.link(queue.get_static_pad("sink"))
+        if res != Gst.PadLinkReturn.OK:
+            print(f"Failed to move branch to {new_tee.get_name()}: {res}")
+            return
+        self._branches[appsink] = (new_tee, queue, teepad)
+        self.request_keyframe(appsink)
+        print(f"🔀 Peer moved to layer {new_tee.get_name()} ({self.path})")
+
+    def request_keyframe(self, appsink):
+        """
+        Ask the encoder upstream of the tee for a key unit so a new peer can
+        start decoding. Passthrough branches have no encoder; h264parse
+        repeats SPS/PPS at every IDR instead. At most one request per encoder
+        every KEYFRAME_MIN_INTERVAL seconds.
+        """
+        branch = self._branches.get(appsink)
+        tee = branch[0] if branch is not None else None
+        now = time.monotonic()
+        if now - self._keyframe_requested.get(tee, float("-inf")) < KEYFRAME_MIN_INTERVAL:
+            return
+        self._keyframe_requested[tee] = now
+        event = Gst.Event.new_custom(
+            Gst.EventType.CUSTOM_UPSTREAM,
+            Gst.Structure.new_from_string("GstForceKeyUnit, all-headers=(boolean)true"),
+        )
+        appsink.send_event(event)
+
+    # ---- KLV fan-out ----
+    def add_klv_subscriber(self, klv_track):
+        self._klv_subscribers.add(klv_track)
+        self.update_klv_tags()
+
+    def remove_klv_subscriber(self, klv_track):
+        self._klv_subscribers.discard(klv_track)
+        self.update_klv_tags()
+
+    def update_klv_tags(self):
+        """Recompute the tags to decode: what any subscriber wants, plus what the server itself reads."""
+        wanted = set()
+        for klv_track in self._klv_subscribers:
+            if klv_track.tags is None:
+                self.klv_tags = None
+                return
+            wanted |= klv_track.tags
+        if FOOTPRINT:
+            wanted.update(footprint.FOOTPRINT_TAGS)
+        if self.live:
+            wanted.add(2)  # Precision Time Stamp, for glass-to-glass latency
+        previous, self.klv_tags = self.klv_tags, frozenset(wanted)  # read by the streaming thread
+        if previous is None or not previous <= self.klv_tags:
+            # the union shrank: what's already decoded must not reach clients that didn't ask for it
+            self.klv_history.restrict(self.klv_tags)
+
+    def on_klv_sample(self, sink):
+        sample = sink.emit("pull-sample")
+        if not sample or not (self._klv_subscribers or self.live):
+            return Gst.FlowReturn.OK
+
+        buffer = sample.get_buffer()
+        success, map_info = buffer.map(Gst.MapFlags.READ)
+        if not success:
+            return Gst.FlowReturn.OK
+
+        rejected = self._klv_decoder.rejected
+        tags = self.klv_tags
+        try:
+            with self._m_klv_parse.time():
+                parsed_metadatas = self._klv_decoder.decode_klv(
+                    map_info.data, verify=KLV_VERIFY_CHECKSUM, tags=tags)
+        finally:
+            buffer.unmap(map_info)
+        if self._klv_decoder.rejected != rejected:
+            self._m_klv_rejected.inc(self._klv_decoder.rejected - rejected)
+        if not parsed_metadatas:
+            return Gst.FlowReturn.OK
+
+        if FOOTPRINT:
+            # once per packet for every peer, off the event loop
+            for local_set in parsed_metadatas:
+                local_set["footprint"] = footprint.local_set_footprint(local_set, dem=FOOTPRINT_DEM)
+
+        pts = buffer.pts
+        if pts == Gst.CLOCK_TIME_NONE:
+            # async KLV without a PTS: pin it to the current playback position
+            ok, pts = self.pipeline.query_position(Gst.Format.TIME)
+            if not ok:
+                return Gst.FlowReturn.OK
+        self.loop.call_soon_threadsafe(self._store_klv, pts, parsed_metadatas, tags)
+        return Gst.FlowReturn.OK
+
+    def _store_klv(self, pts, local_sets, tags=None):
+        # KLVTrack.send_frame() picks these up as video frames go out
+        current = self.klv_tags
+        for local_set in local_sets:
+            if current is not None and (tags is None or not tags <= current):
+                local_set = _restrict(local_set, current)  # decoded before the subscriptions shrank
+            self.klv_history.add(pts, local_set)
+            if self.broadcast.groups:
+                self.broadcast.publish(pts, local_set)
+
+
+class SourceLimitError(RuntimeError):
+    pass
+
+
+class SourceRegistry:
     """
-    Server creates an offer and returns it to the client.
-    Client will setRemoteDescription(offer) and POST an answer to /answer.
+    Named inputs (source id -> path). A Source's pipeline is built when its
+    first subscriber arrives, kept warm for `idle_grace` seconds after the
+    last one leaves, then torn down. At most `max_running` pipelines run at
+    once; an idle one is evicted early to make room for a watched feed.
     """
-    pc = RTCPeerConnection()
-    pcs.add(pc)
-    print(f"Created PeerConnection {id(pc)}")
 
-    @pc.on("connectionstatechange")
-    async def on_connectionstatechange():
-        print(f"Connection state: {pc.connectionState}")
-        if pc.connectionState == "failed":
-            await pc.close()
-            pcs.discard(pc)
+    def __init__(self, max_running=MAX_PIPELINES, idle_grace=SOURCE_IDLE_GRACE, klv_index=0):
+        self.max_running = max_running
+        self.idle_grace = idle_grace
+        self.klv_index = klv_index
+        self.paths = {}     # source id -> path
+        self.running = {}   # source id -> Source
+        self._refs = {}     # source id -> subscriber count
+        self._idle = {}     # source id -> TimerHandle of the pending teardown
+        self.pinned = set() # pre-rolled source ids, never torn down when idle
+        self.private = set()  # range-playback Sources, one per session, not shared
+        self._private_seq = 0  # makes each private Source's name (and metric labels) unique
+
+    def register(self, source_id, path):
+        self.paths[source_id] = path
+
+    def path(self, source_id):
+        """Path of a registered source; KeyError if unknown."""
+        return self.paths[source_id]
+
+    def acquire(self, source_id):
+        """Running Source for `source_id`, started if needed. Pair with release()."""
+        path = self.paths[source_id]
+        source = self.running.get(source_id)
+        if source is None:
+            self._make_room()
+            source = Source(path, klv_index=self.klv_index, name=source_id)
+            source.start()
+            self.running[source_id] = source
+            self._refs[source_id] = 0
+        timer = self._idle.pop(source_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._refs[source_id] += 1
+        return source
+
+    def preroll(self, source_id):
+        """Start `source_id` now and keep it running with or without viewers."""
+        if source_id not in self.running:
+            if len(self.running) + len(self.private) >= self.max_running:
+                raise SourceLimitError(f"{len(self.running) + len(self.private)} pipelines already running")
+            source = Source(self.paths[source_id], klv_index=self.klv_index, name=source_id)
+            source.preroll()
+            self.running[source_id] = source
+            self._refs[source_id] = 0
+        self.pinned.add(source_id)
+
+    def acquire_private(self, source_id, start, end=None):
+        """A Source of its own playing `source_id` from `start` (to `end`) seconds. Pair with release_private()."""
+        path = self.paths[source_id]
+        self._make_room()
+        self._private_seq += 1
+        name = f"{source_id}@{start:g}#{self._private_seq}"
+        source = Source(path, klv_index=self.klv_index, name=name, start=start, end=end)
+        source.start()
+        self.private.add(source)
+        return source
+
+    def release_private(self, source):
+        if source in self.private:
+            self.private.discard(source)
+            source.stop()
+            # private sources are named per session; keep /metrics' label set bounded
+            for metric in SOURCE_METRICS:
+                metric.remove_matching(source=source.name)
+
+    def _make_room(self):
+        running = len(self.running) + len(self.private)
+        if running >= self.max_running and not self._evict_idle():
+            raise SourceLimitError(f"{running} pipelines already running")
+
+    def release(self, source_id):
+        if source_id not in self.running:
+            return
+        self._refs[source_id] -= 1
+        if source_id in self.pinned:
+            return
+        if self._refs[source_id] <= 0 and source_id not in self._idle:
+            loop = asyncio.get_event_loop()
+            self._idle[source_id] = loop.call_later(self.idle_grace, self._teardown, source_id)
+
+    def _evict_idle(self):
+        # the feed that went idle first has had the longest grace already
+        if not self._idle:
+            return False
+        source_id = min(self._idle, key=lambda i: self._idle[i].when())
+        self._teardown(source_id)
+        return True
+
+    def _teardown(self, source_id):
+        timer = self._idle.pop(source_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._refs.pop(source_id, None)
+        source = self.running.pop(source_id, None)
+        if source is not None:
+            source.stop()
+
+    def stop_all(self):
+        for source_id in list(self.running):
+            self._teardown(source_id)
+        for source in list(self.private):
+            self.release_private(source)
+
+    def _glass_to_glass_ms(self, source_id):
+        source = self.running.get(source_id)
+        if source is None or source.glass_to_glass is None:
+            return None
+        return round(source.glass_to_glass * 1000, 1)
 
-    # Build GStreamer pipeline and create our MediaStreamTrack wrapper
-    pipeline, video_sink, klv_sink = build_pipeline(VIDEO_TS)
+    def stats(self):
+        return {
+            source_id: {
+                "path": path,
+                "running": source_id in self.running,
+                "subscribers": self._refs.get(source_id, 0),
+                "idle": source_id in self._idle,
+                "pinned": source_id in self.pinned,
+                "live": is_live(path),
+                "glass_to_glass_ms": self._glass_to_glass_ms(source_id),
+            }
+            for source_id, path in self.paths.items()
+        }
 
-    track = GStreamerVideoTrack(video_sink)
 
-    # Add the track to the PeerConnection
-    pc.addTrack(track)
+registry = SourceRegistry()
 
-    # Create a datachannel for klv metadata
-    klv_dc = pc.createDataChannel("klv")
-    print("Created klv datachannel on server side")
 
-    # KLV handler: start when datachannel opens
-    klv_track = None
-    if klv_sink:
-        klv_track = KLVTrack(klv_sink, klv_dc)
+# ---------------------------
+# Sessions: one per /offer, keyed by the id the client echoes to /answer
+# ---------------------------
+class Session:
+    """
+    One peer: its PeerConnection, video track, KLV DataChannel and the
+    registry reference on its source. close() releases them in a fixed
+    order whatever ended the session (hang-up, ICE failure, no answer).
+    """
 
-        @klv_dc.on("open")
-        def on_open():
-            print("KLV DataChannel open. Starting KLVTrack.")
-            try:
-                klv_track.start()
-            except Exception as e:
-                print("Failed to start klv_track:", e)
+    def __init__(self, source_id, source, private=False):
+        self.id = uuid.uuid4().hex
+        self.source_id = source_id
+        self.source = source
+        self.private = private  # range playback: the session owns its Source
+        self.pc = RTCPeerConnection()
+        self.track = None
+        self.klv_track = None
+        self.klv_dc = None
+        self.abr = None
+        self.answered = False
+        self.created = time.monotonic()
+        self._answer_timer = None
+        self._closed = False
+
+    def expect_answer(self, timeout):
+        loop = asyncio.get_event_loop()
+        self._answer_timer = loop.call_later(
+            timeout, lambda: asyncio.ensure_future(self.close("no answer"))
+        )
 
-        @klv_dc.on("close")
-        def on_close():
-            print("KLV DataChannel closed.")
+    def cancel_answer_timeout(self):
+        if self._answer_timer is not None:
+            self._answer_timer.cancel()
+            self._answer_timer = None
+
+    async def close(self, reason=""):
+        if self._closed:
+            return
+        self._closed = True
+        sessions.pop(self.id, None)
+        self.cancel_answer_timeout()
+
+        # 1. stop steering the encoder and producing metadata, then drop the channel's handlers
+        if self.abr is not None:
+            self.abr.stop()
+        if self.klv_track is not None:
+            self.klv_track.stop()
+        if self.klv_dc is not None:
+            self.klv_dc.remove_all_listeners()
+        # 2. detach the video branch from the shared pipeline
+        if self.track is not None:
+            self.track.stop()
+        # 3. close transports
+        self.pc.remove_all_listeners()
+        await self.pc.close()
+        # 4. give the source back; the registry stops it once idle
+        if self.private:
+            registry.release_private(self.source)
+        else:
+            registry.release(self.source_id)
+        for metric in SESSION_METRICS:
+            metric.remove_matching(session=self.id)
+        print(f"Session {self.id} closed ({reason}), {len(sessions)} left")
+
+
+sessions = {}  # session id -> Session
+
+# ---------------------------
+# Aiohttp handlers
+# ---------------------------
+async def index(request):
+    return web.FileResponse("index.htm")
 
-    # Start GStreamer pipeline
-    pipeline.set_state(Gst.State.PLAYING)
 
-    # Server creates the offer and sends it to client
-    offer = await pc.createOffer()
-    await pc.setLocalDescription(offer)
+async def offer(request):
+    """
+    Server creates an offer and returns it to the client together with a
+    session id. Client will setRemoteDescription(offer) and POST its answer
+    with that session id to /answer.
 
+    ?start=<s>[&end=<s>] plays a recording from `start` seconds (snapped to
+    the keyframe before it, which the response reports) on a pipeline of
+    the session's own instead of the shared live feed.
+    """
+    try:
+        klv_rate = parse_klv_rate(request.query.get("klv_rate", KLV_MAX_RATE))
+    except ValueError:
+        return web.Response(text="klv_rate must be a number (Hz)", status=400)
+    klv_mode = request.query.get("klv_mode", KLV_MODE)
+    if klv_mode not in ("delta", "full"):
+        return web.Response(text="klv_mode must be 'delta' or 'full'", status=400)
+    # ?klv_timestamps=1 adds the server send time to each KLV message (see loadtest.py)
+    klv_timestamps = request.query.get("klv_timestamps", "0") not in ("0", "false", "")
+    # ?klv_tags=5,6,7,13 subscribes to those tags from the start (see KLVTrack.on_message)
+    try:
+        klv_tags = parse_klv_tags(request.query.get("klv_tags"))
+    except ValueError:
+        return web.Response(text="klv_tags must be comma separated tag numbers", status=400)
+
+    try:
+        start = float(request.query["start"]) if "start" in request.query else None
+        end = float(request.query["end"]) if "end" in request.query else None
+    except ValueError:
+        return web.Response(text="start and end must be numbers (seconds)", status=400)
+    if end is not None and (start is None or end <= start):
+        return web.Response(text="end needs a start before it", status=400)
+
+    # Attach to the shared pipeline for this input (built on first use), or
+    # to a private one seeked to ?start= for range playback
+    source_id = request.query.get("source", DEFAULT_SOURCE)
+    playback = {}
+    try:
+        if start is None:
+            source = registry.acquire(source_id)
+        elif is_live(registry.path(source_id)):
+            return web.Response(text="start/end only apply to recordings, not live feeds", status=400)
+        else:
+            playback = await _resolve_range(registry.path(source_id), max(start, 0.0), end)
+            source = registry.acquire_private(source_id, playback["start"], playback.get("end"))
+    except KeyError:
+        return web.Response(text=f"Unknown source {source_id!r}", status=404)
+    except SourceLimitError as e:
+        return web.Response(text=f"Too many active sources: {e}", status=503)
+
+    session = Session(source_id, source, private=start is not None)
+    sessions[session.id] = session
+    pc = session.pc
+    print(f"Created session {session.id} for source {source_id!r}")
+
+    try:
+        if not await source.wait_ready():
+            print("⚠️ Video stream not detected yet, offering VP8 only")
+
+        track = session.track = GStreamerVideoTrack(source, session_id=session.id)
+
+        # Add the track to the PeerConnection. Offer H.264 first when the source
+        # carries it so the browser can take the passthrough branch; VP8 is the
+        # transcoding fallback.
+        pc.addTrack(track)
+        for transceiver in pc.getTransceivers():
+            if transceiver.sender.track is track:
+                transceiver.setCodecPreferences(source.codec_preferences())
+
+        # Create a datachannel for klv metadata
+        klv_dc = session.klv_dc = pc.createDataChannel("klv")
+        print("Created klv datachannel on server side")
+
+        # KLV handler: start when datachannel opens
+        if source.klv_sink:
+            klv_track = session.klv_track = KLVTrack(
+                source, klv_dc, max_rate=klv_rate, mode=klv_mode,
+                snapshot_interval=KLV_SNAPSHOT_INTERVAL, session_id=session.id,
+                timestamps=klv_timestamps, tags=klv_tags,
+            )
+            track.klv_track = klv_track
+            klv_dc.on("message", klv_track.on_message)
+
+            @klv_dc.on("open")
+            def on_open():
+                print("KLV DataChannel open. Starting KLVTrack.")
+                try:
+                    klv_track.start()
+                except Exception as e:
+                    print("Failed to start klv_track:", e)
+
+            @klv_dc.on("close")
+            def on_close():
+                print("KLV DataChannel closed.")
+                klv_track.stop()
+
+        @pc.on("connectionstatechange")
+        async def on_connectionstatechange():
+            print(f"Session {session.id} connection state: {pc.connectionState}")
+            if pc.connectionState in ("failed", "closed"):
+                await session.close(pc.connectionState)
+
+        # Server creates the offer and sends it to client
+        offer = await pc.createOffer()
+        await pc.setLocalDescription(offer)
+    except Exception:
+        await session.close("offer failed")
+        raise
+
+    session.expect_answer(OFFER_TIMEOUT)
     return web.Response(
         content_type="application/json",
         text=json.dumps({
+            "session_id": session.id,
             "sdp": pc.localDescription.sdp,
-            "type": pc.localDescription.type
+            "type": pc.localDescription.type,
+            **playback,
         }),
     )
 
+indexes = {}  # path -> ts_index.TSIndex
+_index_builds = {}  # path -> Future of the load_or_build() in flight, shared by concurrent seeks
+
+
+async def _resolve_range(path, start, end):
+    """
+    {"start", "end", "duration"} for range playback of `path`. For .ts files
+    start snaps to the keyframe before it, from the index cached next to the
+    file (built in an executor on first use). Other inputs seek unsnapped.
+    """
+    if not path.lower().endswith(".ts"):
+        return {"start": start, **({"end": end} if end is not None else {})}
+    index = indexes.get(path)
+    if index is None:
+        build = _index_builds.get(path)
+        if build is None:
+            build = _index_builds[path] = asyncio.get_event_loop().run_in_executor(
+                None, ts_index.load_or_build, path)
+            build.add_done_callback(lambda _: _index_builds.pop(path, None))
+        try:
+            index = await asyncio.shield(build)
+        except Exception as e:
+            print(f"⚠️ No keyframe index for {path}: {e}")
+            return {"start": start, **({"end": end} if end is not None else {})}
+        indexes[path] = index
+    start = min(start, index.duration)
+    keyframe, _ = index.keyframe_before(start)
+    playback = {"start": keyframe, "duration": index.duration}
+    if end is not None:
+        playback["end"] = min(end, index.duration)
+    return playback
+
+
 async def answer(request):
     """
-    Client posts its answer here. Find the corresponding PeerConnection (last one)
-    and set its remote description.
+    Client posts its answer here with the session id it got from /offer.
     """
-    params = await request.json()
-    sdp = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
-    if not pcs:
-        return web.Response(text="No active PeerConnection", status=400)
-    # For simple single-client usage take the most recent pc
-    pc = list(pcs)[-1]
-    await pc.setRemoteDescription(sdp)
+    try:
+        params = await request.json()
+    except ValueError:
+        return web.Response(text="Body must be JSON", status=400)
+    if not isinstance(params, dict) or not isinstance(params.get("sdp"), str) \
+            or not isinstance(params.get("type"), str):
+        return web.Response(text="Expected {session_id, sdp, type}", status=400)
+    session = sessions.get(params.get("session_id"))
+    if session is None:
+        return web.Response(text="Unknown or expired session", status=404)
+    if session.answered:
+        return web.Response(text="Session already answered", status=409)
+
+    # answered before the await so a concurrent second answer gets 409; the
+    # answer timeout keeps running until the description is actually applied
+    session.answered = True
+    pc = session.pc
+    try:
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=params["sdp"], type=params["type"]))
+    except Exception as e:
+        await session.close("bad answer")
+        return web.Response(text=f"Invalid answer: {e}", status=400)
+    session.cancel_answer_timeout()
+
+    # the answer fixes the codec: attach each video track to the matching branch
+    for transceiver in pc.getTransceivers():
+        track = transceiver.sender.track
+        if isinstance(track, GStreamerVideoTrack) and transceiver._codecs:
+            track.bind(transceiver._codecs[0], transceiver.sender)
+            if not track.passthrough and session.abr is None:
+                session.abr = BitrateController(track, transceiver.sender)
+                session.abr.start()
     return web.Response(text="OK")
 
+def _all_sources():
+    return list(registry.running.values()) + list(registry.private)
+
+
+async def session_stats(request):
+    """GET /sessions: live sessions and the resources they hold."""
+    states = {}
+    for session in sessions.values():
+        states[session.pc.connectionState] = states.get(session.pc.connectionState, 0) + 1
+    return web.json_response({
+        "sessions": len(sessions),
+        "states": states,
+        "resources": {
+            "pipelines": len(registry.running) + len(registry.private),
+            "video_branches": sum(len(s._branches) for s in _all_sources()),
+            "klv_subscribers": sum(len(s._klv_subscribers) for s in _all_sources()),
+            "broadcast_clients": sum(len(s.broadcast) for s in _all_sources()),
+        },
+    })
+
+
+def _broadcast_clients():
+    return sum(len(s.broadcast) for s in registry.running.values())
+
+
+def _acquire_broadcast(request):
+    """(source id, Source, tags) for a metadata-only client, or an error Response as the second item."""
+    source_id = request.query.get("source", DEFAULT_SOURCE)
+    try:
+        tags = parse_klv_tags(request.query.get("tags"))
+    except ValueError:
+        return source_id, web.Response(text="tags must be comma separated tag numbers", status=400), None
+    if _broadcast_clients() >= BROADCAST_MAX_CLIENTS:
+        return source_id, web.Response(text="Too many metadata clients", status=503), None
+    try:
+        return source_id, registry.acquire(source_id), tags
+    except KeyError:
+        return source_id, web.Response(text=f"Unknown source {source_id!r}", status=404), None
+    except SourceLimitError as e:
+        return source_id, web.Response(text=f"Too many active sources: {e}", status=503), None
+
+
+async def _serve_broadcast(source_id, source, client, receive=None):
+    """Run `client` (and `receive()`, reading from it) until either ends, then detach it."""
+    source.broadcast.add(client)
+    print(f"📡 {client.transport_name} metadata client joined {source_id!r} ({len(source.broadcast)} on this source)")
+    tasks = [asyncio.ensure_future(client.run())]
+    if receive is not None:
+        tasks.append(asyncio.ensure_future(receive()))
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        source.broadcast.remove(client)
+        registry.release(source_id)
+        print(f"📡 {client.transport_name} metadata client left {source_id!r}:", client.stats())
+
+
+async def klv_websocket(request):
+    """
+    GET /klv/ws?source=ID&tags=5,6,7: the source's KLV as JSON text frames,
+    {"pts": seconds, "klv": {...}} per packet, without a peer connection.
+    Send {"tags": [...]} (or "all") to change the subscription.
+    """
+    source_id, source, tags = _acquire_broadcast(request)
+    if isinstance(source, web.Response):
+        return source
+    ws = web.WebSocketResponse(heartbeat=30)
+    try:
+        await ws.prepare(request)
+    except Exception:
+        registry.release(source_id)
+        raise
+
+    async def write(message):
+        await ws.send_frame(message.payload, WSMsgType.TEXT)
+
+    client = BroadcastClient("ws", request.transport, write, tags)
+
+    async def receive():
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                config = json.loads(msg.data)
+                if isinstance(config, dict) and "tags" in config:
+                    source.broadcast.retag(client, parse_klv_tags(config["tags"]))
+            except (TypeError, ValueError) as e:
+                print(f"⚠️ Ignoring metadata client message: {e}")
+
+    await _serve_broadcast(source_id, source, client, receive)
+    await ws.close()
+    return ws
+
+
+async def klv_events(request):
+    """GET /klv/events?source=ID&tags=5,6,7: the same stream as /klv/ws, as Server-Sent Events."""
+    source_id, source, tags = _acquire_broadcast(request)
+    if isinstance(source, web.Response):
+        return source
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # no proxy buffering
+    })
+    try:
+        await response.prepare(request)
+    except Exception:
+        registry.release(source_id)
+        raise
+
+    async def write(message):
+        await response.write(message.event)
+
+    async def keepalive():
+        await response.write(b": keepalive\n\n")
+
+    client = BroadcastClient("sse", request.transport, write, tags, keepalive)
+    await _serve_broadcast(source_id, source, client)
+    return response
+
+@metrics.on_collect
+def _collect_queue_depths():
+    # cheaper to read at scrape time than to track on every push/pop
+    for source_id, source in registry.running.items():
+        klv_queue = source.pipeline.get_by_name("klv_queue")
+        if klv_queue is not None:
+            M_KLV_QUEUE.labels(source_id).set(klv_queue.get_property("current-level-buffers"))
+        for transport in ("ws", "sse"):
+            M_BROADCAST_CLIENTS.labels(source_id, transport).set(sum(
+                1 for clients in source.broadcast.groups.values()
+                for client in clients if client.transport_name == transport))
+    for session in list(sessions.values()):
+        labels = (session.source.name, session.id)
+        track = session.track
+        if track is not None:
+            M_VIDEO_QUEUE.labels(*labels, "peer").set(track._queue.qsize())
+            branch = session.source._branches.get(track.appsink)
+            if branch is not None:
+                M_VIDEO_QUEUE.labels(*labels, "branch").set(branch[1].get_property("current-level-buffers"))
+        if session.klv_dc is not None:
+            M_DC_BUFFERED.labels(*labels).set(session.klv_dc.bufferedAmount)
+
+
+async def metrics_endpoint(request):
+    """GET /metrics: Prometheus scrape target."""
+    return web.Response(body=metrics.render().encode("utf-8"),
+                        headers={"Content-Type": metrics.CONTENT_TYPE})
+
+stores = {}  # path -> KLVStore
+
+
+def get_store(path):
+    """Memory-mapped KLV store extracted next to `path` (see klv_store.py), or None."""
+    store = stores.get(path)
+    if store is None:
+        store = klv_store.open_store(path)
+        if store is not None:
+            stores[path] = store
+    return store
+
+
+def _request_store(request):
+    """(store, None) for ?source= (default source if absent), or (None, error response)."""
+    source_id = request.query.get("source", DEFAULT_SOURCE)
+    try:
+        path = registry.path(source_id)
+    except KeyError:
+        return None, web.Response(text=f"Unknown source {source_id!r}", status=404)
+    store = get_store(path)
+    if store is None:
+        return None, web.Response(text=f"No KLV store for {path}; run klv_store.py first", status=404)
+    return store, None
+
+
+async def klv_range(request):
+    """
+    GET /klv/range?source=<id>&start=<s>&end=<s>&tags=13,14
+    Metadata of a recording between two PTS (seconds), served from the offline store.
+    """
+    store, error = _request_store(request)
+    if error is not None:
+        return error
+    try:
+        start = request.query.get("start")
+        end = request.query.get("end")
+        start_ns = int(float(start) * 1e9) if start else None
+        end_ns = int(float(end) * 1e9) if end else None
+        tags = request.query.get("tags")
+        tags = [int(t) for t in tags.split(",") if t] if tags else None
+    except ValueError:
+        return web.Response(text="start/end must be seconds, tags a comma separated list", status=400)
+
+    records = store.records(start_ns, end_ns, tags)
+    return web.Response(content_type="application/json", text=misc.json_safe_dumps(records))
+
+async def footprint_track(request):
+    """
+    GET /footprint.geojson?source=<id>&start=<s>&end=<s>&step=<n>
+    Footprint polygon per KLV packet of a recording (plus the sensor track),
+    computed from the offline store.
+    """
+    store, error = _request_store(request)
+    if error is not None:
+        return error
+    try:
+        start = request.query.get("start")
+        end = request.query.get("end")
+        start_ns = int(float(start) * 1e9) if start else None
+        end_ns = int(float(end) * 1e9) if end else None
+        step = int(request.query.get("step", 1))
+    except ValueError:
+        return web.Response(text="start/end must be seconds, step an integer", status=400)
+
+    loop = asyncio.get_event_loop()
+    geojson = await loop.run_in_executor(
+        None, lambda: footprint.store_geojson(store, start_ns, end_ns, step, dem=FOOTPRINT_DEM)
+    )
+    return web.Response(content_type="application/geo+json", text=json.dumps(geojson))
+
+async def list_sources(request):
+    """GET /sources: registered feeds and whether their pipelines are running."""
+    return web.json_response(registry.stats())
+
+async def preroll_sources(app):
+    source_ids = list(registry.paths) if "all" in PREROLL else PREROLL
+    for source_id in source_ids:
+        try:
+            registry.preroll(source_id)
+        except KeyError:
+            print(f"⚠️ Cannot pre-roll unknown source {source_id!r}")
+        except SourceLimitError as e:
+            print(f"⚠️ Cannot pre-roll {source_id!r}: {e}")
+
+
 async def on_shutdown(app):
-    coros = [pc.close() for pc in pcs]
-    await asyncio.gather(*coros)
-    pcs.clear()
+    await asyncio.gather(*(session.close("shutdown") for session in list(sessions.values())))
+    registry.stop_all()
 
 # ---------------------------
 # Main
@@ -476,26 +2676,114 @@ if __name__ == "__main__":
     parser.add_argument("--host", default="0.0.0.0")
     parser.add_argument("--port", type=int, default=8080)
     parser.add_argument("--video", dest="video", default=None,
-                        help="path to video file (overrides internal VIDEO_TS)")
-    parser.add_argument("--klv-index", dest="klv_index", type=int, default=0,
+                        help="path to video file (overrides internal VIDEO_TS), served as source 'default'")
+    parser.add_argument("--source", dest="sources", action="append", default=[], metavar="ID=PATH",
+                        help="Register another feed, requested with /offer?source=ID. PATH may be a "
+                             "recording or a live udp://host:port / srt://host:port MPEG-TS feed. Repeatable.")
+    parser.add_argument("--max-pipelines", dest="max_pipelines", type=int, default=MAX_PIPELINES,
+                        help="Maximum number of source pipelines running at once.")
+    parser.add_argument("--idle-grace", dest="idle_grace", type=float, default=SOURCE_IDLE_GRACE,
+                        help="Seconds a source keeps running after its last viewer leaves.")
+    parser.add_argument("--offer-timeout", dest="offer_timeout", type=float, default=OFFER_TIMEOUT,
+                        help="Seconds to wait for a client's answer before dropping the session.")
+    parser.add_argument("--klv-index", dest="klv_index", type=int, default=KLV_INDEX,
                         help="Which KLV pad index to forward (0-based). Default 0.")
+    parser.add_argument("--video-queue-size", dest="video_queue_size", type=int, default=VIDEO_QUEUE_SIZE,
+                        help="Frames buffered per peer between GStreamer and the RTP sender.")
+    parser.add_argument("--video-drop-policy", dest="video_drop_policy", choices=["oldest", "newest"],
+                        default=VIDEO_DROP_POLICY,
+                        help="Which frame to drop when a peer's queue is full.")
+    parser.add_argument("--klv-rate", dest="klv_rate", type=float, default=KLV_MAX_RATE,
+                        help="Default per-client KLV message rate in Hz (0 = every video frame). "
+                             "Clients override it with ?klv_rate= on /offer or a {\"maxRate\": n} message.")
+    parser.add_argument("--klv-mode", dest="klv_mode", choices=["delta", "full"], default=KLV_MODE,
+                        help="Default KLV message mode (clients override with ?klv_mode=).")
+    parser.add_argument("--klv-snapshot-interval", dest="klv_snapshot_interval", type=float,
+                        default=KLV_SNAPSHOT_INTERVAL,
+                        help="Seconds between full KLV snapshots in delta mode.")
+    parser.add_argument("--no-klv-checksum", dest="klv_checksum", action="store_false",
+                        help="Forward KLV packets even when their ST 0601 checksum doesn't match.")
+    parser.add_argument("--footprint", action="store_true",
+                        help="Compute the sensor footprint server-side and send it with live KLV.")
+    parser.add_argument("--dem", default=None,
+                        help="DEM tile (.npz with heights and bounds) for footprint intersection.")
+    parser.add_argument("--video-bitrate", dest="video_bitrate", type=int, default=VIDEO_BITRATE,
+                        help="Starting and maximum vp8enc bitrate (bps) for transcoded peers.")
+    parser.add_argument("--abr-min", dest="abr_min", type=int, default=ABR_MIN_BITRATE,
+                        help="Lowest bitrate (bps) the rate controller will go to.")
+    parser.add_argument("--abr-scale", dest="abr_scale", action="store_true",
+                        help="Also lower the encoded resolution when bandwidth drops.")
+    parser.add_argument("--layers", default=None, metavar="HEIGHT:BPS,...",
+                        help="Pre-encode quality layers, e.g. 'native:2500000,480:800000,240:250000'; "
+                             "peers are switched between them instead of retuning one encoder.")
+    parser.add_argument("--preroll", default=None, metavar="ID,...",
+                        help="Start these sources (or 'all') at launch and keep them warm for instant playback.")
+    parser.add_argument("--gop-cache", dest="gop_cache", type=int, default=GOP_CACHE_FRAMES,
+                        help="Most frames kept per tee for replaying to joining peers (0 disables).")
+    parser.add_argument("--live-budget", dest="live_budget", action="append", default=[], metavar="STAGE=N",
+                        help="Per-stage buffer budget for udp:// and srt:// sources, e.g. ingest_ms=100. "
+                             f"Stages: {', '.join(LIVE_BUDGETS)}. Repeatable.")
     parser.add_argument("-v", "--verbose", action="count")
     args = parser.parse_args()
 
     if args.video:
         VIDEO_TS = args.video
-
-    klv_index_to_forward = args.klv_index
+    VIDEO_QUEUE_SIZE = args.video_queue_size
+    VIDEO_DROP_POLICY = args.video_drop_policy
+    KLV_MAX_RATE = args.klv_rate
+    KLV_MODE = args.klv_mode
+    KLV_SNAPSHOT_INTERVAL = args.klv_snapshot_interval
+    KLV_VERIFY_CHECKSUM = args.klv_checksum
+    FOOTPRINT = args.footprint
+    if args.dem:
+        FOOTPRINT_DEM = footprint.DEM.load(args.dem)
+
+    KLV_INDEX = args.klv_index
+    VIDEO_BITRATE = args.video_bitrate
+    ABR_MIN_BITRATE = args.abr_min
+    ABR_SCALE = args.abr_scale
+    if args.layers:
+        try:
+            for spec in args.layers.split(","):
+                height, bitrate = spec.split(":")
+                VIDEO_LAYERS.append((None if height == "native" else int(height), int(bitrate)))
+        except ValueError:
+            parser.error(f"--layers expects HEIGHT:BPS[,HEIGHT:BPS...], got {args.layers!r}")
+    OFFER_TIMEOUT = args.offer_timeout
+    GOP_CACHE_FRAMES = args.gop_cache
+    for spec in args.live_budget:
+        stage, _, value = spec.partition("=")
+        if stage not in LIVE_BUDGETS or not value.isdigit():
+            parser.error(f"--live-budget expects STAGE=N with STAGE in {list(LIVE_BUDGETS)}, got {spec!r}")
+        LIVE_BUDGETS[stage] = int(value)
+    if args.preroll:
+        PREROLL = [source_id for source_id in args.preroll.split(",") if source_id]
+
+    registry = SourceRegistry(args.max_pipelines, args.idle_grace, KLV_INDEX)
+    registry.register(DEFAULT_SOURCE, VIDEO_TS)
+    for spec in args.sources:
+        source_id, sep, path = spec.partition("=")
+        if not sep or not source_id or not path:
+            parser.error(f"--source expects ID=PATH, got {spec!r}")
+        registry.register(source_id, path)
 
     logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
 
     app = web.Application()
+    app.on_startup.append(preroll_sources)
     app.on_shutdown.append(on_shutdown)
     # app.router.add_get("/", index)
     app.router.add_post("/offer", offer)
     app.router.add_post("/answer", answer)
+    app.router.add_get("/klv/range", klv_range)
+    app.router.add_get("/footprint.geojson", footprint_track)
+    app.router.add_get("/sources", list_sources)
+    app.router.add_get("/sessions", session_stats)
+    app.router.add_get("/metrics", metrics_endpoint)
+    app.router.add_get("/klv/ws", klv_websocket)
+    app.router.add_get("/klv/events", klv_events)
     static_dir = os.getcwd()
     app.router.add_static("/", static_dir, show_index=True)
 
-    print(f"Starting server on {args.host}:{args.port}, video={VIDEO_TS}, klv_index={klv_index_to_forward}")
+    print(f"Starting server on {args.host}:{args.port}, sources={list(registry.paths)}, klv_index={KLV_INDEX}")
     web.run_app(app, host=args.host, port=args.port)
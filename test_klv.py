@@ -12,8 +12,10 @@ from klvdata.misb0601 import UASLocalMetadataSet
 import misc  # your helper with parse_klv_local_sets()
 
 class KLVExtractor:
-    def __init__(self, filepath):
+    def __init__(self, filepath, on_packet=None):
+        """`on_packet(pts, data)` receives each KLV buffer (pts in ns or None); default prints it."""
         self.filepath = filepath
+        self.on_packet = on_packet
         self.loop = GLib.MainLoop()
         self.pipeline = None
         self.appsink = None
@@ -74,6 +76,10 @@ class KLVExtractor:
 
         try:
             data = mapinfo.data
+            if self.on_packet is not None:
+                pts = buf.pts if buf.pts != Gst.CLOCK_TIME_NONE else None
+                self.on_packet(pts, bytes(data))
+                return Gst.FlowReturn.OK
             # print(f"[KLV] size={len(data)} bytes")
             # print(" ".join(f"{b:02X}" for b in data[:64]), "..." if len(data) > 64 else "")
 
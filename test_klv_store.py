@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Round-trip and scaling checks for klv_store on synthetic recordings.
+
+    python -m pytest -q test_klv_store.py
+"""
+import datetime
+import math
+import time
+
+import numpy as np
+
+import klv_store
+import klv_synth
+import misb0601
+
+PACKETS = 12_000
+FRAME_NS = 33_366_667
+
+
+def _writer(packets, seed=0):
+    generator = klv_synth.Generator("typical", seed=seed)
+    writer = klv_store.KLVStoreWriter()
+    raw = generator.packets(packets)
+    for i, packet in enumerate(raw):
+        writer.add(i * FRAME_NS, packet)
+    return writer, raw
+
+
+def _build_time(packets, path):
+    writer, _ = _writer(packets)
+    start = time.perf_counter()
+    writer.write(str(path))
+    return time.perf_counter() - start
+
+
+def test_store_matches_per_packet_decode(tmp_path):
+    writer, raw = _writer(PACKETS)
+    meta = writer.write(str(tmp_path))
+    assert meta["packets"] == PACKETS
+
+    store = klv_store.KLVStore(str(tmp_path))
+    assert len(store) == PACKETS
+    expected = [misb0601.decode_klv(packet)[0] for packet in raw]
+    for tag in store.tags:
+        column = store.column(tag)
+        for i in range(0, PACKETS, 97):
+            value = expected[i].get(tag)
+            stored = column[i]
+            if tag in misb0601.MAPPED_TAGS:
+                if isinstance(value, float):
+                    assert math.isclose(stored, value, rel_tol=1e-12, abs_tol=1e-12), (tag, i)
+                else:
+                    assert np.isnan(stored), (tag, i)
+            elif column.dtype.kind == "i":
+                if value is None:
+                    assert stored == klv_store.NO_TIMESTAMP, (tag, i)
+                else:
+                    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+                    assert stored == (value - epoch) // datetime.timedelta(microseconds=1), (tag, i)
+            else:
+                assert stored.decode() == (value or "")
+
+
+def test_store_build_is_linear(tmp_path):
+    small = _build_time(PACKETS // 4, tmp_path / "small")
+    large = _build_time(PACKETS, tmp_path / "large")
+    # 4x the packets; a per-buffer pass over all rows made this ~16x
+    assert large < small * 8 + 0.05, (small, large)
+
+
+
+def test_records_skip_corrupt_timestamps(tmp_path):
+    writer, _ = _writer(10)
+    writer.write(str(tmp_path))
+    column = np.load(tmp_path / "tag_2.npy")
+    column[3] = np.iinfo(np.int64).max
+    np.save(tmp_path / "tag_2.npy", column)
+
+    records = klv_store.KLVStore(str(tmp_path)).records(tags=[2])
+    assert 2 not in records[3]
+    assert isinstance(records[4][2], datetime.datetime)
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+KLV extraction straight from an MPEG-TS file, without GStreamer.
+
+The file is mmapped, the KLV PID is found from the PAT/PMT, and PES payloads
+are reassembled from the 188-byte packets of that PID only. Large files are
+cut into chunks that start on a PES boundary (a payload_unit_start packet of
+the KLV PID) and scanned in a process pool, so extraction runs at disk speed
+rather than playback speed.
+
+    python ts_demux.py ./raw/videos/truck.ts
+"""
+import argparse
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as _np
+except Exception:  # pragma: no cover - optional
+    _np = None
+
+TS_PACKET = 188
+SYNC_BYTE = 0x47
+PAT_PID = 0x0000
+
+STREAM_TYPE_METADATA = 0x15  # ISO 13818-1 metadata in PES (synchronous KLV)
+STREAM_TYPE_PRIVATE = 0x06   # PES private data (asynchronous KLV, with a KLVA registration)
+REGISTRATION_DESCRIPTOR = 0x05
+KLVA = b"KLVA"
+UL_PREFIX = b"\x06\x0e\x2b\x34"
+
+CHUNK_SIZE = 64 * 1024 * 1024
+PSI_SCAN_LIMIT = 8 * 1024 * 1024  # PAT/PMT must show up in the first few MB
+
+
+# ---------------------------
+# Packet level
+# ---------------------------
+def find_sync(mm, limit=TS_PACKET * 8, start=0):
+    """Offset of the first packet at or after `start`: a 0x47 repeated at a 188-byte stride."""
+    size = len(mm)
+    for off in range(start, min(start + limit, size)):
+        if all(off + k * TS_PACKET >= size or mm[off + k * TS_PACKET] == SYNC_BYTE for k in range(4)):
+            return off
+    raise ValueError("no MPEG-TS sync byte found")
+
+
+def _resync(mm, off, end):
+    """Offset of the next packet after a lost sync at `off`, or None if there is none before `end`."""
+    try:
+        return find_sync(mm, max(end - off - 1, 0), off + 1)
+    except ValueError:
+        return None
+
+
+def _payload(mm, off):
+    """(pusi, payload_start) of the packet at `off`; payload_start is None if it carries none."""
+    b1 = mm[off + 1]
+    afc = (mm[off + 3] >> 4) & 0x3
+    if not afc & 0x1:
+        return bool(b1 & 0x40), None
+    start = off + 4
+    if afc & 0x2:
+        start += 1 + mm[off + 4]
+    if start >= off + TS_PACKET:
+        return bool(b1 & 0x40), None
+    return bool(b1 & 0x40), start
+
+
+def packet_offsets(mm, start, end, pid):
+    """
+    Byte offsets of every packet of `pid` in [start, end). A packet without
+    its sync byte (a dropped or inserted byte upstream) ends the 188-byte
+    stride there and the scan resyncs on the next packet.
+    """
+    offsets = []
+    pos = start
+    hi, lo = pid >> 8, pid & 0xFF
+    while pos is not None and pos + TS_PACKET <= end:
+        count = (end - pos) // TS_PACKET
+        if _np is not None:
+            packets = _np.frombuffer(mm, dtype=_np.uint8, count=count * TS_PACKET, offset=pos)
+            packets = packets.reshape(count, TS_PACKET)
+            lost = _np.flatnonzero(packets[:, 0] != SYNC_BYTE)
+            synced = int(lost[0]) if len(lost) else count
+            packets = packets[:synced]
+            pids = ((packets[:, 1].astype(_np.uint16) & 0x1F) << 8) | packets[:, 2]
+            offsets.extend((_np.flatnonzero(pids == pid) * TS_PACKET + pos).tolist())
+        else:
+            synced = count
+            for i, off in enumerate(range(pos, pos + count * TS_PACKET, TS_PACKET)):
+                if mm[off] != SYNC_BYTE:
+                    synced = i
+                    break
+                if mm[off + 2] == lo and (mm[off + 1] & 0x1F) == hi:
+                    offsets.append(off)
+        if synced == count:
+            break
+        pos = _resync(mm, pos + synced * TS_PACKET, end)
+    return offsets
+
+
+# ---------------------------
+# PSI (PAT / PMT)
+# ---------------------------
+def _read_section(mm, start, end, pid):
+    """First complete PSI section carried on `pid`, or None."""
+    section = None
+    for off in packet_offsets(mm, start, end, pid):
+        pusi, pos = _payload(mm, off)
+        if pos is None:
+            continue
+        payload = mm[pos:off + TS_PACKET]
+        if pusi:
+            section = bytearray(payload[1 + payload[0]:])
+        elif section is not None:
+            section += payload
+        if section is not None and len(section) >= 3:
+            length = 3 + (((section[1] & 0x0F) << 8) | section[2])
+            if len(section) >= length:
+                return bytes(section[:length])
+    return None
+
+
+def parse_pat(section):
+    """PMT PIDs listed in a PAT section."""
+    pids = []
+    body = section[8:-4]
+    for i in range(0, len(body) - 3, 4):
+        program = (body[i] << 8) | body[i + 1]
+        pid = ((body[i + 2] & 0x1F) << 8) | body[i + 3]
+        if program != 0:
+            pids.append(pid)
+    return pids
+
+
+def parse_pmt(section):
+    """[(stream_type, pid, descriptors_bytes)] of a PMT section."""
+    streams = []
+    info_len = ((section[10] & 0x0F) << 8) | section[11]
+    pos = 12 + info_len
+    end = len(section) - 4
+    while pos + 5 <= end:
+        stream_type = section[pos]
+        pid = ((section[pos + 1] & 0x1F) << 8) | section[pos + 2]
+        es_len = ((section[pos + 3] & 0x0F) << 8) | section[pos + 4]
+        streams.append((stream_type, pid, section[pos + 5:pos + 5 + es_len]))
+        pos += 5 + es_len
+    return streams
+
+
+def _has_klva(descriptors):
+    pos = 0
+    while pos + 2 <= len(descriptors):
+        tag, length = descriptors[pos], descriptors[pos + 1]
+        body = descriptors[pos + 2:pos + 2 + length]
+        if tag == REGISTRATION_DESCRIPTOR and body[:4] == KLVA:
+            return True
+        if KLVA in body:  # metadata_descriptor carries the format identifier too
+            return True
+        pos += 2 + length
+    return False
+
+
+def find_klv_pids(mm, start=0):
+    """KLV elementary stream PIDs in program order."""
+    end = start + min(PSI_SCAN_LIMIT, (len(mm) - start) // TS_PACKET * TS_PACKET)
+    pat = _read_section(mm, start, end, PAT_PID)
+    if pat is None:
+        return []
+    pids = []
+    for pmt_pid in parse_pat(pat):
+        pmt = _read_section(mm, start, end, pmt_pid)
+        if pmt is None:
+            continue
+        for stream_type, pid, descriptors in parse_pmt(pmt):
+            if stream_type == STREAM_TYPE_METADATA or (
+                    stream_type == STREAM_TYPE_PRIVATE and _has_klva(descriptors)):
+                if pid not in pids:
+                    pids.append(pid)
+    return pids
+
+
+# ---------------------------
+# PES
+# ---------------------------
+def pes_pts_ticks(header):
+    """33-bit PTS in 90 kHz ticks from a PES header, or None."""
+    if len(header) < 14 or not header[7] & 0x80:
+        return None
+    p = header[9:14]
+    return (((p[0] >> 1) & 0x07) << 30) | (p[1] << 22) | ((p[2] >> 1) << 15) | (p[3] << 7) | (p[4] >> 1)
+
+
+def _pes_pts(header):
+    """PTS in ns from a PES header, or None."""
+    pts = pes_pts_ticks(header)
+    return None if pts is None else pts * 100000 // 9
+
+
+def _strip_au_cells(data):
+    """Remove ST 1402 metadata AU cell headers (synchronous KLV) when present."""
+    if data[:4] == UL_PREFIX or data[5:9] != UL_PREFIX:
+        return data
+    out = bytearray()
+    pos = 0
+    while pos + 5 <= len(data):
+        length = (data[pos + 3] << 8) | data[pos + 4]
+        out += data[pos + 5:pos + 5 + length]
+        pos += 5 + length
+    return bytes(out)
+
+
+def _finish_pes(pes):
+    if len(pes) < 9 or pes[:3] != b"\x00\x00\x01":
+        return None
+    pts = _pes_pts(pes)
+    data = bytes(pes[9 + pes[8]:])
+    return pts, _strip_au_cells(data)
+
+
+def scan_chunk(path, start, end, pid):
+    """[(pts_ns, klv_bytes)] for every PES of `pid` that starts in [start, end)."""
+    out = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pes = None
+        for off in packet_offsets(mm, start, end, pid):
+            pusi, pos = _payload(mm, off)
+            if pusi:
+                if pes is not None:
+                    packet = _finish_pes(pes)
+                    if packet:
+                        out.append(packet)
+                pes = bytearray()
+            if pes is None or pos is None:
+                continue  # continuation of a PES that started in the previous chunk
+            pes += mm[pos:off + TS_PACKET]
+        if pes is not None:
+            packet = _finish_pes(pes)
+            if packet:
+                out.append(packet)
+    return out
+
+
+# ---------------------------
+# Chunking
+# ---------------------------
+def chunk_bounds(mm, start, pid, chunk_size=CHUNK_SIZE):
+    """Split [start, EOF) into ranges that each begin on a PES start of `pid`."""
+    end = len(mm)  # not a whole number of packets from `start` once a byte has been lost
+    chunk_size = max(TS_PACKET, chunk_size // TS_PACKET * TS_PACKET)
+    bounds = [start]
+    nominal = start + chunk_size
+    while nominal < end:
+        cut = None
+        probe = nominal
+        while cut is None and probe < end:
+            probe_end = min(end, probe + 4 * 1024 * 1024 // TS_PACKET * TS_PACKET)
+            for off in packet_offsets(mm, probe, probe_end, pid):
+                if mm[off + 1] & 0x40:
+                    cut = off
+                    break
+            probe = probe_end
+        if cut is None:
+            break
+        bounds.append(cut)
+        nominal = cut + chunk_size
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def extract_klv(path, klv_index=0, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    [(pts_ns, klv_bytes)] for the `klv_index`-th KLV stream of `path`, in file order.
+    Files bigger than one chunk are scanned by `workers` processes (default: cpu count).
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = find_sync(mm)
+        pids = find_klv_pids(mm, start)
+        if klv_index >= len(pids):
+            print(f"⚠️ No KLV stream #{klv_index} in {path} (found PIDs {pids})")
+            return []
+        pid = pids[klv_index]
+        chunks = chunk_bounds(mm, start, pid, chunk_size)
+
+    if len(chunks) == 1 or workers == 1:
+        results = [scan_chunk(path, s, e, pid) for s, e in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(scan_chunk, path, s, e, pid) for s, e in chunks]
+            results = [future.result() for future in futures]
+    return [packet for result in results for packet in result]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract raw KLV packets from an MPEG-TS file")
+    parser.add_argument("file", help="Path to MPEG-TS file")
+    parser.add_argument("--klv-index", dest="klv_index", type=int, default=0,
+                        help="Which KLV stream to extract (0-based). Default 0.")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Worker processes (default: cpu count)")
+    args = parser.parse_args()
+
+    packets = extract_klv(args.file, args.klv_index, args.workers)
+    total = sum(len(data) for _, data in packets)
+    print(f"{len(packets)} KLV PES packets, {total} bytes")
+    for pts, data in packets[:5]:
+        print(f"PTS={pts} size={len(data)} bytes: {data[:32].hex()}")
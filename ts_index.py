@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Keyframe / PTS index of the video stream in an MPEG-TS recording, cached
+next to the file so seeking into a long mission doesn't scan it again.
+
+    python ts_index.py ./raw/videos/truck.ts        # -> ./raw/videos/truck.ts.idx.npz
+
+One row per video PES (access unit): PTS in ns (33-bit wraps unwrapped),
+byte offset of its first TS packet, and whether it starts a keyframe
+(random_access_indicator, or an IDR / SPS NAL unit in its first packet).
+The cache records the file's size and mtime and is rebuilt when they change.
+"""
+import argparse
+import mmap
+import os
+import tempfile
+
+import numpy as np
+
+import ts_demux
+
+INDEX_SUFFIX = ".idx.npz"
+PTS_WRAP = 1 << 33
+
+# stream_type -> codec, for the video streams worth indexing
+VIDEO_STREAM_TYPES = {0x1B: "h264", 0x24: "hevc", 0x02: "mpeg2", 0x10: "mpeg4"}
+
+H264_KEY_NALS = {5, 7}                # IDR slice, SPS
+HEVC_KEY_NALS = set(range(16, 22)) | {32, 33}  # IRAP slices, VPS, SPS
+MPEG2_SEQUENCE_HEADER = b"\x00\x00\x01\xb3"
+
+
+def default_index_path(video_path):
+    return video_path + INDEX_SUFFIX
+
+
+def find_video_pid(mm, start=0):
+    """(pid, codec) of the first video stream in the PMT, or (None, None)."""
+    end = start + min(ts_demux.PSI_SCAN_LIMIT, (len(mm) - start) // ts_demux.TS_PACKET * ts_demux.TS_PACKET)
+    pat = ts_demux._read_section(mm, start, end, ts_demux.PAT_PID)
+    if pat is None:
+        return None, None
+    for pmt_pid in ts_demux.parse_pat(pat):
+        pmt = ts_demux._read_section(mm, start, end, pmt_pid)
+        if pmt is None:
+            continue
+        for stream_type, pid, _ in ts_demux.parse_pmt(pmt):
+            if stream_type in VIDEO_STREAM_TYPES:
+                return pid, VIDEO_STREAM_TYPES[stream_type]
+    return None, None
+
+
+def _random_access(mm, off):
+    """random_access_indicator of the packet's adaptation field."""
+    afc = (mm[off + 3] >> 4) & 0x3
+    return bool(afc & 0x2 and mm[off + 4] > 0 and mm[off + 5] & 0x40)
+
+
+def _starts_keyframe(payload, codec):
+    """Look for a key NAL unit (or MPEG-2 sequence header) in the start of an access unit."""
+    if codec == "mpeg2":
+        return MPEG2_SEQUENCE_HEADER in payload
+    pos = payload.find(b"\x00\x00\x01")
+    while pos != -1 and pos + 3 < len(payload):
+        header = payload[pos + 3]
+        nal = (header >> 1) & 0x3F if codec == "hevc" else header & 0x1F
+        if nal in (HEVC_KEY_NALS if codec == "hevc" else H264_KEY_NALS):
+            return True
+        pos = payload.find(b"\x00\x00\x01", pos + 3)
+    return False
+
+
+def build_index(path):
+    """{"pts", "offset", "keyframe", "video_pid", "codec"} for `path`."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = ts_demux.find_sync(mm)
+        pid, codec = find_video_pid(mm, start)
+        if pid is None:
+            raise ValueError(f"no video stream found in {path}")
+        end = start + (len(mm) - start) // ts_demux.TS_PACKET * ts_demux.TS_PACKET
+
+        pts, offsets, keyframes = [], [], []
+        for off in ts_demux.packet_offsets(mm, start, end, pid):
+            pusi, pos = ts_demux._payload(mm, off)
+            if not pusi or pos is None:
+                continue
+            payload = mm[pos:off + ts_demux.TS_PACKET]
+            ticks = ts_demux.pes_pts_ticks(payload)
+            if ticks is None:
+                continue
+            pts.append(ticks)
+            offsets.append(off)
+            es = payload[9 + payload[8]:] if len(payload) > 9 else b""
+            keyframes.append(_random_access(mm, off) or _starts_keyframe(es, codec))
+
+    ticks = np.asarray(pts, dtype=np.int64)
+    if len(ticks):
+        # unwrap the 33-bit counter: every backwards jump of more than half a wrap is one wrap
+        jumps = np.diff(ticks)
+        wraps = np.concatenate(([0], np.cumsum(jumps < -PTS_WRAP // 2)))
+        ticks = ticks + wraps * PTS_WRAP
+    return {
+        "pts": ticks * 100000 // 9,
+        "offset": np.asarray(offsets, dtype=np.int64),
+        "keyframe": np.asarray(keyframes, dtype=bool),
+        "video_pid": pid,
+        "codec": codec,
+    }
+
+
+class TSIndex:
+    """Seek helper over a saved index. Times are seconds from the first video PTS."""
+
+    def __init__(self, pts, offset, keyframe, video_pid=None, codec=None):
+        self.pts = pts
+        self.offset = offset
+        self.keyframe = keyframe
+        self.video_pid = video_pid
+        self.codec = codec
+        self.start_ns = int(pts.min()) if len(pts) else 0
+        # keyframes in presentation order, for bisecting
+        order = np.argsort(pts[keyframe], kind="stable")
+        self._key_pts = pts[keyframe][order]
+        self._key_offset = offset[keyframe][order]
+
+    def __len__(self):
+        return len(self.pts)
+
+    @property
+    def keyframes(self):
+        return len(self._key_pts)
+
+    @property
+    def duration(self):
+        return (int(self.pts.max()) - self.start_ns) / 1e9 if len(self.pts) else 0.0
+
+    def keyframe_before(self, seconds):
+        """(seconds, byte offset) of the last keyframe at or before `seconds`; the first one if none is."""
+        if not len(self._key_pts):
+            return 0.0, 0
+        target = self.start_ns + int(seconds * 1e9)
+        i = max(0, int(np.searchsorted(self._key_pts, target, side="right")) - 1)
+        return (int(self._key_pts[i]) - self.start_ns) / 1e9, int(self._key_offset[i])
+
+
+def _stat(path):
+    st = os.stat(path)
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+def load_or_build(path, index_path=None):
+    """TSIndex of `path`, from the cache next to it when still valid, else built and saved."""
+    index_path = index_path or default_index_path(path)
+    stat = _stat(path)
+    if os.path.exists(index_path):
+        try:
+            with np.load(index_path) as data:
+                if np.array_equal(data["stat"], stat):
+                    return TSIndex(data["pts"], data["offset"], data["keyframe"],
+                                   int(data["video_pid"]), str(data["codec"]))
+        except Exception:
+            pass  # unreadable, truncated or from an older layout: rebuild
+    index = build_index(path)
+    # written aside and renamed, so a concurrent reader never sees a partial file
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(index_path) + ".",
+                                        dir=os.path.dirname(os.path.abspath(index_path)))
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, stat=stat, **index)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"⚠️ Could not cache the index next to {path}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return TSIndex(index["pts"], index["offset"], index["keyframe"], index["video_pid"], index["codec"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the keyframe/PTS index of an MPEG-TS file")
+    parser.add_argument("file", help="Path to MPEG-TS file")
+    parser.add_argument("--seek", type=float, default=None, help="Print the keyframe a seek to this second lands on")
+    args = parser.parse_args()
+
+    index = load_or_build(args.file)
+    print(f"{len(index)} access units, {index.keyframes} keyframes, {index.duration:.1f} s "
+          f"({index.codec} on PID {index.video_pid}) -> {default_index_path(args.file)}")
+    if args.seek is not None:
+        seconds, offset = index.keyframe_before(args.seek)
+        print(f"seek {args.seek} s -> keyframe at {seconds:.3f} s, byte {offset}")